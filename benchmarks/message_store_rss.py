@@ -0,0 +1,64 @@
+"""
+Measure how much resident memory a long conversation costs in MessageStore.
+
+Appends TURNS turns of MESSAGES_PER_TURN messages (about 7 KB of content per
+turn), then reports RSS growth before and after serializing every message
+once, as save_session does.
+
+Usage: python benchmarks/message_store_rss.py [turns]
+"""
+
+import gc
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.message_store import MessageStore
+
+TURNS = 1000
+MESSAGES_PER_TURN = 4
+
+
+def rss_bytes():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def turn_messages(turn):
+    return [
+        {"role": "user", "content": f"question {turn} " + "q" * 500},
+        {"role": "assistant", "content": "", "tool_calls": [{
+            "id": f"call_{turn}",
+            "type": "function",
+            "function": {"name": "file_reader", "arguments": '{"file_path": "src/agent.py"}'},
+        }]},
+        {"role": "tool", "tool_call_id": f"call_{turn}", "name": "file_reader", "content": "x" * 6000},
+        {"role": "assistant", "content": f"answer {turn} " + "a" * 500},
+    ]
+
+
+def main():
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else TURNS
+    gc.collect()
+    baseline = rss_bytes()
+
+    store = MessageStore()
+    for turn in range(turns):
+        store.extend(turn_messages(turn))
+    gc.collect()
+    appended = rss_bytes()
+
+    for _ in store.iter_serialized():
+        pass
+    gc.collect()
+    serialized = rss_bytes()
+
+    mb = 1024 * 1024
+    print(f"{turns} turns, {len(store.messages)} messages, {store.content_size / mb:.1f} MB of content")
+    print(f"RSS growth after appending:   {(appended - baseline) / mb:.1f} MB")
+    print(f"RSS growth after serializing: {(serialized - baseline) / mb:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
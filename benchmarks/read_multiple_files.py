@@ -0,0 +1,69 @@
+"""
+Latency of multiple_file_reader for batches of 10, 100 and 1000 files.
+
+Each batch is read through the asyncio path and the thread pool path (the
+tool picks between them with READ_THREAD_POOL_BATCH), with the read cache
+cleared ("cold") and populated ("warm"). Times are the best of REPEATS runs.
+
+Usage: python benchmarks/read_multiple_files.py
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.tools.read_cache import read_cache
+from src.tools.read_multiple_files import MultipleFileReader, _get_executor
+
+BATCH_SIZES = (10, 100, 1000)
+REPEATS = 5
+LINE = "def handler(request):  # some representative source line\n"
+LINES_PER_FILE = 40
+
+
+def make_files(directory, count):
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"file_{i}.py")
+        with open(path, "w") as f:
+            f.write(LINE * LINES_PER_FILE)
+        paths.append(path)
+    return paths
+
+
+def best_of(read, files, cold):
+    best = float("inf")
+    for _ in range(REPEATS):
+        if cold:
+            read_cache.invalidate()
+        start = time.perf_counter()
+        read(files)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    reader = MultipleFileReader()
+    runner = asyncio.Runner()
+    paths = {
+        "asyncio": lambda files: runner.run(reader.main(files)),
+        "thread pool": lambda files: list(_get_executor().map(reader.read_file_sync, files)),
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        all_files = make_files(directory, max(BATCH_SIZES))
+        print(f"{'files':>6}  {'path':<12} {'cold ms':>9} {'warm ms':>9}")
+        for size in BATCH_SIZES:
+            files = all_files[:size]
+            for name, read in paths.items():
+                cold = best_of(read, files, cold=True)
+                warm = best_of(read, files, cold=False)
+                print(f"{size:>6}  {name:<12} {cold:>9.1f} {warm:>9.1f}")
+    runner.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,11 @@ from typing import Literal
 from src.models.llm import available_models
 from src.tools.tool_registry import ToolRegistry
 import json
+import re
 from src.prompts import PromptManager
 from dotenv import load_dotenv
 from src.session_manager import SessionHistory
+from src.message_store import MessageStore
 from src.llm_service.service import LLMService
 from src.constants import DEFAULT_PROVIDER, DEFAULT_MODEL
 
@@ -14,19 +16,21 @@ load_dotenv()
 MAX_ITERATIONS = 50
 
 class Agent:
-    def __init__(self, cwd=None):
+    def __init__(self, cwd=None, nested=False):
         """
         Initialize the Agent
         
         Args:
             cwd: Optional working directory to use in system prompt. If None, uses os.getcwd()
+            nested: True for an agent run from a tool (subagent); its edits belong to the caller's turn
         """
         # print("[INIT] Initializing Agent...")
 
         self.name = "terminus-cli"
         self.description = ""
         self.mode = "default"
-        self.context = []
+        self.nested = nested
+        self.messages = MessageStore()
         self.context_size = 0
         self.model_context_size = 200000
         self.iteration = 0
@@ -55,17 +59,22 @@ class Agent:
             # Update the context with planner prompt if already initialized
             if self.context:
                 # Replace the system message (first message)
-                self.context[0] = {"role": "system", "content": self.planner_prompt}
+                self.messages.replace(0, {"role": "system", "content": self.planner_prompt})
         else:
             self.mode = "default"
             # Update the context with default system prompt if already initialized
             if self.context:
                 # Replace the system message (first message)
-                self.context[0] = {"role": "system", "content": self.system_prompt}
+                self.messages.replace(0, {"role": "system", "content": self.system_prompt})
     
+    @property
+    def context(self):
+        """Messages sent to the LLM, read straight from the message store."""
+        return self.messages.messages
+
     def reset(self):
-        self.context = []
-        self.session_manager.clear_session_history()
+        self.messages.clear()
+        self.tool_registry.reset_session()
         self.add_system_message()
 
     def add_system_message(self, system_prompt: str = None):
@@ -73,13 +82,11 @@ class Agent:
             # Use prompt based on current mode
             system_prompt = self.planner_prompt if self.mode == "plan" else self.system_prompt
         message = {"role": "system", "content": system_prompt}
-        self.context.append(message)
-        self.session_manager.insert_to_session_history("system", json.dumps(message))
+        self.messages.append(message)
     
     def add_user_message(self, content):
         message = {"role": "user", "content": content}
-        self.context.append(message)
-        self.session_manager.insert_to_session_history("user", json.dumps(message))
+        self.messages.append(message)
 
     def switch_model(self, model):
 
@@ -103,8 +110,7 @@ class Agent:
                 }
                 for tc in (tool_calls if isinstance(tool_calls, list) else [tool_calls])
             ]
-        self.context.append(message)
-        self.session_manager.insert_to_session_history("assistant", json.dumps(message))
+        self.messages.append(message)
 
     def add_tool_message(self, tool_call, tool_output):
         message = {
@@ -113,44 +119,36 @@ class Agent:
             "name": tool_call.function.name,
             "content": tool_output
         }
-        self.context.append(message)
-        self.session_manager.insert_to_session_history("tool", json.dumps(message))
+        self.messages.append(message)
     
     def update_context_size(self):
-        self.message_context_size = [len(message["content"]) for message in self.context]
-        self.context_size = sum(self.message_context_size)
+        self.context_size = self.messages.content_size
         # print(f"[CONTEXT] Updated context size: {self.context_size}")
 
     def get_session_history(self, limit=None):
-        return self.session_manager.retrieve_session_history(limit)
+        return self.messages.records(limit)
     
     def get_chat_history(self, name=None, chat_id=None, limit=None):
         return self.session_manager.retrieve_chat_history(name, chat_id, limit)
     
     def save_session(self, name):
-        session_messages = self.session_manager.retrieve_session_history()
-        parsed_messages = []
-        for msg in session_messages:
-            try:
-                parsed_messages.append(json.loads(msg["content"]))
-            except json.JSONDecodeError:
-                parsed_messages.append({"role": msg["role"], "content": msg["content"]})
-        
-        return self.session_manager.insert_to_chat_history(name, parsed_messages)
+        return self.session_manager.insert_to_chat_history(name, self.messages.iter_serialized())
     
     def clear_session(self):
-        self.session_manager.clear_session_history()
-        self.context = []
+        self.messages.clear()
+        self.tool_registry.reset_session()
         self.iteration = 0
         self.add_system_message()
     
     def load_session(self, name):
         chat_history = self.session_manager.retrieve_chat_history(name=name, limit=1)
         if chat_history:
-            self.clear_session()
-            for message in chat_history[0]["chat_history"]:
-                self.context.append(message)
-                self.session_manager.insert_to_session_history(message["role"], json.dumps(message))
+            # The saved history carries its own system message, so skip
+            # clear_session(), which would add a second one.
+            self.messages.clear()
+            self.tool_registry.reset_session()
+            self.iteration = 0
+            self.messages.extend(chat_history[0]["chat_history"])
             # print(f"[SESSION] Loaded session '{name}' with {len(self.context)} messages.")
             return True
         # print(f"[SESSION] No session found with name '{name}'.")
@@ -175,9 +173,19 @@ class Agent:
             filename = tool_args["file_path"].split('/')[-1]
             return f"editing {filename}"
         
-        elif tool_name == "multi_edit" and "file_path" in tool_args:
+        elif tool_name == "multi_edit_file" and "file_path" in tool_args:
             filename = tool_args["file_path"].split('/')[-1]
-            return f"performing multuple edits in {filename}"
+            count = len(tool_args.get("old_strings") or [])
+            return f"applying {count} edit{'s' if count != 1 else ''} to {filename}"
+        
+        elif tool_name == "apply_patch":
+            paths = set(re.findall(r"^\+\+\+ (?:b/)?(\S+)", tool_args.get("patch") or "", re.M))
+            paths.update(edit.get("file_path") for edit in tool_args.get("edits") or [] if isinstance(edit, dict))
+            paths.discard("/dev/null")
+            return f"patching {len(paths)} file{'s' if len(paths) != 1 else ''}"
+        
+        elif tool_name == "read_symbol" and "name" in tool_args:
+            return f"reading {tool_args['name']}"
         
         elif tool_name == "multiple_file_reader" and "file_paths" in tool_args:
             count = len(tool_args["file_paths"])
@@ -189,12 +197,24 @@ class Agent:
         
         elif tool_name == "command_executor" and "command" in tool_args:
             cmd = tool_args["command"]  # Get first word of command
+            if tool_args.get("background"):
+                return f"starting {cmd} in the background"
             return f"executing {cmd}"
+
+        elif tool_name in ("job_status", "job_output", "job_kill") and "job_id" in tool_args:
+            verb = {"job_status": "checking", "job_output": "reading output of", "job_kill": "stopping"}[tool_name]
+            return f"{verb} job {tool_args['job_id']}"
         
-        elif tool_name == "ls" and "directory" in tool_args:
-            dir_name = tool_args["directory"].split('/')[-1] or "root"
+        elif tool_name == "ls" and "directory_path" in tool_args:
+            dir_name = tool_args["directory_path"].rstrip('/').split('/')[-1] or "root"
             return f"listing {dir_name}"
         
+        elif tool_name == "code_search" and "query" in tool_args:
+            return f"searching code for '{tool_args['query'][:30]}'"
+        
+        elif tool_name == "glob" and "pattern" in tool_args:
+            return f"finding {tool_args['pattern'][:30]}"
+        
         elif tool_name == "web_search" and "query" in tool_args:
             query = tool_args["query"][:30]  # Truncate long queries
             return f"searching web for '{query}'"
@@ -217,7 +237,14 @@ class Agent:
             "todo": "managing todos",
             "file_creator": "creating file",
             "file_editor": "editing file",
+            "apply_patch": "applying patch",
+            "job_status": "checking jobs",
+            "job_output": "reading job output",
+            "job_kill": "stopping job",
+            "sandbox": "running code in sandbox",
+            "python_exec": "running python",
             "multiple_file_reader": "reading files",
+            "read_symbol": "reading symbol",
             "ls": "listing directory",
             "sub_agent": "delegating to sub-agent",
             "lint": "linting code",
@@ -249,11 +276,19 @@ class Agent:
             if status_callback:
                 status_callback("switched to plan mode", is_thinking=False)
         
+        if self.prompt_manager.refresh_repo_map():
+            self.system_prompt = self.prompt_manager.get_system_prompt()
+            if self.context and self.mode == "default":
+                self.messages.replace(0, {"role": "system", "content": self.system_prompt})
+
         if not self.context:
             self.add_system_message()
             # print("[INIT] System prompt added to context.")
 
         self.add_user_message(user_message)
+        # Only the top-level agent starts a turn, so /undo reverts a subagent's edits with the turn that ran it
+        if not self.nested:
+            self.tool_registry.begin_turn()
 
         while self.iteration < self.max_iterations:
             # print(f"[ITERATION] Iteration {self.iteration + 1}/{self.max_iterations}")
@@ -316,7 +351,7 @@ class Agent:
                 try:
                     # Pass status_callback to tools that support it
                     # Only pass to specific tools that accept this parameter
-                    tools_supporting_callback = ['file_editor']
+                    tools_supporting_callback = ['file_editor', 'multi_edit_file', 'apply_patch', 'command_executor', 'python_exec']
                     tool_kwargs = {**tool_args}
                     if status_callback and tool_call.function.name in tools_supporting_callback:
                         tool_kwargs['status_callback'] = status_callback
@@ -5,4 +5,25 @@ DEFAULT_OPEN_ROUTER_MODEL = "z-ai/glm-4.6:exacto"
 DEFAULT_GROQ_MODEL = "moonshotai/kimi-k2-instruct-0905"
 
 DEFAULT_PROVIDER = "openrouter"
-DEFAULT_MODEL = "z-ai/glm-4.6:exacto"
\ No newline at end of file
+DEFAULT_MODEL = "z-ai/glm-4.6:exacto"
+
+# Retention for chat_history.db; each can be overridden with the matching
+# TERMINUS_DB_* environment variable. 0 disables that limit.
+DEFAULT_DB_MAX_AGE_DAYS = 90
+DEFAULT_DB_MAX_SESSIONS = 1000
+DEFAULT_DB_MAX_BYTES = 256 * 1024 * 1024
+
+# Approximate tokens of the repository map in the system prompt; override
+# with TERMINUS_REPO_MAP_TOKENS, 0 disables the map.
+DEFAULT_REPO_MAP_TOKENS = 1024
+
+# Seconds a command_executor call may run before its process group is killed;
+# the model can ask for more per call, up to the maximum. Override with
+# TERMINUS_COMMAND_TIMEOUT and TERMINUS_MAX_COMMAND_TIMEOUT.
+DEFAULT_COMMAND_TIMEOUT = 120
+MAX_COMMAND_TIMEOUT = 600
+
+# multiple_file_reader batches larger than this skip asyncio/aiofiles (itself
+# a thread pool) and read with os.read on a shared thread pool directly.
+# benchmarks/read_multiple_files.py measures both paths.
+READ_THREAD_POOL_BATCH = 32
@@ -1,6 +1,13 @@
 from src.agent import Agent
 from ui.frontend import TerminalDisplay
 from src.utils import process_file_references
+from src.tools.trigram_index import get_workspace_index
+from src.tools.bm25_index import get_code_index
+from src.tools.checkpoints import get_checkpoints
+from src.tools.file_watcher import notify_workspace_changed, start_watcher
+from src.tools.kernel_pool import get_kernel_pool
+from src.tools.repo_map import warm_repo_map
+from src.tools.symbol_index import symbol_index
 import sys
 import os
 import json
@@ -19,6 +26,16 @@ class TerminusCLI:
             os.chdir(cwd)
         
         self.agent = Agent(cwd=cwd)
+        self.agent.session_manager.start_retention()
+        symbol_index.start_pruning()
+        # Watches are added on the watcher's own thread, which then invalidates the caches once
+        start_watcher()
+        get_workspace_index().warm()
+        get_code_index().warm()
+        # The system prompt picks the map up at the first turn after it is built
+        warm_repo_map()
+        # Only starts kernels if TERMINUS_KERNEL_POOL_SIZE asks for them
+        get_kernel_pool().warm()
         self.display = TerminalDisplay()
         self.stop_event = threading.Event()
         self.sigint_pending_exit = False
@@ -94,7 +111,12 @@ class TerminusCLI:
         try:
             self.stop_event.clear()
             # Process @ file references
-            enriched_message, loaded_files, errors = process_file_references(user_input)
+            enriched_message, loaded_files, errors = process_file_references(
+                user_input,
+                on_estimate=lambda count, tokens: self.display.print_message(
+                    f"[dim bright_yellow]Attaching {count} file{'s' if count != 1 else ''} (~{tokens:,} tokens)"
+                ),
+            )
             
             # Display loaded files
             if loaded_files:
@@ -271,9 +293,40 @@ class TerminusCLI:
         if command.lower() == '/model':
             self.display.print_message(f"Current Model: {self.agent.model}")
             return True
+
+        if command.lower() in ['/undo', '/redo']:
+            self._undo_redo(command.lower())
+            return True
+
+        if command.lower().startswith('/db'):
+            parts = command.split()
+            if len(parts) == 2 and parts[1].lower() == 'stats':
+                self.display.render_db_stats(self.agent.session_manager.get_db_stats())
+            else:
+                self.display.print_message("[yellow]Usage:[/] /db stats")
+            return True
                 
         return True
     
+    def _undo_redo(self, command: str):
+        """Restore the files edited in the last agent turn (/undo), or re-apply an undone turn (/redo)."""
+        store = get_checkpoints()
+        try:
+            result = store.undo() if command == '/undo' else store.redo()
+        except Exception as e:
+            self.display.render_error(f"{command} failed: {e}")
+            return
+        if result is None:
+            self.display.print_message(f"[yellow]Nothing to {command[1:]}.[/yellow]")
+            return
+        _, paths = result
+        notify_workspace_changed(paths)
+        root = os.getcwd()
+        names = ", ".join(os.path.relpath(path, root) for path in paths[:5])
+        more = f" and {len(paths) - 5} more" if len(paths) > 5 else ""
+        verb = "Undid" if command == '/undo' else "Redid"
+        self.display.render_success_message(f"{verb} edits to {len(paths)} file{'s' if len(paths) != 1 else ''}: {names}{more}")
+
     def _display_history(self):
         """Display session history"""
         history = self.agent.get_session_history(limit=5)
@@ -350,8 +403,57 @@ class TerminusCLI:
         self.process_query(query)
 
 
+def run_sessions_command(argv):
+    """
+    Handle `terminus sessions export|import`.
+
+    Sessions are streamed as JSONL (one message per line) so neither side
+    ever holds a whole session in memory.
+    """
+    import argparse
+    from src.session_manager import SessionHistory
+
+    parser = argparse.ArgumentParser(prog="terminus sessions", description="Move saved sessions in and out as JSONL")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Write saved sessions as JSONL")
+    export_parser.add_argument("-o", "--output", help="Output file (defaults to stdout)")
+    export_parser.add_argument("--name", help="Only export sessions with this name")
+    export_parser.add_argument("--id", type=int, dest="chat_id", help="Only export the session with this id")
+
+    import_parser = subparsers.add_parser("import", help="Load sessions from JSONL")
+    import_parser.add_argument("input", nargs="?", help="Input file (defaults to stdin)")
+
+    args = parser.parse_args(argv)
+
+    with SessionHistory() as session_history:
+        if args.action == "export":
+            out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+            try:
+                sessions, messages = session_history.export_jsonl(out, name=args.name, chat_id=args.chat_id)
+            finally:
+                if args.output:
+                    out.close()
+            print(f"Exported {sessions} sessions ({messages} messages)", file=sys.stderr)
+        else:
+            source = open(args.input, "r", encoding="utf-8") if args.input else sys.stdin
+            try:
+                sessions, messages = session_history.import_jsonl(source)
+            except ValueError as e:
+                print(f"Import failed, nothing was written: {e}", file=sys.stderr)
+                return 1
+            finally:
+                if args.input:
+                    source.close()
+            print(f"Imported {sessions} sessions ({messages} messages)", file=sys.stderr)
+    return 0
+
+
 def main():
     """Main entry point for 'terminus' command"""
+    if len(sys.argv) > 1 and sys.argv[1] == "sessions":
+        sys.exit(run_sessions_command(sys.argv[2:]))
+
     # Always use the current working directory where the command is invoked
     invoked_dir = os.getcwd()
     cli = TerminusCLI(cwd=invoked_dir)
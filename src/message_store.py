@@ -0,0 +1,108 @@
+import datetime
+import json
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+class MessageStore:
+    """
+    Single in-memory store for the conversation.
+
+    Messages are kept once, as the dicts sent to the LLM. The JSON form of each
+    message is computed lazily the first time it is needed (saving, /history)
+    and cached, so repeated saves never re-serialize the whole conversation.
+    """
+
+    __slots__ = ("_messages", "_serialized", "_timestamps", "_content_size")
+
+    def __init__(self):
+        self._messages: List[Dict] = []
+        self._serialized: List[Optional[str]] = []
+        self._timestamps: List[str] = []
+        self._content_size = 0
+
+    @staticmethod
+    def _get_timestamp():
+        return datetime.datetime.now().isoformat()
+
+    @staticmethod
+    def _content_length(message: Dict) -> int:
+        content = message.get("content")
+        return len(content) if isinstance(content, str) else 0
+
+    @property
+    def messages(self) -> List[Dict]:
+        """The message list passed to the LLM. Mutate it only through the store."""
+        return self._messages
+
+    @property
+    def content_size(self) -> int:
+        return self._content_size
+
+    def append(self, message: Dict):
+        self._messages.append(message)
+        self._serialized.append(None)
+        self._timestamps.append(self._get_timestamp())
+        self._content_size += self._content_length(message)
+
+    def extend(self, messages):
+        for message in messages:
+            self.append(message)
+
+    def replace(self, index: int, message: Dict):
+        self._content_size -= self._content_length(self._messages[index])
+        self._messages[index] = message
+        self._serialized[index] = None
+        self._content_size += self._content_length(message)
+
+    def clear(self):
+        self._messages.clear()
+        self._serialized.clear()
+        self._timestamps.clear()
+        self._content_size = 0
+
+    def serialized(self, index: int) -> str:
+        """Return the cached JSON form of a message, computing it on first use."""
+        cached = self._serialized[index]
+        if cached is None:
+            cached = json.dumps(self._messages[index])
+            self._serialized[index] = cached
+        return cached
+
+    def iter_serialized(self) -> Iterator[Tuple[str, str]]:
+        """Yield (role, cached JSON) for every message, in order."""
+        for i, message in enumerate(self._messages):
+            yield message.get("role"), self.serialized(i)
+
+    def records(self, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Rows in the shape of the former session_history table.
+
+        With a limit, the most recent messages are returned newest first.
+        """
+        indices = range(len(self._messages))
+        if limit:
+            indices = reversed(indices[-limit:])
+        return [
+            {
+                "id": i + 1,
+                "timestamp": self._timestamps[i],
+                "role": self._messages[i].get("role"),
+                "content": self.serialized(i),
+            }
+            for i in indices
+        ]
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __bool__(self) -> bool:
+        return bool(self._messages)
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self._messages)
+
+    def __getitem__(self, index):
+        return self._messages[index]
+
+    def __repr__(self) -> str:
+        return repr(self._messages)
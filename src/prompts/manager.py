@@ -3,10 +3,14 @@ from src.prompts.system_prompt import get_system_prompt
 from src.prompts.init_prompt import get_init_prompt
 from src.prompts.coordinator_prompt import get_coordinator_prompt
 from src.prompts.compaction_prompt import get_compaction_prompt
+from src.tools.repo_map import ready_repo_map
 
 class PromptManager:
     def __init__(self, cwd=None):
 
+        self.cwd = cwd
+        # Filled in by refresh_repo_map once the background build is done
+        self.repo_map = ""
         self.system_prompt = get_system_prompt(cwd)
         self.planner_prompt = get_planner_prompt()
         self.init_prompt= get_init_prompt()
@@ -20,6 +24,17 @@ class PromptManager:
     def get_system_prompt(self):
         return self.system_prompt
 
+    def refresh_repo_map(self) -> bool:
+        """Add the repository map to the system prompt if it has become ready. Returns whether the prompt changed."""
+        if self.repo_map:
+            return False
+        repo_map = ready_repo_map(self.cwd)
+        if not repo_map:
+            return False
+        self.repo_map = repo_map
+        self.system_prompt = get_system_prompt(self.cwd, repo_map)
+        return True
+
     def get_planner_prompt(self):
         return self.planner_prompt
     
@@ -3,7 +3,7 @@ from datetime import datetime
 from textwrap import dedent
 from src.utils import discover_skills
 
-def get_system_prompt(cwd=None):
+def get_system_prompt(cwd=None, repo_map=""):
     
     if cwd is None:
         cwd = os.getcwd()
@@ -93,6 +93,13 @@ def get_system_prompt(cwd=None):
     </project_directory>
 
     """)
+
+    if repo_map:
+        system_prompt += dedent("""
+        <repository_map>
+        The most referenced files in this project and their top-level definitions, ranked by how much of the codebase depends on them.
+        Use it to decide where to look first instead of listing directories; read the files themselves for details.
+        """) + repo_map + "\n</repository_map>\n"
     
     skills = discover_skills(cwd)
 
@@ -2,43 +2,91 @@ import sqlite3
 import datetime
 import os
 import json
-from src.constants import DEFAULT_DATABASE_DIR
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+from src.constants import (
+    DEFAULT_DATABASE_DIR,
+    DEFAULT_DB_MAX_AGE_DAYS,
+    DEFAULT_DB_MAX_SESSIONS,
+    DEFAULT_DB_MAX_BYTES,
+)
+
+# Pages reclaimed per incremental_vacuum step; small steps keep the write
+# lock short so a concurrent save from the prompt never waits long.
+VACUUM_STEP_PAGES = 256
+VACUUM_STEP_PAUSE = 0.05
+
+
+@dataclass
+class RetentionPolicy:
+    """Limits applied to chat_history. None or 0 disables a limit."""
+    max_age_days: Optional[int] = DEFAULT_DB_MAX_AGE_DAYS
+    max_sessions: Optional[int] = DEFAULT_DB_MAX_SESSIONS
+    max_bytes: Optional[int] = DEFAULT_DB_MAX_BYTES
+
+    @classmethod
+    def from_env(cls):
+        def read(name, default):
+            value = os.getenv(name)
+            if value is None or not value.strip():
+                return default
+            try:
+                return int(value)
+            except ValueError:
+                return default
+
+        return cls(
+            max_age_days=read("TERMINUS_DB_MAX_AGE_DAYS", DEFAULT_DB_MAX_AGE_DAYS),
+            max_sessions=read("TERMINUS_DB_MAX_SESSIONS", DEFAULT_DB_MAX_SESSIONS),
+            max_bytes=read("TERMINUS_DB_MAX_BYTES", DEFAULT_DB_MAX_BYTES),
+        )
+
 
 class SessionHistory:
     def __init__(self):
         if not os.path.exists(DEFAULT_DATABASE_DIR):
             os.makedirs(DEFAULT_DATABASE_DIR)
         
-        db_path = os.path.join(DEFAULT_DATABASE_DIR, "chat_history.db")
-        self.con = sqlite3.connect(db_path)
+        self.db_path = os.path.join(DEFAULT_DATABASE_DIR, "chat_history.db")
+        self.con = sqlite3.connect(self.db_path, timeout=30)
         self.ch_cursor = self.con.cursor()
-        
-        self.session_history = sqlite3.connect(":memory:")
-        self.sh_cursor = self.session_history.cursor()
+        self.retention_thread = None
         
         self._initialize_tables()
 
     def _initialize_tables(self):
         try:
+            # auto_vacuum only takes effect on a fresh database; existing ones
+            # are converted once by the retention thread.
+            self.ch_cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            self.ch_cursor.execute("PRAGMA journal_mode = WAL")
             self.ch_cursor.execute("""
                 CREATE TABLE IF NOT EXISTS chat_history (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     name TEXT NOT NULL,
                     timestamp TEXT NOT NULL,
-                    chat_history TEXT NOT NULL
+                    chat_history TEXT NOT NULL,
+                    imported_at TEXT
                 )
             """)
-            self.con.commit()
-            
-            self.sh_cursor.execute("""
-                CREATE TABLE IF NOT EXISTS session_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TEXT NOT NULL,
+            columns = {row[1] for row in self.ch_cursor.execute("PRAGMA table_info(chat_history)")}
+            if "imported_at" not in columns:
+                # When an imported session arrived; retention ages it from then, not from its original timestamp
+                self.ch_cursor.execute("ALTER TABLE chat_history ADD COLUMN imported_at TEXT")
+            # One row per message so sessions can be streamed without loading them whole.
+            # Rows written before this table existed keep their JSON array in chat_history.chat_history.
+            self.ch_cursor.execute("""
+                CREATE TABLE IF NOT EXISTS chat_messages (
+                    chat_id INTEGER NOT NULL,
+                    seq INTEGER NOT NULL,
                     role TEXT NOT NULL,
-                    content TEXT NOT NULL
-                )
+                    message TEXT NOT NULL,
+                    PRIMARY KEY (chat_id, seq)
+                ) WITHOUT ROWID
             """)
-            self.session_history.commit()
+            self.con.commit()
             
         except sqlite3.OperationalError as e:
             print(f"Error initializing tables: {e}")
@@ -47,26 +95,40 @@ class SessionHistory:
     def _get_timestamp():
         return datetime.datetime.now().isoformat()
 
-    def insert_to_chat_history(self, name, chat_history):
-        timestamp = self._get_timestamp()
-        chat_history_json = json.dumps(chat_history)
-        
-        self.ch_cursor.execute(
-            "INSERT INTO chat_history (name, timestamp, chat_history) VALUES (?, ?, ?)",
-            (name, timestamp, chat_history_json)
-        )
-        self.con.commit()
-        return self.ch_cursor.lastrowid
+    def insert_to_chat_history(self, name, chat_history, timestamp=None):
+        """
+        Persist a conversation.
 
-    def insert_to_session_history(self, role, content):
-        timestamp = self._get_timestamp()
-        
-        self.sh_cursor.execute(
-            "INSERT INTO session_history (timestamp, role, content) VALUES (?, ?, ?)",
-            (timestamp, role, content)
+        chat_history may be a list of message dicts or an iterable of
+        (role, message_json) pairs such as MessageStore.iter_serialized().
+        """
+        timestamp = timestamp or self._get_timestamp()
+        with self.con:
+            chat_id = self._insert_chat(self.con, name, timestamp)
+            self.con.executemany(
+                "INSERT INTO chat_messages (chat_id, seq, role, message) VALUES (?, ?, ?, ?)",
+                (
+                    (chat_id, seq, role, message)
+                    for seq, (role, message) in enumerate(self._serialize_messages(chat_history))
+                )
+            )
+        return chat_id
+
+    @staticmethod
+    def _insert_chat(con, name, timestamp, imported_at=None):
+        cursor = con.execute(
+            "INSERT INTO chat_history (name, timestamp, chat_history, imported_at) VALUES (?, ?, '', ?)",
+            (name, timestamp, imported_at)
         )
-        self.session_history.commit()
-        return self.sh_cursor.lastrowid
+        return cursor.lastrowid
+
+    @staticmethod
+    def _serialize_messages(chat_history):
+        for item in chat_history:
+            if isinstance(item, dict):
+                yield item.get("role", ""), json.dumps(item)
+            else:
+                yield item
 
     def retrieve_chat_history(self, name=None, chat_id=None, limit=None):
         query = "SELECT id, name, timestamp, chat_history FROM chat_history"
@@ -93,51 +155,253 @@ class SessionHistory:
                 "id": row[0],
                 "name": row[1],
                 "timestamp": row[2],
-                "chat_history": json.loads(row[3])
+                "chat_history": [json.loads(message) for message in self._iter_chat_messages(row[0], row[3])]
             }
             for row in results
         ]
 
-    def retrieve_session_history(self, limit=None):
-        query = "SELECT id, timestamp, role, content FROM session_history ORDER BY id"
-        
-        if limit:
-            query += " DESC LIMIT ?"
-            self.sh_cursor.execute(query, (limit,))
+    def _iter_chat_messages(self, chat_id, legacy_json=""):
+        """Yield the JSON of each message of a session, oldest first."""
+        if legacy_json:
+            for message in json.loads(legacy_json):
+                yield json.dumps(message)
+            return
+        cursor = self.con.execute(
+            "SELECT message FROM chat_messages WHERE chat_id = ? ORDER BY seq", (chat_id,)
+        )
+        for (message,) in cursor:
+            yield message
+
+    def export_jsonl(self, out, name=None, chat_id=None):
+        """
+        Write sessions to out as JSONL, one message per line.
+
+        Rows are streamed from sqlite and each stored message is written
+        verbatim, so memory stays flat however large a session is.
+        Returns (sessions, messages) written.
+        """
+        query = "SELECT id, name, timestamp FROM chat_history"
+        params = []
+        if chat_id:
+            query += " WHERE id = ?"
+            params.append(chat_id)
+        elif name:
+            query += " WHERE name = ?"
+            params.append(name)
+        query += " ORDER BY timestamp, id"
+
+        sessions = 0
+        messages = 0
+        # One session row at a time; a legacy JSON blob is only loaded when its session is written
+        for session_id, session_name, timestamp in self.con.execute(query, params):
+            (legacy_json,) = self.con.execute(
+                "SELECT chat_history FROM chat_history WHERE id = ?", (session_id,)
+            ).fetchone()
+            prefix = (
+                f'{{"session_id": {session_id}, "name": {json.dumps(session_name)}, '
+                f'"timestamp": {json.dumps(timestamp)}, '
+            )
+            for seq, message in enumerate(self._iter_chat_messages(session_id, legacy_json)):
+                out.write(f'{prefix}"seq": {seq}, "message": {message}}}\n')
+                messages += 1
+            sessions += 1
+        return sessions, messages
+
+    def import_jsonl(self, lines):
+        """
+        Bulk-load JSONL produced by export_jsonl in a single transaction.
+
+        Each source session becomes a new chat_history row; lines are consumed
+        one at a time. Returns (sessions, messages) imported.
+        """
+        batch_size = 1000
+        imported_at = self._get_timestamp()
+        chat_ids = {}
+        next_seq = {}
+        batch = []
+        messages = 0
+        with self.con:
+            for line_number, line in enumerate(lines, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                    message = record["message"]
+                except (json.JSONDecodeError, KeyError, TypeError) as e:
+                    raise ValueError(f"Invalid session record on line {line_number}: {e}") from e
+                if not isinstance(message, dict) or not isinstance(message.get("role"), str):
+                    raise ValueError(f"Invalid session record on line {line_number}: message must be an object with a string role")
+
+                key = (record.get("session_id"), record.get("name"), record.get("timestamp"))
+                if key not in chat_ids:
+                    chat_ids[key] = self._insert_chat(
+                        self.con, record.get("name") or "imported", record.get("timestamp") or imported_at, imported_at
+                    )
+                    next_seq[key] = 0
+                batch.append((chat_ids[key], next_seq[key], message["role"], json.dumps(message)))
+                next_seq[key] += 1
+                messages += 1
+
+                if len(batch) >= batch_size:
+                    self.con.executemany(
+                        "INSERT INTO chat_messages (chat_id, seq, role, message) VALUES (?, ?, ?, ?)", batch
+                    )
+                    batch.clear()
+            if batch:
+                self.con.executemany(
+                    "INSERT INTO chat_messages (chat_id, seq, role, message) VALUES (?, ?, ?, ?)", batch
+                )
+        return len(chat_ids), messages
+
+    def delete_chat_history(self, chat_id):
+        with self.con:
+            self.con.execute("DELETE FROM chat_messages WHERE chat_id = ?", (chat_id,))
+            self.con.execute("DELETE FROM chat_history WHERE id = ?", (chat_id,))
+
+    def start_retention(self, policy: Optional[RetentionPolicy] = None):
+        """
+        Prune and vacuum the database on a daemon thread so startup never
+        waits on it.
+        The thread uses its own connection; it is safe to keep using this instance.
+        """
+        if self.retention_thread and self.retention_thread.is_alive():
+            return self.retention_thread
+        policy = policy or RetentionPolicy.from_env()
+        self.retention_thread = threading.Thread(
+            target=self._run_retention,
+            args=(policy,),
+            name="terminus-db-retention",
+            daemon=True,
+        )
+        self.retention_thread.start()
+        return self.retention_thread
+
+    def _run_retention(self, policy: RetentionPolicy):
+        try:
+            con = sqlite3.connect(self.db_path, timeout=30)
+        except sqlite3.Error:
+            return
+        try:
+            self.apply_retention(policy, con)
+        except sqlite3.Error:
+            # Retention is best effort; a locked or busy database is retried next startup
+            pass
+        finally:
+            con.close()
+
+    def apply_retention(self, policy: RetentionPolicy, con=None):
+        """
+        Delete sessions that fall outside the policy, then reclaim the freed pages.
+        Imported sessions count from when they were imported.
+
+        Returns the number of deleted sessions.
+        """
+        con = con or self.con
+        deleted = 0
+
+        if policy.max_age_days:
+            cutoff = (datetime.datetime.now() - datetime.timedelta(days=policy.max_age_days)).isoformat()
+            deleted += self._delete_chats(con, "SELECT id FROM chat_history WHERE COALESCE(imported_at, timestamp) < ?", (cutoff,))
+
+        if policy.max_sessions:
+            deleted += self._delete_chats(
+                con,
+                "SELECT id FROM chat_history ORDER BY COALESCE(imported_at, timestamp) DESC, id DESC LIMIT -1 OFFSET ?",
+                (policy.max_sessions,)
+            )
+
+        if policy.max_bytes:
+            # Keep the newest sessions whose running payload size fits under the cap
+            deleted += self._delete_chats(con, """
+                SELECT id FROM (
+                    SELECT h.id, SUM(
+                        LENGTH(h.chat_history) + LENGTH(h.name) + LENGTH(h.timestamp)
+                        + COALESCE((SELECT SUM(LENGTH(m.message)) FROM chat_messages m WHERE m.chat_id = h.id), 0)
+                    ) OVER (ORDER BY COALESCE(h.imported_at, h.timestamp) DESC, h.id DESC) AS running
+                    FROM chat_history h
+                ) WHERE running > ?
+            """, (policy.max_bytes,))
+        con.commit()
+
+        self._incremental_vacuum(con)
+        return deleted
+
+    @staticmethod
+    def _delete_chats(con, ids_query, params):
+        ids = [(row[0],) for row in con.execute(ids_query, params).fetchall()]
+        con.executemany("DELETE FROM chat_messages WHERE chat_id = ?", ids)
+        con.executemany("DELETE FROM chat_history WHERE id = ?", ids)
+        return len(ids)
+
+    @staticmethod
+    def _incremental_vacuum(con):
+        auto_vacuum = con.execute("PRAGMA auto_vacuum").fetchone()[0]
+        freelist = con.execute("PRAGMA freelist_count").fetchone()[0]
+        if not freelist:
+            return
+        if auto_vacuum != 2:
+            # Databases created before auto_vacuum was enabled need one full VACUUM to switch modes
+            con.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            con.execute("VACUUM")
         else:
-            self.sh_cursor.execute(query)
-        
-        results = self.sh_cursor.fetchall()
-        
-        return [
-            {
-                "id": row[0],
-                "timestamp": row[1],
-                "role": row[2],
-                "content": row[3]
-            }
-            for row in results
-        ]
+            while freelist:
+                con.execute(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})")
+                con.commit()
+                freelist = con.execute("PRAGMA freelist_count").fetchone()[0]
+                time.sleep(VACUUM_STEP_PAUSE)
+        # Fold the WAL back into the main file so the space is returned to the filesystem
+        con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
 
-    def save_session_to_chat_history(self, name):
-        session_messages = self.retrieve_session_history()
-        chat_history = [
-            {"role": msg["role"], "content": msg["content"]}
-            for msg in session_messages
+    def get_db_stats(self):
+        """
+        Sizes of each table in chat_history.db plus every file under the database directory.
+        """
+        page_size = self.con.execute("PRAGMA page_size").fetchone()[0]
+        page_count = self.con.execute("PRAGMA page_count").fetchone()[0]
+        freelist = self.con.execute("PRAGMA freelist_count").fetchone()[0]
+
+        table_names = [
+            row[0] for row in self.con.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+            )
         ]
-        return self.insert_to_chat_history(name, chat_history)
+        try:
+            # dbstat reports real on-disk pages, including indexes attributed to their table
+            page_bytes = dict(self.con.execute("""
+                SELECT COALESCE(m.tbl_name, s.name), SUM(s.pgsize)
+                FROM dbstat s LEFT JOIN sqlite_master m ON m.name = s.name
+                GROUP BY 1
+            """).fetchall())
+        except sqlite3.OperationalError:
+            page_bytes = None
 
-    def clear_session_history(self):
-        self.sh_cursor.execute("DELETE FROM session_history")
-        self.session_history.commit()
+        tables = []
+        for name in table_names:
+            rows = self.con.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+            if page_bytes is not None:
+                size = page_bytes.get(name, 0)
+            else:
+                columns = [col[1] for col in self.con.execute(f'PRAGMA table_info("{name}")')]
+                length_sum = " + ".join(f'COALESCE(LENGTH("{col}"), 0)' for col in columns) or "0"
+                size = self.con.execute(f'SELECT COALESCE(SUM({length_sum}), 0) FROM "{name}"').fetchone()[0]
+            tables.append({"name": name, "rows": rows, "bytes": size})
 
-    def delete_chat_history(self, chat_id):
-        self.ch_cursor.execute("DELETE FROM chat_history WHERE id = ?", (chat_id,))
-        self.con.commit()
+        files = []
+        for entry in sorted(os.scandir(DEFAULT_DATABASE_DIR), key=lambda e: e.name):
+            if entry.is_file():
+                files.append({"name": entry.name, "bytes": entry.stat().st_size})
+
+        return {
+            "path": self.db_path,
+            "page_bytes": page_size * page_count,
+            "free_bytes": page_size * freelist,
+            "tables": tables,
+            "files": files,
+        }
 
     def close(self):
         self.con.close()
-        self.session_history.close()
 
     def __enter__(self):
         return self
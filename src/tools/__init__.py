@@ -9,6 +9,13 @@ from .subagent import SubAgent
 from .ls import Ls
 from .lint import Lint
 from .multi_edit import MultiEdit
+from .read_symbol import ReadSymbol
+from .glob_files import Glob
+from .code_search import CodeSearch
+from .apply_patch import ApplyPatch
+from .job_tools import JobStatus, JobOutput, JobKill
+from .sandbox import Sandbox
+from .python_exec import PythonExec
 
 __all__ = [
     "Grep",
@@ -21,5 +28,14 @@ __all__ = [
     "Ls",
     "SubAgent",
     "Lint",
-    "MultiEdit"
+    "MultiEdit",
+    "ReadSymbol",
+    "Glob",
+    "CodeSearch",
+    "ApplyPatch",
+    "JobStatus",
+    "JobOutput",
+    "JobKill",
+    "Sandbox",
+    "PythonExec"
 ]
\ No newline at end of file
@@ -0,0 +1,475 @@
+import difflib
+import os
+import re
+from dataclasses import dataclass, field
+from textwrap import dedent
+from typing import Dict, List, Optional, Tuple
+from src.models.tool import ToolSchema
+from .atomic_write import FileChangedError, atomic_write, decode_text
+from .checkpoints import get_checkpoints
+from .edit_file import FileEditor
+from .multi_edit import MultiEdit
+
+# Context lines a hunk may lose at either end and still apply, as with `patch --fuzz`
+MAX_FUZZ = 2
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+DEV_NULL = "/dev/null"
+
+
+class PatchError(Exception):
+    pass
+
+
+@dataclass
+class Hunk:
+    old_start: Optional[int]
+    lines: List[Tuple[str, str]] = field(default_factory=list)  # (op, text), op in " -+"
+    old_has_newline: bool = True
+    new_has_newline: bool = True
+
+
+@dataclass
+class FilePatch:
+    old_path: Optional[str]
+    new_path: Optional[str]
+    hunks: List[Hunk] = field(default_factory=list)
+
+
+@dataclass
+class FileChange:
+    path: str
+    original: Optional[bytes]   # None when the file is created
+    new_text: Optional[str]     # None when the file is deleted
+    newline: str = "\n"
+    mtime_ns: Optional[int] = None
+    mode: Optional[int] = None  # permission bits for recreating the file (a rename, or rolling back a deletion)
+    notes: List[str] = field(default_factory=list)
+
+
+def _strip_prefix(path: str) -> Optional[str]:
+    path = path.split("\t")[0].strip()
+    if path == DEV_NULL:
+        return None
+    if path.startswith(("a/", "b/")):
+        return path[2:]
+    return path
+
+
+def parse_unified_diff(text: str) -> List[FilePatch]:
+    """Split a unified diff (plain or git-style) into per-file hunks."""
+    patches: List[FilePatch] = []
+    lines = text.splitlines()
+    i = 0
+    current: Optional[FilePatch] = None
+    while i < len(lines):
+        line = lines[i]
+        if line.startswith("rename from ") and i + 1 < len(lines) and lines[i + 1].startswith("rename to "):
+            # git writes no ---/+++ header for a rename without changes
+            current = FilePatch(line[len("rename from "):].strip(), lines[i + 1][len("rename to "):].strip())
+            patches.append(current)
+            i += 2
+            continue
+        if line.startswith("--- ") and i + 1 < len(lines) and lines[i + 1].startswith("+++ "):
+            file_patch = FilePatch(_strip_prefix(line[4:]), _strip_prefix(lines[i + 1][4:]))
+            same_rename = current is not None and not current.hunks and (
+                (current.old_path, current.new_path) == (file_patch.old_path, file_patch.new_path)
+            )
+            if not same_rename:
+                current = file_patch
+                patches.append(current)
+            i += 2
+            continue
+        if line.startswith("@@"):
+            if current is None:
+                raise PatchError(f"Hunk before any ---/+++ file header at line {i + 1}.")
+            match = HUNK_HEADER.match(line)
+            old_count = new_count = None
+            if match:
+                old_count = int(match.group(2)) if match.group(2) is not None else 1
+                new_count = int(match.group(4)) if match.group(4) is not None else 1
+            hunk = Hunk(int(match.group(1)) if match else None)
+            i += 1
+            while i < len(lines):
+                body = lines[i]
+                if old_count is not None and old_count <= 0 and new_count <= 0 and not body.startswith("\\"):
+                    break
+                if body.startswith("\\"):
+                    # "\ No newline at end of file" refers to the line just before it
+                    if hunk.lines and hunk.lines[-1][0] != "+":
+                        hunk.old_has_newline = False
+                    if hunk.lines and hunk.lines[-1][0] != "-":
+                        hunk.new_has_newline = False
+                    i += 1
+                    continue
+                if body.startswith("@@") or (body.startswith("--- ") and i + 1 < len(lines) and lines[i + 1].startswith("+++ ")):
+                    break
+                if body.startswith("diff --git "):
+                    break
+                op = body[:1] if body[:1] in (" ", "-", "+") else " "
+                # Editors and models often drop the space in front of empty context lines
+                text_line = body[1:] if body[:1] in (" ", "-", "+") else body
+                hunk.lines.append((op, text_line))
+                if old_count is not None:
+                    if op in " -":
+                        old_count -= 1
+                    if op in " +":
+                        new_count -= 1
+                i += 1
+            current.hunks.append(hunk)
+            continue
+        i += 1
+    return patches
+
+
+def _same(a: str, b: str, tier: int) -> bool:
+    if tier == 0:
+        return a == b
+    if tier == 1:
+        return a.rstrip() == b.rstrip()
+    return a.strip() == b.strip()
+
+
+def _find(lines: List[str], block: List[str], expected: int, lowest: int) -> Optional[Tuple[int, int]]:
+    """(position, tier) of block in lines at or after lowest, nearest expected first; tiers loosen whitespace."""
+    last = len(lines) - len(block)
+    if last < lowest:
+        return None
+    expected = min(max(expected, lowest), last)
+    order = [expected]
+    for distance in range(1, max(expected - lowest, last - expected) + 1):
+        if expected + distance <= last:
+            order.append(expected + distance)
+        if expected - distance >= lowest:
+            order.append(expected - distance)
+    for tier in range(3):
+        for position in order:
+            if all(_same(lines[position + k], block[k], tier) for k in range(len(block))):
+                return position, tier
+    return None
+
+
+def apply_hunks(text: str, hunks: List[Hunk], label: str) -> Tuple[str, List[str]]:
+    """Apply hunks to text (LF line endings); returns the new text and notes on hunks that needed offset or fuzz."""
+    lines = text.split("\n")
+    has_newline = lines[-1] == ""
+    if has_newline:
+        lines.pop()
+    notes = []
+    offset = 0
+    lowest = 0
+    for number, hunk in enumerate(hunks, 1):
+        ops = hunk.lines
+        match = None
+        fuzz = 0
+        while fuzz <= MAX_FUZZ:
+            # Drop up to `fuzz` context lines from each end, never removed or added ones
+            head = 0
+            while head < fuzz and head < len(ops) and ops[head][0] == " ":
+                head += 1
+            tail = 0
+            while tail < fuzz and tail < len(ops) - head and ops[len(ops) - 1 - tail][0] == " ":
+                tail += 1
+            trimmed = ops[head:len(ops) - tail]
+            old_block = [t for op, t in trimmed if op in " -"]
+            if hunk.old_start is None:
+                expected = lowest
+            else:
+                expected = max(hunk.old_start - 1, 0) + offset + head
+            if not old_block:
+                # Pure insertion: old_start names the line it goes after
+                position = min(max(expected + (1 if hunk.old_start else 0), lowest), len(lines))
+                match = (position, 0)
+            else:
+                match = _find(lines, old_block, expected, lowest)
+            if match is not None or fuzz == MAX_FUZZ:
+                break
+            fuzz += 1
+        if match is None:
+            removed = [t for op, t in ops if op == "-"][:3]
+            raise PatchError(
+                f"{label}: hunk {number} does not apply; its context and removed lines were not found"
+                + (f" (starting with {removed[0]!r})" if removed else "")
+                + ". Re-read the file and regenerate the hunk."
+            )
+        position, tier = match
+        replacement = []
+        cursor = position
+        for op, t in trimmed:
+            if op == " ":
+                # Keep the file's own version of context lines
+                replacement.append(lines[cursor])
+                cursor += 1
+            elif op == "-":
+                cursor += 1
+            else:
+                replacement.append(t)
+        lines[position:cursor] = replacement
+        if hunk.old_start is not None:
+            drift = position - (max(hunk.old_start - 1, 0) + offset + head)
+            if drift or fuzz or tier:
+                details = []
+                if drift:
+                    details.append(f"offset {drift:+d}")
+                if fuzz:
+                    details.append(f"fuzz {fuzz}")
+                if tier:
+                    details.append("whitespace differences ignored")
+                notes.append(f"{label}: hunk {number} applied at line {position + 1} ({', '.join(details)})")
+            offset += drift
+        offset += len(replacement) - (cursor - position)
+        lowest = position + len(replacement)
+        if lowest == len(lines):
+            # Only a hunk reaching the end of the file can change its final newline
+            if not hunk.new_has_newline:
+                has_newline = False
+            elif not hunk.old_has_newline:
+                has_newline = True
+    return "\n".join(lines) + ("\n" if has_newline and lines else ""), notes
+
+
+class ApplyPatch(ToolSchema):
+    def __init__(self):
+        self.name = "apply_patch"
+        self.file_editor = FileEditor()
+
+    def description(self):
+        return dedent(f"""
+        Applies changes to many files at once, with one preview, one approval and an all-or-nothing write.
+        Use this for refactors that touch several files instead of many file_editor calls.
+
+        Provide either or both of:
+        - `patch`: a unified diff (as produced by `diff -u` or `git diff`). Paths are relative to the working directory;
+          `--- /dev/null` creates a file, `+++ /dev/null` deletes one and different `---`/`+++` paths rename one. Hunks are located by their context, so line
+          numbers may be off, whitespace differences are tolerated, and up to {MAX_FUZZ} context lines at either end may be stale.
+        - `edits`: a list of {{file_path, old_string, new_string}} replacements. Every old_string must occur exactly once
+          in its file; an empty old_string with a file that does not exist creates it with new_string.
+
+        Every change is validated against the current contents before anything is written. If any hunk or edit fails,
+        or a write fails part-way, no file is left changed.
+        """)
+
+    def json_schema(self):
+        return {
+        "type": "function",
+        "function": {
+            "name": self.name,
+            "description": self.description(),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "patch": {
+                        "type": "string",
+                        "description": "a unified diff covering one or more files"
+                    },
+                    "edits": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "file_path": {"type": "string"},
+                                "old_string": {"type": "string"},
+                                "new_string": {"type": "string"}
+                            },
+                            "required": ["file_path", "old_string", "new_string"]
+                        },
+                        "description": "exact string replacements, possibly across several files"
+                    }
+                }
+            }
+        }
+    }
+
+    @staticmethod
+    def _load(path: str, changes: Dict[str, FileChange]) -> FileChange:
+        key = os.path.realpath(path)
+        change = changes.get(key)
+        if change is not None:
+            return change
+        try:
+            with open(key, "rb") as f:
+                stat = os.fstat(f.fileno())
+                data = f.read()
+        except FileNotFoundError:
+            change = FileChange(path, None, None)
+        else:
+            try:
+                text, newline = decode_text(data)
+            except UnicodeDecodeError as e:
+                raise PatchError(f"{path}: not a UTF-8 text file.") from e
+            change = FileChange(path, data, text, newline, stat.st_mtime_ns, stat.st_mode & 0o7777)
+        changes[key] = change
+        return change
+
+    def _plan_rename(self, file_patch: FilePatch, changes: Dict[str, FileChange]):
+        """A rename (with or without hunks) becomes a deletion of the old path and a creation of the new one."""
+        old_path, new_path = file_patch.old_path, file_patch.new_path
+        source = self._load(old_path, changes)
+        if source.new_text is None:
+            raise PatchError(f"{old_path}: file not found (the patch renames it to {new_path}).")
+        target = self._load(new_path, changes)
+        if target.new_text is not None:
+            raise PatchError(f"{new_path}: the patch renames {old_path} to this file, but it already exists.")
+        new_text, notes = apply_hunks(source.new_text, file_patch.hunks, old_path)
+        source.new_text = None
+        target.new_text = new_text
+        target.newline = source.newline
+        target.mode = source.mode
+        target.notes.extend(notes)
+        target.notes.append(f"{new_path}: renamed from {old_path}")
+
+    def plan(self, patch: Optional[str], edits: Optional[list]) -> Dict[str, FileChange]:
+        """Work out the new contents of every touched file without writing anything."""
+        changes: Dict[str, FileChange] = {}
+        for file_patch in parse_unified_diff(patch or ""):
+            path = file_patch.new_path or file_patch.old_path
+            if path is None:
+                raise PatchError("A file header names /dev/null on both sides.")
+            change = self._load(path, changes)
+            if (file_patch.old_path and change.new_text is None
+                    and os.path.realpath(file_patch.old_path) != os.path.realpath(path)):
+                # Different paths are a rename unless the new one exists, as with `diff -u file.orig file`
+                self._plan_rename(file_patch, changes)
+                continue
+            if file_patch.old_path is None:
+                if change.new_text is not None:
+                    raise PatchError(f"{path}: the patch creates this file, but it already exists.")
+                text = ""
+            else:
+                if change.new_text is None:
+                    raise PatchError(f"{path}: file not found.")
+                text = change.new_text
+            new_text, notes = apply_hunks(text, file_patch.hunks, path)
+            change.notes.extend(notes)
+            if file_patch.new_path is None:
+                if new_text.strip():
+                    raise PatchError(f"{path}: the patch deletes this file, but its hunks do not remove all of its content.")
+                change.new_text = None
+            else:
+                change.new_text = new_text
+
+        grouped: Dict[str, List[dict]] = {}
+        for index, edit in enumerate(edits or []):
+            if not isinstance(edit, dict) or not edit.get("file_path"):
+                raise PatchError(f"Edit {index}: needs file_path, old_string and new_string.")
+            edit = {**edit, "index": index}
+            grouped.setdefault(edit["file_path"], []).append(edit)
+        for path, file_edits in grouped.items():
+            change = self._load(path, changes)
+            if change.new_text is None:
+                if len(file_edits) == 1 and not file_edits[0].get("old_string"):
+                    change.new_text = file_edits[0].get("new_string", "")
+                    continue
+                raise PatchError(f"Edit {file_edits[0]['index']}: file not found: {path}")
+            spans = MultiEdit.plan_edits(
+                change.new_text,
+                [e.get("old_string", "") for e in file_edits],
+                [e.get("new_string", "") for e in file_edits],
+            )
+            if isinstance(spans, str):
+                # plan_edits numbers edits within the file; report the index in the request
+                match = re.match(r"Edit (\d+)", spans)
+                if match:
+                    spans = f"Edit {file_edits[int(match.group(1))]['index']}" + spans[match.end():]
+                raise PatchError(f"{path}: {spans}")
+            change.new_text = MultiEdit.apply_edits(change.new_text, spans)
+            change.notes.extend(
+                f"{path}: edit {file_edits[index]['index']} applied by {match.describe()}"
+                for _, _, _, index, match in spans if match.tier != "exact"
+            )
+
+        if not changes:
+            raise PatchError("Nothing to apply: give a unified diff in `patch` or a list of `edits`.")
+        return changes
+
+    @staticmethod
+    def _old_text(change: FileChange) -> str:
+        return decode_text(change.original)[0] if change.original is not None else ""
+
+    def diff_lines(self, changes: Dict[str, FileChange]) -> List[str]:
+        lines = []
+        for change in changes.values():
+            lines.extend(difflib.unified_diff(
+                self._old_text(change).splitlines(keepends=True),
+                (change.new_text or "").splitlines(keepends=True),
+                fromfile=f"a/{change.path}" if change.original is not None else DEV_NULL,
+                tofile=f"b/{change.path}" if change.new_text is not None else DEV_NULL,
+                lineterm='',
+                n=3
+            ))
+        return lines
+
+    def commit(self, changes: List[FileChange]):
+        """Write every change; on any failure restore the files already written and re-raise."""
+        done: List[FileChange] = []
+        try:
+            for change in changes:
+                if change.new_text is None:
+                    get_checkpoints().snapshot(change.path)
+                    os.remove(change.path)
+                else:
+                    if change.original is None:
+                        directory = os.path.dirname(change.path)
+                        if directory:
+                            os.makedirs(directory, exist_ok=True)
+                    atomic_write(
+                        change.path, change.new_text, expected_mtime_ns=change.mtime_ns, newline=change.newline, mode=change.mode
+                    )
+                done.append(change)
+        except BaseException:
+            for change in reversed(done):
+                try:
+                    if change.original is None:
+                        os.remove(change.path)
+                    else:
+                        atomic_write(change.path, change.original, checkpoint=False, mode=change.mode)
+                except OSError:
+                    pass
+            raise
+
+    def run(self, patch: str = None, edits: list = None, status_callback=None):
+        editor = self.file_editor
+        try:
+            changes = self.plan(patch, edits)
+        except PatchError as e:
+            return f"{editor.RED}Error:{editor.RESET} {e}\n\nNo files were changed."
+        except OSError as e:
+            return f"{editor.RED}Error reading files:{editor.RESET} {e}\n\nNo files were changed."
+
+        changed = [c for c in changes.values() if c.new_text != (None if c.original is None else self._old_text(c))]
+        if not changed:
+            return "No changes: the patch leaves every file as it is."
+
+        diff = self.diff_lines({c.path: c for c in changed})
+        editor.show_diff(f"{len(changed)} file{'s' if len(changed) != 1 else ''}", diff, status_callback, title="Proposed changes to")
+        decision = editor.authorize([c.path for c in changed], status_callback, tool=self.name)
+        if decision.action != "allow":
+            return editor.rejection(decision)
+
+        try:
+            self.commit(changed)
+        except FileChangedError as e:
+            return f"{editor.RED}Error:{editor.RESET} {e}\n\nNo files were changed."
+        except OSError as e:
+            return f"{editor.RED}Error writing files:{editor.RESET} {e}\n\nAll files were restored; no files were changed."
+
+        summary = []
+        for change in changed:
+            old_lines = self._old_text(change).splitlines()
+            new_lines = (change.new_text or "").splitlines()
+            if change.original is None:
+                summary.append(f"  created {change.path} (+{len(new_lines)})")
+            elif change.new_text is None:
+                summary.append(f"  deleted {change.path}")
+            else:
+                added = removed = 0
+                for line in difflib.unified_diff(old_lines, new_lines, lineterm='', n=0):
+                    if line.startswith("+") and not line.startswith("+++"):
+                        added += 1
+                    elif line.startswith("-") and not line.startswith("---"):
+                        removed += 1
+                summary.append(f"  modified {change.path} (+{added} -{removed})")
+        notes = [note for change in changed for note in change.notes]
+        result = f"{editor.GREEN}✓ Patch applied to {len(changed)} file{'s' if len(changed) != 1 else ''}{editor.RESET}\n" + "\n".join(summary)
+        if notes:
+            result += "\n\nNotes:\n" + "\n".join(f"  {note}" for note in notes)
+        return result
@@ -0,0 +1,167 @@
+"""
+Crash-safe file writes for the editing tools.
+
+New content goes to a temporary file in the target's directory, is fsync'ed
+and then renamed over the target with os.replace, so a crash or Ctrl+C
+leaves either the old file or the new one, never a truncated mix. The
+target's permission bits (and owner, where allowed) are carried over, and
+text is written back with the line endings the file had.
+
+Writers to the same path are serialized by a per-path lock within the
+process and an flock on the old file across processes. Passing the mtime
+seen when the file was read makes the write fail with FileChangedError if
+someone else changed it in the meantime.
+"""
+
+import os
+import tempfile
+import threading
+from typing import Dict, Optional, Tuple, Union
+from src.tools.checkpoints import get_checkpoints
+from src.tools.read_cache import read_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# New files get the usual permissions, not mkstemp's 0600
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+_path_locks: Dict[str, threading.Lock] = {}
+_path_locks_lock = threading.Lock()
+
+
+class FileChangedError(Exception):
+    """The file was modified after it was read, so writing would discard someone else's change."""
+
+
+def path_lock(path: str) -> threading.Lock:
+    """The in-process lock guarding writes to path."""
+    key = os.path.realpath(path)
+    with _path_locks_lock:
+        lock = _path_locks.get(key)
+        if lock is None:
+            lock = _path_locks[key] = threading.Lock()
+        return lock
+
+
+def detect_newline(data: bytes) -> str:
+    """CRLF when every line of data ends with it, otherwise LF."""
+    crlf = data.count(b"\r\n")
+    return "\r\n" if crlf and crlf == data.count(b"\n") else "\n"
+
+
+def decode_text(data: bytes, encoding: str = "utf-8") -> Tuple[str, str]:
+    """
+    (text, line ending) for data. Uniformly CRLF text comes back with LF
+    line endings; anything else, including files mixing both, is returned
+    as it is so writing it back with LF keeps every CR.
+    """
+    newline = detect_newline(data)
+    text = data.decode(encoding)
+    return (text.replace("\r\n", "\n") if newline == "\r\n" else text), newline
+
+
+def read_text(path: str, encoding: str = "utf-8") -> Tuple[str, str, os.stat_result]:
+    """
+    (text, the file's line ending, stat) for path, decoded by decode_text.
+    Pass the line ending and stat.st_mtime_ns back to atomic_write to
+    preserve the style and detect concurrent changes.
+    """
+    with open(path, "rb") as f:
+        stat = os.fstat(f.fileno())
+        data = f.read()
+    text, newline = decode_text(data, encoding)
+    return text, newline, stat
+
+
+def _fsync_directory(directory: str):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write(
+    path: str,
+    content: Union[str, bytes],
+    expected_mtime_ns: Optional[int] = None,
+    newline: Optional[str] = None,
+    encoding: str = "utf-8",
+    checkpoint: bool = True,
+    mode: Optional[int] = None,
+) -> os.stat_result:
+    """
+    Replace path with content atomically and return the new file's stat.
+
+    Text content with LF line endings is written with newline (CRLF or LF)
+    when given. If expected_mtime_ns is given and the file's mtime no
+    longer matches (or it vanished), FileChangedError is raised and
+    nothing is written. Unless checkpoint is False, the previous contents
+    are recorded first so /undo can bring them back. mode sets the
+    permission bits of a file that does not exist yet.
+    """
+    target = os.path.realpath(path)
+    if isinstance(content, str):
+        if newline and newline != "\n":
+            content = content.replace("\r\n", "\n").replace("\n", newline)
+        content = content.encode(encoding)
+
+    with path_lock(target):
+        lock_fd = None
+        try:
+            if fcntl is not None:
+                try:
+                    lock_fd = os.open(target, os.O_RDONLY)
+                    fcntl.flock(lock_fd, fcntl.LOCK_EX)
+                except OSError:
+                    lock_fd = None
+            try:
+                stat = os.stat(target)
+            except FileNotFoundError:
+                stat = None
+            if expected_mtime_ns is not None and (stat is None or stat.st_mtime_ns != expected_mtime_ns):
+                raise FileChangedError(f"{path} was modified since it was read; read it again before editing.")
+            if checkpoint:
+                get_checkpoints().snapshot(target)
+
+            directory = os.path.dirname(target)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(target)}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(content)
+                    f.flush()
+                    os.fsync(f.fileno())
+                if stat is not None:
+                    mode = stat.st_mode & 0o7777
+                elif mode is None:
+                    mode = 0o666 & ~_UMASK
+                os.chmod(tmp_path, mode)
+                if stat is not None and hasattr(os, "chown"):
+                    try:
+                        os.chown(tmp_path, stat.st_uid, stat.st_gid)
+                    except OSError:
+                        # Only root can give a file away; keeping our own ownership is fine
+                        pass
+                os.replace(tmp_path, target)
+            except BaseException:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+                raise
+            _fsync_directory(directory)
+        finally:
+            if lock_fd is not None:
+                os.close(lock_fd)
+
+    read_cache.invalidate(target)
+    return os.stat(target)
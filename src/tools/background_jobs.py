@@ -0,0 +1,197 @@
+"""
+Background jobs started by command_executor with background=true.
+
+Each job runs in its own process group. A reader thread copies its combined
+stdout and stderr into a fixed-size ring buffer file under .db/jobs/, so a dev
+server that logs forever costs a bounded amount of disk and the latest output
+is always available. Output is addressed by absolute byte offset: a caller
+passes back the offset it got last time and receives only what is new (and
+is told if some of it was already overwritten). Every job is killed, and its
+buffer removed, when the program exits.
+"""
+
+import atexit
+import itertools
+import os
+import shutil
+import signal
+import subprocess
+import threading
+import time
+import weakref
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from src.constants import DEFAULT_DATABASE_DIR
+from src.tools.shell_session import kill_process_group
+
+JOB_DIR = os.path.join(DEFAULT_DATABASE_DIR, "jobs")
+JOB_BUFFER_BYTES = 1024 * 1024
+MAX_OUTPUT_READ_BYTES = 32 * 1024
+
+
+class RingBuffer:
+    """The last capacity bytes written, kept in a file of that size."""
+
+    def __init__(self, path: str, capacity: int = JOB_BUFFER_BYTES):
+        self.path = path
+        self.capacity = capacity
+        self.written = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, "w+b")
+
+    def write(self, data: bytes):
+        with self._lock:
+            if len(data) > self.capacity:
+                self.written += len(data) - self.capacity
+                data = data[-self.capacity:]
+            position = self.written % self.capacity
+            first = data[:self.capacity - position]
+            self._file.seek(position)
+            self._file.write(first)
+            if len(first) < len(data):
+                self._file.seek(0)
+                self._file.write(data[len(first):])
+            self._file.flush()
+            self.written += len(data)
+
+    def read(self, offset: int, limit: int) -> Tuple[bytes, int, int]:
+        """Up to limit bytes from absolute offset: (data, offset after it, bytes skipped because overwritten)."""
+        with self._lock:
+            start = max(0, self.written - self.capacity)
+            skipped = max(0, start - offset)
+            offset = min(max(offset, start), self.written)
+            size = min(limit, self.written - offset)
+            position = offset % self.capacity
+            self._file.seek(position)
+            data = self._file.read(min(size, self.capacity - position))
+            if len(data) < size:
+                self._file.seek(0)
+                data += self._file.read(size - len(data))
+            return data, offset + len(data), skipped
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+@dataclass
+class Job:
+    id: int
+    command: str
+    cwd: str
+    process: subprocess.Popen
+    output: RingBuffer
+    started_at: float = field(default_factory=time.time)
+    ended_at: Optional[float] = None
+    killed: bool = False
+
+    @property
+    def returncode(self) -> Optional[int]:
+        return self.process.poll()
+
+    def state(self) -> str:
+        code = self.returncode
+        if code is None:
+            return "running"
+        if self.killed:
+            return "killed"
+        return f"exited with code {code}"
+
+    def summary(self) -> str:
+        elapsed = (self.ended_at or time.time()) - self.started_at
+        return (
+            f"job {self.id}: {self.state()} after {elapsed:.0f}s, "
+            f"{self.output.written} bytes of output, `{self.command}`"
+        )
+
+
+class JobManager:
+    def __init__(self, root: Optional[str] = None):
+        self.directory = os.path.join(os.path.realpath(root or os.getcwd()), JOB_DIR, str(os.getpid()))
+        self.jobs: Dict[int, Job] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        _managers.add(self)
+
+    def start(self, command: str, cwd: Optional[str] = None, env: Optional[Dict[str, str]] = None) -> Job:
+        bash = shutil.which("bash")
+        with self._lock:
+            job_id = next(self._ids)
+            output = RingBuffer(os.path.join(self.directory, f"{job_id}.log"))
+            try:
+                process = subprocess.Popen(
+                    [bash, "-c", command] if bash else command,
+                    shell=not bash,
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    cwd=cwd,
+                    env=env,
+                    start_new_session=True,
+                )
+            except BaseException:
+                output.close()
+                raise
+            job = self.jobs[job_id] = Job(job_id, command, cwd or os.getcwd(), process, output)
+        threading.Thread(target=self._pump, args=(job,), name=f"job-{job_id}", daemon=True).start()
+        return job
+
+    @staticmethod
+    def _pump(job: Job):
+        with job.process.stdout:
+            for chunk in iter(lambda: job.process.stdout.read1(65536), b""):
+                try:
+                    job.output.write(chunk)
+                except ValueError:
+                    # The buffer was closed on exit
+                    break
+        job.process.wait()
+        job.ended_at = time.time()
+
+    def get(self, job_id: int) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        return [self.jobs[job_id] for job_id in sorted(self.jobs)]
+
+    def read(self, job_id: int, offset: int = 0, limit: int = MAX_OUTPUT_READ_BYTES) -> Tuple[str, int, int]:
+        data, next_offset, skipped = self.jobs[job_id].output.read(offset, limit)
+        return data.decode("utf-8", errors="replace"), next_offset, skipped
+
+    def kill(self, job_id: int) -> bool:
+        """Kill the job's whole process group. False if it had already finished."""
+        job = self.jobs[job_id]
+        if job.returncode is not None:
+            return False
+        job.killed = True
+        kill_process_group(job.process.pid, job.process)
+        return True
+
+    def close(self):
+        for job in self.list():
+            if job.returncode is None:
+                job.killed = True
+                try:
+                    os.killpg(job.process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+            job.output.close()
+        self.jobs.clear()
+        try:
+            os.rmdir(self.directory)
+        except OSError:
+            pass
+
+
+_managers = weakref.WeakSet()
+
+
+@atexit.register
+def close_jobs():
+    for manager in list(_managers):
+        manager.close()
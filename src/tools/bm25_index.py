@@ -0,0 +1,370 @@
+"""
+BM25 index over function-level chunks of the workspace, for code_search.
+
+Source files are cut into chunks along the symbol index's spans (one per
+function or method, a header chunk per class, and windows over the code in
+between); other text files are cut into fixed windows. Identifiers are split
+on camelCase and snake_case boundaries, so `refreshAccessToken` is found by
+"refresh token". Postings live in .db/code_search.db and are updated per
+changed file; nothing leaves the machine.
+"""
+
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+from src.constants import DEFAULT_DATABASE_DIR
+from src.tools.file_watcher import register_cache, sync_changes, watching
+from src.tools.repo_map import SOURCE_EXTENSIONS
+from src.tools.symbol_index import symbol_index
+from src.tools.workspace_tree import get_workspace_tree, relative_path
+
+INDEX_VERSION = 1
+CODE_SEARCH_DB_PATH = os.path.join(DEFAULT_DATABASE_DIR, "code_search.db")
+TEXT_EXTENSIONS = {".md", ".rst", ".txt", ".toml", ".yaml", ".yml", ".json", ".ini", ".cfg", ".sql", ".sh", ".html", ".css"}
+MAX_INDEXED_FILE_BYTES = 512 * 1024
+WINDOW_LINES = 60
+MAX_CHUNK_LINES = 150
+# Without a watcher, re-stat the tree at most this often; invalidate() forces the next refresh
+REFRESH_INTERVAL = 5.0
+COMMIT_BATCH = 200
+# A symbol's own name says more about the chunk than any other word in it
+NAME_WEIGHT = 3
+K1 = 1.2
+B = 0.75
+
+WORD = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+PART = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+STOPWORDS = {
+    "the", "and", "for", "not", "none", "true", "false", "self", "this", "that", "with", "from", "import",
+    "return", "def", "class", "if", "else", "elif", "in", "is", "of", "to", "or", "an", "as", "be", "on",
+    "it", "we", "do", "where", "how", "what", "which", "var", "let", "const", "new", "null", "nil",
+}
+
+
+def stem(word: str) -> str:
+    """Crude suffix stripping so `tokens`, `refreshing` and `refreshed` meet `token` and `refresh`."""
+    for suffix in ("ing", "ed", "es", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3 and not word.endswith("ss"):
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased, stemmed terms: every part of each identifier, plus the whole identifier when it has several."""
+    terms = []
+    for word in WORD.findall(text):
+        parts = [part.lower() for part in PART.findall(word)]
+        for part in parts:
+            if len(part) > 1 and part not in STOPWORDS:
+                terms.append(stem(part))
+        if len(parts) > 1:
+            terms.append(word.lower())
+    return terms
+
+
+def chunk_spans(text: str, path: str) -> List[Tuple[int, int, str]]:
+    """(first line, last line, symbol name) chunks covering a file, 1-based and inclusive."""
+    lines = text.count("\n") + (0 if text.endswith("\n") else 1)
+    spans = []
+    if os.path.splitext(path)[1].lower() in SOURCE_EXTENSIONS:
+        symbols = symbol_index.symbols_for_text(text, path)
+        parents = {symbol.parent for symbol in symbols if symbol.parent}
+        for symbol in symbols:
+            if symbol.qualname in parents:
+                # Classes with methods contribute their header; the methods are chunks of their own
+                first_child = min((s.start for s in symbols if s.parent == symbol.qualname), default=symbol.end + 1)
+                spans.append((symbol.start, max(symbol.start, first_child - 1), symbol.qualname))
+            else:
+                spans.append((symbol.start, symbol.end, symbol.qualname))
+
+    chunks = []
+    for start, end, name in spans:
+        for window_start in range(start, end + 1, MAX_CHUNK_LINES):
+            chunks.append((window_start, min(end, window_start + MAX_CHUNK_LINES - 1), name))
+
+    # Code outside any symbol (imports, module constants, scripts) in windows
+    covered = set()
+    for start, end, _ in spans:
+        covered.update(range(start, end + 1))
+    window_start = None
+    for line in range(1, lines + 2):
+        inside = line <= lines and line not in covered
+        if inside and window_start is None:
+            window_start = line
+        if window_start is not None and (not inside or line - window_start >= WINDOW_LINES):
+            chunks.append((window_start, line - 1, ""))
+            window_start = line if inside else None
+    return sorted(chunks)
+
+
+class BM25Index:
+    """Chunk postings for the files under one root, stored in sqlite and refreshed per changed file."""
+
+    def __init__(self, root: str, db_path: str = CODE_SEARCH_DB_PATH):
+        self.root = os.path.realpath(root)
+        self.db_path = db_path if os.path.isabs(db_path) else os.path.join(self.root, db_path)
+        self._lock = threading.Lock()
+        self._last_refresh = 0.0
+        self._changed: Set[str] = set()
+        self._stale = False
+        self._changes_lock = threading.Lock()
+        self._con = None
+
+    def _connect(self):
+        if self._con is not None:
+            return self._con
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        con = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        version = con.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        root = con.execute("SELECT value FROM meta WHERE key = 'root'").fetchone()
+        if version != (str(INDEX_VERSION),) or root != (self.root,):
+            for table in ("postings", "chunks", "files"):
+                con.execute(f"DROP TABLE IF EXISTS {table}")
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT UNIQUE NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL
+            )
+        """)
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                file_id INTEGER NOT NULL,
+                start INTEGER NOT NULL,
+                end INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                length INTEGER NOT NULL
+            )
+        """)
+        con.execute("CREATE INDEX IF NOT EXISTS chunks_file ON chunks (file_id)")
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                chunk_id INTEGER NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, chunk_id)
+            ) WITHOUT ROWID
+        """)
+        con.execute("CREATE INDEX IF NOT EXISTS postings_chunk ON postings (chunk_id)")
+        con.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (str(INDEX_VERSION),))
+        con.execute("INSERT OR REPLACE INTO meta VALUES ('root', ?)", (self.root,))
+        con.commit()
+        self._con = con
+        return con
+
+    def invalidate(self, path: Optional[str] = None):
+        """Make the next search re-check path, or the whole tree when path is None."""
+        with self._changes_lock:
+            if path is None:
+                self._stale = True
+                return
+            rel_path = relative_path(self.root, path)
+            if rel_path is not None:
+                self._changed.add(rel_path)
+
+    def warm(self):
+        """Bring the index up to date on a background thread, so the first search does not pay for it."""
+        threading.Thread(target=self.refresh, kwargs={"force": True}, name="terminus-code-index", daemon=True).start()
+
+    @staticmethod
+    def indexable(rel_path: str) -> bool:
+        ext = os.path.splitext(rel_path)[1].lower()
+        return ext in SOURCE_EXTENSIONS or ext in TEXT_EXTENSIONS
+
+    def refresh(self, force: bool = False, timeout: Optional[float] = None) -> Optional[int]:
+        """
+        Re-index files whose mtime or size changed and drop deleted ones. Returns
+        how many files changed, or None if another thread (such as the warmer)
+        still holds the index after timeout seconds.
+        """
+        sync_changes()
+        if not self._lock.acquire(timeout=-1 if timeout is None else timeout):
+            return None
+        try:
+            with self._changes_lock:
+                changed_paths, stale = self._changed, self._stale
+                self._changed, self._stale = set(), False
+            con = self._connect()
+            if not force and not stale and self._last_refresh and watching(self.root):
+                return self._refresh_paths(con, changed_paths)
+            if not force and not stale and time.monotonic() - self._last_refresh < REFRESH_INTERVAL:
+                return 0
+            known = {path: (file_id, mtime_ns, size) for file_id, path, mtime_ns, size in
+                     con.execute("SELECT id, path, mtime_ns, size FROM files")}
+            changed = []
+            for rel_path in get_workspace_tree(self.root).files():
+                if not self.indexable(rel_path):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.root, rel_path))
+                except OSError:
+                    continue
+                entry = known.pop(rel_path, None)
+                if entry is None or entry[1] != stat.st_mtime_ns or entry[2] != stat.st_size:
+                    changed.append((rel_path, stat, entry[0] if entry else None))
+
+            pending = 0
+            for file_id, _, _ in known.values():
+                self._remove(con, file_id)
+                pending += 1
+            for rel_path, stat, file_id in changed:
+                if file_id is not None:
+                    self._remove(con, file_id)
+                self._add(con, rel_path, stat)
+                pending += 1
+                if pending % COMMIT_BATCH == 0:
+                    con.commit()
+            con.commit()
+            self._last_refresh = time.monotonic()
+            return pending
+        finally:
+            self._lock.release()
+
+    def _refresh_paths(self, con, rel_paths: Set[str]) -> int:
+        """Re-check only the given paths (and whatever lies under them), as reported by the watcher."""
+        if not rel_paths:
+            return 0
+        present, gone = get_workspace_tree(self.root).resolve_changes(rel_paths)
+        pending = 0
+        for rel_path in gone:
+            rows = con.execute(
+                "SELECT id FROM files WHERE path = ? OR substr(path, 1, ?) = ?",
+                (rel_path, len(rel_path) + 1, rel_path + "/"),
+            ).fetchall()
+            for (file_id,) in rows:
+                self._remove(con, file_id)
+                pending += 1
+        for rel_path in present:
+            if not self.indexable(rel_path):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.root, rel_path))
+            except OSError:
+                continue
+            row = con.execute("SELECT id, mtime_ns, size FROM files WHERE path = ?", (rel_path,)).fetchone()
+            if row is not None and row[1] == stat.st_mtime_ns and row[2] == stat.st_size:
+                continue
+            if row is not None:
+                self._remove(con, row[0])
+            self._add(con, rel_path, stat)
+            pending += 1
+        con.commit()
+        return pending
+
+    def _remove(self, con, file_id: int):
+        chunk_ids = [(chunk_id,) for (chunk_id,) in con.execute("SELECT id FROM chunks WHERE file_id = ?", (file_id,))]
+        con.executemany("DELETE FROM postings WHERE chunk_id = ?", chunk_ids)
+        con.execute("DELETE FROM chunks WHERE file_id = ?", (file_id,))
+        con.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def _add(self, con, rel_path: str, stat: os.stat_result):
+        cursor = con.execute(
+            "INSERT INTO files (path, mtime_ns, size) VALUES (?, ?, ?)",
+            (rel_path, stat.st_mtime_ns, stat.st_size),
+        )
+        file_id = cursor.lastrowid
+        if stat.st_size > MAX_INDEXED_FILE_BYTES:
+            return
+        try:
+            with open(os.path.join(self.root, rel_path), "rb") as f:
+                data = f.read()
+        except OSError:
+            return
+        if b"\x00" in data[:8192]:
+            return
+        text = data.decode("utf-8", errors="replace")
+        lines = text.split("\n")
+        path_terms = tokenize(rel_path)
+        for start, end, name in chunk_spans(text, rel_path):
+            terms = tokenize("\n".join(lines[start - 1:end]))
+            if not terms:
+                continue
+            terms += path_terms + tokenize(name) * NAME_WEIGHT
+            cursor = con.execute(
+                "INSERT INTO chunks (file_id, start, end, name, length) VALUES (?, ?, ?, ?, ?)",
+                (file_id, start, end, name, len(terms)),
+            )
+            chunk_id = cursor.lastrowid
+            con.executemany(
+                "INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)",
+                ((term, chunk_id, tf) for term, tf in Counter(terms).items()),
+            )
+
+    def search(self, query: str, limit: int = 10, path_prefix: str = "", timeout: Optional[float] = None) -> Optional[List[dict]]:
+        """
+        Top chunks for query by BM25, each as a dict with path, start, end, name
+        and score. None if the index is still being built after timeout seconds.
+        """
+        if self.refresh(timeout=timeout) is None:
+            return None
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        if not self._lock.acquire(timeout=-1 if timeout is None else timeout):
+            return None
+        try:
+            con = self._connect()
+            total, total_length = con.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM chunks").fetchone()
+            if not total:
+                return []
+            average_length = total_length / total
+
+            frequencies = {term: con.execute("SELECT COUNT(*) FROM postings WHERE term = ?", (term,)).fetchone()[0] for term in terms}
+            present = [term for term in terms if frequencies[term]]
+            # Terms in most chunks barely move the ranking but cost the most to score
+            selective = [term for term in present if frequencies[term] <= total / 2] or present
+
+            scores: Dict[int, float] = {}
+            lengths: Dict[int, int] = {}
+            for term in selective:
+                df = frequencies[term]
+                idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+                rows = con.execute(
+                    "SELECT p.chunk_id, p.tf, c.length FROM postings p JOIN chunks c ON c.id = p.chunk_id WHERE p.term = ?",
+                    (term,),
+                )
+                for chunk_id, tf, length in rows:
+                    lengths[chunk_id] = length
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (K1 + 1) / (
+                        tf + K1 * (1 - B + B * length / average_length)
+                    )
+
+            results = []
+            for chunk_id, score in sorted(scores.items(), key=lambda item: -item[1]):
+                row = con.execute(
+                    "SELECT f.path, c.start, c.end, c.name FROM chunks c JOIN files f ON f.id = c.file_id WHERE c.id = ?",
+                    (chunk_id,),
+                ).fetchone()
+                if row is None or not row[0].startswith(path_prefix):
+                    continue
+                results.append({"path": row[0], "start": row[1], "end": row[2], "name": row[3], "score": score})
+                if len(results) >= limit:
+                    break
+            return results
+        finally:
+            self._lock.release()
+
+
+_indexes: Dict[str, BM25Index] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_code_index(root: Optional[str] = None) -> BM25Index:
+    """The shared index for root (the current working directory by default)."""
+    root = os.path.realpath(root or os.getcwd())
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = BM25Index(root)
+            register_cache(index)
+        return index
@@ -0,0 +1,213 @@
+"""
+Edit checkpoints for /undo and /redo.
+
+Before an editing tool overwrites, creates or deletes a file, its previous
+contents are saved to a content-addressed store under .db/checkpoints/
+(zlib-compressed, named by SHA-256, so identical contents are kept once) and
+recorded in a journal grouped by agent turn. Undoing a turn saves what each
+file holds now, for redo, and puts the recorded contents back; both touch
+only the files of that turn.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+from src.constants import DEFAULT_DATABASE_DIR
+
+CHECKPOINT_DIR = os.path.join(DEFAULT_DATABASE_DIR, "checkpoints")
+MAX_TURNS = 200
+MAX_CHECKPOINT_FILE_BYTES = 16 * 1024 * 1024
+
+
+class CheckpointStore:
+    def __init__(self, root: str, directory: str = CHECKPOINT_DIR):
+        self.root = os.path.realpath(root)
+        self.directory = directory if os.path.isabs(directory) else os.path.join(self.root, directory)
+        self._lock = threading.RLock()
+        self._con = None
+        self._turn_id: Optional[int] = None
+        self._recorded: set = set()
+
+    def _connect(self):
+        if self._con is not None:
+            return self._con
+        os.makedirs(os.path.join(self.directory, "objects"), exist_ok=True)
+        con = sqlite3.connect(os.path.join(self.directory, "journal.db"), timeout=30, check_same_thread=False)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS turns (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at REAL NOT NULL,
+                undone INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                turn_id INTEGER NOT NULL,
+                path TEXT NOT NULL,
+                before_hash TEXT,
+                after_hash TEXT,
+                PRIMARY KEY (turn_id, path)
+            )
+        """)
+        con.commit()
+        self._con = con
+        return con
+
+    # content-addressed objects; a None hash means "the file did not exist"
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.directory, "objects", digest[:2], digest)
+
+    def _store(self, data: Optional[bytes]) -> Optional[str]:
+        if data is None:
+            return None
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(zlib.compress(data, 1))
+            os.replace(tmp_path, path)
+        return digest
+
+    def _load(self, digest: Optional[str]) -> Optional[bytes]:
+        if digest is None:
+            return None
+        with open(self._object_path(digest), "rb") as f:
+            return zlib.decompress(f.read())
+
+    @staticmethod
+    def _read(path: str) -> Optional[bytes]:
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def begin_turn(self):
+        """Start a new group; the next snapshot opens it, so turns without edits leave no trace."""
+        with self._lock:
+            self._turn_id = None
+            self._recorded = set()
+
+    def snapshot(self, path: str):
+        """Record path's current contents, the first time it is about to change in this turn."""
+        target = os.path.realpath(path)
+        with self._lock:
+            if target in self._recorded:
+                return
+            try:
+                if os.path.getsize(target) > MAX_CHECKPOINT_FILE_BYTES:
+                    return
+            except OSError:
+                pass
+            try:
+                con = self._connect()
+                if self._turn_id is None:
+                    # A new edit makes everything undone unreachable, as in any editor
+                    self._drop_turns(con, [turn_id for (turn_id,) in con.execute("SELECT id FROM turns WHERE undone = 1")])
+                    self._turn_id = con.execute("INSERT INTO turns (created_at) VALUES (?)", (time.time(),)).lastrowid
+                    self._prune(con)
+                con.execute(
+                    "INSERT OR IGNORE INTO entries (turn_id, path, before_hash) VALUES (?, ?, ?)",
+                    (self._turn_id, target, self._store(self._read(target))),
+                )
+                con.commit()
+            except (OSError, sqlite3.Error):
+                # Losing a checkpoint must not stop the edit itself
+                return
+            self._recorded.add(target)
+
+    def _restore(self, path: str, data: Optional[bytes]):
+        # Imported here: atomic_write records checkpoints through this module
+        from src.tools.atomic_write import atomic_write
+        if data is None:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_write(path, data, checkpoint=False)
+
+    def undo(self) -> Optional[Tuple[int, List[str]]]:
+        """Put back the files of the latest turn not yet undone. Returns (turn id, paths), or None if there is none."""
+        with self._lock:
+            con = self._connect()
+            row = con.execute("SELECT id FROM turns WHERE undone = 0 ORDER BY id DESC LIMIT 1").fetchone()
+            if row is None:
+                return None
+            turn_id = row[0]
+            entries = con.execute("SELECT path, before_hash FROM entries WHERE turn_id = ?", (turn_id,)).fetchall()
+            for path, before_hash in entries:
+                after_hash = self._store(self._read(path))
+                con.execute("UPDATE entries SET after_hash = ? WHERE turn_id = ? AND path = ?", (after_hash, turn_id, path))
+                self._restore(path, self._load(before_hash))
+            con.execute("UPDATE turns SET undone = 1 WHERE id = ?", (turn_id,))
+            con.commit()
+            # Later edits in the current turn start a new group
+            self.begin_turn()
+            return turn_id, [path for path, _ in entries]
+
+    def redo(self) -> Optional[Tuple[int, List[str]]]:
+        """Re-apply the earliest undone turn. Returns (turn id, paths), or None if there is nothing to redo."""
+        with self._lock:
+            con = self._connect()
+            row = con.execute("SELECT id FROM turns WHERE undone = 1 ORDER BY id ASC LIMIT 1").fetchone()
+            if row is None:
+                return None
+            turn_id = row[0]
+            entries = con.execute("SELECT path, after_hash FROM entries WHERE turn_id = ?", (turn_id,)).fetchall()
+            for path, after_hash in entries:
+                self._restore(path, self._load(after_hash))
+            con.execute("UPDATE turns SET undone = 0 WHERE id = ?", (turn_id,))
+            con.commit()
+            self.begin_turn()
+            return turn_id, [path for path, _ in entries]
+
+    def _drop_turns(self, con, turn_ids: List[int]):
+        if not turn_ids:
+            return
+        placeholders = ",".join("?" * len(turn_ids))
+        con.execute(f"DELETE FROM entries WHERE turn_id IN ({placeholders})", turn_ids)
+        con.execute(f"DELETE FROM turns WHERE id IN ({placeholders})", turn_ids)
+        self._collect_garbage(con)
+
+    def _prune(self, con):
+        stale = [turn_id for (turn_id,) in con.execute("SELECT id FROM turns ORDER BY id DESC LIMIT -1 OFFSET ?", (MAX_TURNS,))]
+        self._drop_turns(con, stale)
+
+    def _collect_garbage(self, con):
+        """Delete objects no journal entry refers to any more."""
+        referenced = set()
+        for before_hash, after_hash in con.execute("SELECT before_hash, after_hash FROM entries"):
+            referenced.add(before_hash)
+            referenced.add(after_hash)
+        objects = os.path.join(self.directory, "objects")
+        for prefix in os.listdir(objects):
+            for name in os.listdir(os.path.join(objects, prefix)):
+                if name not in referenced and not name.endswith(".tmp"):
+                    try:
+                        os.remove(os.path.join(objects, prefix, name))
+                    except OSError:
+                        pass
+
+
+_stores: Dict[str, CheckpointStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_checkpoints(root: Optional[str] = None) -> CheckpointStore:
+    """The shared store for root (the current working directory by default)."""
+    root = os.path.realpath(root or os.getcwd())
+    with _stores_lock:
+        store = _stores.get(root)
+        if store is None:
+            store = _stores[root] = CheckpointStore(root)
+        return store
@@ -1,21 +1,56 @@
 from textwrap import dedent
+from src.constants import DEFAULT_COMMAND_TIMEOUT, MAX_COMMAND_TIMEOUT
 from src.models.tool import ToolSchema
-import subprocess
+from src.tools.permissions import USER_REJECTED, authorize
+from src.tools.shell_session import open_session
+from src.tools.background_jobs import JobManager
+from rich.console import Console
+import os
 from typing import Dict, Any, Callable, Optional
 
+
+def _seconds(name: str, default: int) -> int:
+    value = os.getenv(name)
+    try:
+        return int(value) if value and value.strip() else default
+    except ValueError:
+        return default
+
+
+def command_timeouts():
+    """(default, maximum) seconds a command may run."""
+    maximum = _seconds("TERMINUS_MAX_COMMAND_TIMEOUT", MAX_COMMAND_TIMEOUT)
+    return min(_seconds("TERMINUS_COMMAND_TIMEOUT", DEFAULT_COMMAND_TIMEOUT), maximum), maximum
+
+
 class CommandExecutor(ToolSchema):
     """
     Tool for safely executing terminal commands and returning the output.
     """
 
-    def __init__(self):
+    def __init__(self, jobs: Optional[JobManager] = None):
         self.name = "command_executor"
+        self.console = Console()
+        self.shell = None
+        self.jobs = jobs or JobManager()
 
     def description(self) -> str:
-        return dedent("""
+        default_timeout, max_timeout = command_timeouts()
+        return dedent(f"""
         Executes terminal commands and returns their output, error, and exit status.
         Useful for interacting with the underlying system or running scripts.
 
+        Commands run in one persistent shell: the working directory, exported variables, an activated
+        virtualenv and shell functions carry over to later calls, so set them up once. Other tools still
+        resolve relative paths from the project root.
+
+        For servers, watchers and long test suites set background=true: the command starts in the shell's
+        current directory and environment and a job id is returned at once. Keep working and check on it with
+        job_status and job_output; stop it with job_kill. Background jobs are killed when the session ends.
+
+        A command that runs longer than `timeout` seconds ({default_timeout} by default, at most {max_timeout}) is
+        killed along with everything it started. Very long output is cut down to its beginning and end.
+
         AVAILABLE COMMANDS:
         - cd - change directory
         - mkdir - create a new directory
@@ -54,6 +89,14 @@ class CommandExecutor(ToolSchema):
                     "command": {
                         "type": "string",
                         "description": "the command to run"
+                    },
+                    "timeout": {
+                        "type": "integer",
+                        "description": "seconds to let the command run before killing it"
+                    },
+                    "background": {
+                        "type": "boolean",
+                        "description": "start the command as a background job and return its job id without waiting"
                     }
                 },
                 "required": ["command"]
@@ -61,34 +104,63 @@ class CommandExecutor(ToolSchema):
         }
     }
 
+    def session(self):
+        if self.shell is None:
+            self.shell = open_session()
+        return self.shell
+
+    def start_job(self, command: str, cwd: Optional[str] = None) -> str:
+        try:
+            shell_cwd, env = self.session().environment()
+            job = self.jobs.start(command, cwd=cwd or shell_cwd, env=env)
+        except Exception as e:
+            return f"Error starting background job: {str(e)}"
+        return (
+            f"Started background job {job.id} (pid {job.process.pid}) in {job.cwd}.\n"
+            f"Use job_status or job_output with job_id={job.id} to check on it, and job_kill to stop it."
+        )
+
     def run(
         self,
         command: str,
         cwd: str = None,
+        timeout: Optional[int] = None,
+        background: bool = False,
         status_callback: Optional[Callable[..., Any]] = None
-    ) -> Dict[str, Any]:
+    ) -> str:
 
-        try:
+        decision = authorize(self.name, self.console, status_callback, command=command, question=f"Run `{command}`?")
+        if decision.action != "allow":
+            if decision.reason == USER_REJECTED:
+                return "Command rejected by user"
+            return f"Command not run: refused by permission policy ({decision.reason})"
+
+        if background:
+            return self.start_job(command, cwd)
+
+        default_timeout, max_timeout = command_timeouts()
+        timeout = min(timeout or default_timeout, max_timeout)
+
+        def progress(line):
             if status_callback:
-                status_callback(f"executing `{command}`", is_thinking=False)
-            result = subprocess.run(
-                command,
-                shell=True,
-                capture_output=True,
-                text=True,
-                cwd=cwd
-            )
-            
-            if result.returncode == 0:
-                return result.stdout if result.stdout else "(command executed successfully, no output)"
-            else:
-              
-                error_msg = f"Command failed with exit code {result.returncode}"
-                if result.stderr:
-                    error_msg += f"\nError: {result.stderr}"
-                if result.stdout:
-                    error_msg += f"\nOutput: {result.stdout}"
-                return error_msg
-                
+                status_callback(f"{command[:40]}: {line[:100]}", is_thinking=False, is_progress=True)
+
+        try:
+            returncode, stdout, stderr, timed_out, note = self.session().run(command, timeout, cwd=cwd, progress=progress)
         except Exception as e:
             return f"Error executing command: {str(e)}"
+
+        if timed_out:
+            error_msg = f"Command timed out after {timeout}s and was killed"
+        elif returncode == 0:
+            result = stdout if stdout else "(command executed successfully, no output)"
+            return f"{result}\n(Note: {note})" if note else result
+        else:
+            error_msg = f"Command failed with exit code {returncode}"
+        if stderr:
+            error_msg += f"\nError: {stderr}"
+        if stdout:
+            error_msg += f"\nOutput: {stdout}"
+        if note:
+            error_msg += f"\n(Note: {note})"
+        return error_msg
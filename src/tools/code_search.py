@@ -0,0 +1,90 @@
+import os
+from textwrap import dedent
+from src.models.tool import ToolSchema
+from src.tools.bm25_index import get_code_index
+from src.tools.read_cache import read_bytes
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+SNIPPET_LINES = 6
+# How long a query waits for the index while the startup warm-up is still building it
+INDEX_WAIT_SECONDS = 2.0
+
+
+class CodeSearch(ToolSchema):
+    def __init__(self):
+        self.name = "code_search"
+
+    def description(self):
+        return dedent(f"""
+        Searches the codebase by meaning of words rather than exact text, e.g. "where is the token refreshed" or "retry with backoff".
+        Ranks functions, methods and other chunks of code with BM25 over their identifiers and comments; camelCase and snake_case names are split into words.
+        Returns up to limit (default {DEFAULT_LIMIT}) chunks with their path, line span and first lines. Read the span with file_reader (offset/limit) or read_symbol for the full code.
+        Prefer grep_search when you know the exact text or identifier you are looking for.
+        """)
+
+    def json_schema(self):
+        return {
+        "type": "function",
+        "function": {
+            "name": self.name,
+            "description": self.description(),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "words describing the code you are looking for"
+                    },
+                    "path": {
+                        "type": "string",
+                        "description": "only return results under this directory. Defaults to the whole project"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": f"the number of results to return. Defaults to {DEFAULT_LIMIT}",
+                        "default": DEFAULT_LIMIT
+                    }
+                },
+                "required": ["query"]
+            }
+        }
+    }
+
+    @staticmethod
+    def snippet(path: str, start: int, end: int) -> str:
+        try:
+            data, _, _ = read_bytes(path)
+        except OSError:
+            return ""
+        lines = data.decode("utf-8", errors="replace").split("\n")[start - 1:min(end, start + SNIPPET_LINES - 1)]
+        return "\n".join(f"   {number:6}\t{line.rstrip()[:200]}" for number, line in enumerate(lines, start))
+
+    def run(self, query: str, path: str = None, limit: int = DEFAULT_LIMIT):
+        if not query or not query.strip():
+            return "Error: Empty query provided."
+        limit = min(max(int(limit or DEFAULT_LIMIT), 1), MAX_LIMIT)
+
+        root = os.path.realpath(os.getcwd())
+        prefix = ""
+        if path:
+            target = os.path.realpath(path)
+            if target != root and not target.startswith(root + os.sep):
+                return f"Error: code_search only covers the project directory {root}."
+            if target != root:
+                prefix = os.path.relpath(target, root).replace(os.sep, "/") + "/"
+
+        results = get_code_index(root).search(query, limit, prefix, timeout=INDEX_WAIT_SECONDS)
+        if results is None:
+            return "The code search index is still being built. Try again shortly, or use grep_search for exact text."
+        if not results:
+            return f"No code found for '{query}'. Try other words, or grep_search for exact text."
+
+        output = []
+        for rank, result in enumerate(results, 1):
+            name = f"  {result['name']}" if result["name"] else ""
+            output.append(f"{rank}. {result['path']}:{result['start']}-{result['end']}{name}  (score {result['score']:.1f})")
+            snippet = self.snippet(os.path.join(root, result["path"]), result["start"], result["end"])
+            if snippet:
+                output.append(snippet)
+        return "\n".join(output)
@@ -1,10 +1,14 @@
 import subprocess
 from src.models.tool import ToolSchema
+from src.tools.checkpoints import get_checkpoints
+from src.tools.permissions import USER_REJECTED, authorize
+from rich.console import Console
 from textwrap import dedent
 
 class FileCreator(ToolSchema):
     def __init__(self):
         self.name = "file_creator"
+        self.console = Console()
     
     def description(self):
         return dedent("""
@@ -32,7 +36,14 @@ class FileCreator(ToolSchema):
     }
     
     def run(self, file_path: str):
+        decision = authorize(self.name, self.console, paths=[file_path], question=f"Create {file_path}?")
+        if decision.action != "allow":
+            if decision.reason == USER_REJECTED:
+                return "File creation rejected by user"
+            return f"File not created: refused by permission policy ({decision.reason})"
 
+        # A file that did not exist is journalled with no prior content, so /undo deletes it
+        get_checkpoints().snapshot(file_path)
         process = subprocess.run(
             f"touch {file_path}",
             shell=True,
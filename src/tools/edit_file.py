@@ -1,4 +1,7 @@
 from src.models.tool import ToolSchema 
+from src.tools.atomic_write import FileChangedError, atomic_write, read_text
+from src.tools.match_engine import find_match
+from src.tools.permissions import USER_REJECTED, authorize
 from textwrap import dedent
 import difflib
 from rich.console import Console
@@ -25,7 +28,8 @@ class FileEditor(ToolSchema):
 
         First read the contents of the file to understand the structure.
         Carefully match patterns and replace only the specific text you want to change.
-        Be precise with indentation and whitespace.
+        Be precise with indentation and whitespace. If old_string does not occur exactly, a unique match that differs only
+        in trailing whitespace or indentation (or is a very close fuzzy match) is used instead, and the result says so.
 
         IMPORTANT: Never add emojis unless specifically asked to do so by the user.
         """)
@@ -80,60 +84,53 @@ class FileEditor(ToolSchema):
                 result.append(line)
         return '\n'.join(result)
     
-    def ask_for_permission(self, diff_preview, status_callback=None):
-        
-        # Try to get the StreamingHandler's console if status_callback is provided
-        console_to_use = self.console
-        handler = None
-        
-        if status_callback and hasattr(status_callback, '__self__'):
-            # status_callback is a bound method, get the handler (StreamingHandler instance)
-            handler = status_callback.__self__
-            if hasattr(handler, 'console'):
-                console_to_use = handler.console
-        
-        while True:
-            # Use the appropriate console for input
-            console_to_use.print()  # Add a blank line for spacing
-            response = console_to_use.input("[bold bright_red]Apply these changes? (y/n):[/bold bright_red] ").strip().lower()
-            if response in ['y', 'yes']:
-                # Restart status spinner if it was stopped
-                if handler and hasattr(handler, 'status') and handler.status:
-                    handler.status.start()
-                return True
-            elif response in ['n', 'no']:
-                # Restart status spinner if it was stopped
-                if handler and hasattr(handler, 'status') and handler.status:
-                    handler.status.start()
-                return False
-            else:
-                console_to_use.print("[yellow]Please enter 'y' or 'n'[/yellow]")
-         
+    def show_diff(self, file_path, diff_lines, status_callback=None, title="Proposed changes to:"):
+        """Display a diff to the user before asking for permission; returns the rendered preview."""
+        # Format the diff for display
+        colored_diff = self.format_colored_diff(diff_lines) if diff_lines else "No visible diff"
+        separator = "─" * 80
+        diff_preview = f"\n{self.BOLD}{self.CYAN}{title}{self.RESET} {file_path}\n\n{separator}\n{colored_diff}\n{separator}\n"
+
+        # Use status_callback if provided (for integration with StreamingHandler)
+        if status_callback:
+            # Display diff through the streaming handler with keep_stopped=True
+            # This keeps the status spinner stopped so we can get user input
+            status_callback(diff_preview, is_thinking=False, is_tool_output=True, keep_stopped=True)
+        else:
+            # Fallback: display directly via console
+            from rich.text import Text
+            diff_text = Text.from_ansi(diff_preview)
+            self.console.print(diff_text)
+        return diff_preview
+
+    def authorize(self, paths, status_callback=None, tool=None):
+        """Apply the permission policy to writing paths, asking the user only if it says so."""
+        return authorize(tool or self.name, self.console, status_callback, paths=paths)
+
+    def rejection(self, decision):
+        if decision.reason == USER_REJECTED:
+            return f"{self.YELLOW}✗ Changes rejected by user{self.RESET}"
+        return f"{self.YELLOW}✗ Changes not applied: refused by permission policy ({decision.reason}){self.RESET}"
 
     def run(self, file_path : str, old_string : str, new_string : str, status_callback=None):
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                original_content = f.read()
+            original_content, newline, stat = read_text(file_path)
 
-            
-            if old_string not in original_content:
-                return f"{self.RED}Error:{self.RESET} The string to replace was not found in {file_path}\n\nMake sure to read the file first and use the exact string (including whitespace and indentation) that you want to replace."
-            
-            
-            occurrence_count = original_content.count(old_string)
-            if occurrence_count > 1:
-                return f"{self.YELLOW}Warning:{self.RESET} The string appears {occurrence_count} times in {file_path}\n\nThis will replace ALL occurrences. If you want to replace only one, include more context to make the old_string unique."
-            
-            
-            new_content = original_content.replace(old_string, new_string, 1)
+            # Exact first, then progressively more tolerant of whitespace and small differences
+            match = find_match(original_content, old_string, new_string)
+            if isinstance(match, str):
+                return f"{self.RED}Error:{self.RESET} Could not apply the edit to {file_path}: {match}\n\nMake sure to read the file first and use the exact string (including whitespace and indentation) that you want to replace."
+
+            matched_text = original_content[match.start:match.end]
+            new_content = original_content[:match.start] + match.replacement + original_content[match.end:]
 
 
             if original_content == new_content:
                 return f"No changes made to {file_path} (old_string and new_string are identical)."
 
             # Create diff to show user
-            original_lines = old_string.splitlines(keepends=True)
-            new_lines = new_string.splitlines(keepends=True)
+            original_lines = matched_text.splitlines(keepends=True)
+            new_lines = match.replacement.splitlines(keepends=True)
             
             diff = list(difflib.unified_diff(
                 original_lines,
@@ -144,36 +141,24 @@ class FileEditor(ToolSchema):
                 n=3
             ))
 
-            # Format the diff for display
-            colored_diff = self.format_colored_diff(diff) if diff else "No visible diff"
-            separator = "─" * 80
-            diff_preview = f"\n{self.BOLD}{self.CYAN}Proposed changes to:{self.RESET} {file_path}\n\n{separator}\n{colored_diff}\n{separator}\n"
-            
-            # Show diff to user BEFORE asking for permission
-            # Use status_callback if provided (for integration with StreamingHandler)
-            if status_callback:
-                # Display diff through the streaming handler with keep_stopped=True
-                # This keeps the status spinner stopped so we can get user input
-                status_callback(diff_preview, is_thinking=False, is_tool_output=True, keep_stopped=True)
-            else:
-                # Fallback: display directly via console
-                from rich.text import Text
-                diff_text = Text.from_ansi(diff_preview)
-                self.console.print(diff_text)
+            self.show_diff(file_path, diff, status_callback)
             
-            if self.ask_for_permission(diff_preview, status_callback):
-                # User approved - write the file
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(new_content)
+            decision = self.authorize([file_path], status_callback)
+            if decision.action == "allow":
+                # Approved - write the file, unless it changed while they were deciding
+                atomic_write(file_path, new_content, expected_mtime_ns=stat.st_mtime_ns, newline=newline)
                 result = f"{self.GREEN}✓ File edited successfully: {file_path}{self.RESET}"
+                if match.tier != "exact":
+                    result += f" ({match.describe()})"
             else:
-                # User rejected the change
-                result = f"{self.YELLOW}✗ Changes rejected by user{self.RESET}"
+                result = self.rejection(decision)
 
             return result
             
         except FileNotFoundError:
             return f"{self.RED}Error:{self.RESET} File not found: {file_path}"
+        except FileChangedError as e:
+            return f"{self.RED}Error:{self.RESET} {e}"
         except PermissionError:
             return f"{self.RED}Error:{self.RESET} Permission denied when trying to edit: {file_path}"
         except Exception as e:
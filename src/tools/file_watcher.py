@@ -0,0 +1,378 @@
+"""
+Filesystem watcher that keeps the workspace caches and indexes fresh.
+
+Caches register themselves with register_cache(); each must provide
+invalidate(path=None), taking an absolute path or None for "anything may
+have changed". The watcher uses inotify (through ctypes, Linux only) on every
+directory not excluded by .gitignore, coalesces bursts of events, and pushes
+one invalidation per changed path. Where inotify is unavailable or runs out
+of watches it falls back to polling mtimes on a background thread. Watches
+are set up on that thread too, so starting the watcher never blocks.
+
+While a watcher is running, caches may trust their state between
+invalidations (see watching()), so freshness checks cost O(changed files)
+rather than a re-stat of the whole tree.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from src.tools.gitignore import ALWAYS_IGNORED, IgnoreRules
+
+# Wait for events to go quiet this long before dispatching, but never longer than MAX_DELAY
+COALESCE_DELAY = 0.1
+MAX_DELAY = 1.0
+POLL_INTERVAL = 2.0
+MAX_WATCHES = 100_000
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+              | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct("iIII")
+
+_caches: List[object] = []
+_watcher: Optional["FileWatcher"] = None
+
+
+def register_cache(cache):
+    """Have cache.invalidate(path) called for every change the watcher sees."""
+    if cache not in _caches:
+        _caches.append(cache)
+
+
+def invalidate_all():
+    for cache in list(_caches):
+        cache.invalidate()
+
+
+def walk_directories(root: str):
+    """Yield (absolute directory, path relative to root, rules) for root and every directory under it not excluded by .gitignore."""
+    base = os.path.realpath(root)
+    stack = [(base, "", IgnoreRules().child(base, ""))]
+    while stack:
+        directory, rel_directory, rules = stack.pop()
+        yield directory, rel_directory, rules
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.name in ALWAYS_IGNORED:
+                continue
+            rel_path = f"{rel_directory}/{entry.name}" if rel_directory else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False) and not rules.is_ignored(rel_path, True):
+                    stack.append((entry.path, rel_path, rules.child(entry.path, rel_path)))
+            except OSError:
+                continue
+
+
+def _inside(path: str, root: str) -> bool:
+    return path == root or path.startswith(root + os.sep)
+
+
+def _ignored_path(path: str, root: str) -> bool:
+    """Our own databases and VCS metadata change constantly and are never cached."""
+    rel_path = os.path.relpath(path, root)
+    return any(part in ALWAYS_IGNORED for part in rel_path.split(os.sep))
+
+
+class FileWatcher:
+    def __init__(self, root: str):
+        self.root = os.path.realpath(root)
+        self.mode = None
+        self._fd = None
+        self._libc = None
+        self._watches: Dict[int, str] = {}
+        self._pending: Set[str] = set()
+        self._overflow = False
+        self._first_event = 0.0
+        self._last_event = 0.0
+        self._snapshot: Dict[str, Tuple[int, int]] = {}
+        # Polling only: something may have changed, rescan before the next sync trusts the snapshot
+        self._rescan = False
+        self._ready = threading.Event()
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        """True once the watches are in place (until then caches must check for changes themselves)."""
+        return self._ready.is_set() and self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="terminus-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        if self._start_inotify():
+            self.mode = "inotify"
+            loop = self._run_inotify
+        else:
+            self.mode = "polling"
+            with self._lock:
+                self._snapshot = self._scan()
+            loop = self._run_polling
+        if self._stop.is_set():
+            return
+        # Anything edited while the watches were being added may have been missed
+        invalidate_all()
+        self._ready.set()
+        loop()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    # inotify
+
+    def _start_inotify(self) -> bool:
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return False
+        if fd < 0:
+            return False
+        self._libc, self._fd = libc, fd
+        if not self._add_watches(self.root):
+            os.close(fd)
+            self._fd = None
+            self._watches.clear()
+            return False
+        return True
+
+    def _add_watches(self, directory: str) -> bool:
+        """Watch directory and everything under it. False if the kernel ran out of watches."""
+        for path, _, _ in walk_directories(directory):
+            if self._stop.is_set():
+                return True
+            if len(self._watches) >= MAX_WATCHES:
+                return False
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+            if wd < 0:
+                if ctypes.get_errno() == errno.ENOSPC:
+                    return False
+                continue
+            self._watches[wd] = path
+        return True
+
+    def _forget_watches(self, directory: str):
+        for wd, path in list(self._watches.items()):
+            if _inside(path, directory):
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._watches[wd]
+
+    def _read_events(self):
+        while self._fd is not None:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return
+            except OSError:
+                return
+            if not data:
+                return
+            offset = 0
+            while offset + EVENT_HEADER.size <= len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0")
+                offset += EVENT_HEADER.size + length
+                self._handle_event(wd, mask, os.fsdecode(name))
+
+    def _handle_event(self, wd: int, mask: int, name: str):
+        if mask & IN_Q_OVERFLOW:
+            self._overflow = True
+            self._touch()
+            return
+        directory = self._watches.get(wd)
+        if directory is None:
+            return
+        if mask & IN_IGNORED:
+            del self._watches[wd]
+            return
+        if not name:
+            # Events about a watched directory itself also reach its parent's watch
+            return
+        path = os.path.join(directory, name)
+        if _ignored_path(path, self.root):
+            return
+
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                # Files created before the new watch existed produce no events of their own
+                if not self._add_watches(path):
+                    self._overflow = True
+            elif mask & IN_MOVED_FROM:
+                self._forget_watches(path)
+            elif not mask & IN_DELETE:
+                # Attribute changes of a directory say nothing about its contents
+                return
+        elif name == ".gitignore":
+            # Newly un-ignored directories need watches too
+            if not self._add_watches(directory):
+                self._overflow = True
+        self._pending.add(path)
+        self._touch()
+
+    def _touch(self):
+        now = time.monotonic()
+        if not self._first_event:
+            self._first_event = now
+        self._last_event = now
+
+    def _run_inotify(self):
+        while not self._stop.is_set():
+            try:
+                ready, _, _ = select.select([self._fd], [], [], COALESCE_DELAY)
+            except (OSError, ValueError, TypeError):
+                return
+            with self._lock:
+                if ready:
+                    self._read_events()
+                now = time.monotonic()
+                if self._first_event and (now - self._last_event >= COALESCE_DELAY or now - self._first_event >= MAX_DELAY):
+                    self._dispatch()
+
+    # polling
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        for directory, rel_directory, rules in walk_directories(self.root):
+            try:
+                snapshot[directory] = (os.stat(directory).st_mtime_ns, -1)
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                rel_path = f"{rel_directory}/{entry.name}" if rel_directory else entry.name
+                try:
+                    if entry.is_file(follow_symlinks=False) and not rules.is_ignored(rel_path, False):
+                        stat = entry.stat(follow_symlinks=False)
+                        snapshot[entry.path] = (stat.st_mtime_ns, stat.st_size)
+                except OSError:
+                    continue
+        return snapshot
+
+    def _poll(self):
+        self._rescan = False
+        snapshot = self._scan()
+        previous = self._snapshot
+        for path, signature in snapshot.items():
+            # Directories only matter when they appear; their entries are reported one by one
+            is_dir = signature[1] == -1
+            if (path not in previous) if is_dir else (previous.get(path) != signature):
+                self._pending.add(path)
+        self._pending.update(path for path in previous if path not in snapshot)
+        self._snapshot = snapshot
+        if self._pending:
+            self._touch()
+
+    def _run_polling(self):
+        while not self._stop.wait(POLL_INTERVAL):
+            with self._lock:
+                self._poll()
+                self._dispatch()
+
+    # dispatch
+
+    def _dispatch(self):
+        pending, overflow = self._pending, self._overflow
+        self._pending, self._overflow = set(), False
+        self._first_event = self._last_event = 0.0
+        if overflow:
+            invalidate_all()
+            return
+        for path in sorted(pending):
+            for cache in list(_caches):
+                cache.invalidate(path)
+
+    def sync(self):
+        """Deliver every change that has happened so far. Polling watchers only rescan after changed() asked for it."""
+        with self._lock:
+            if self.mode == "inotify":
+                self._read_events()
+            elif self._rescan:
+                self._poll()
+            if self._first_event:
+                self._dispatch()
+
+    def changed(self, paths: Optional[Iterable[str]] = None):
+        """
+        Files may have just been written by us. inotify reports them by itself;
+        a polling watcher takes the given paths as changed, or without paths
+        defers a full rescan until the next sync needs it.
+        """
+        with self._lock:
+            if self.mode == "polling":
+                if paths is None:
+                    self._rescan = True
+                    return
+                self._pending.update(os.path.realpath(path) for path in paths)
+                if self._pending:
+                    self._touch()
+        self.sync()
+
+
+def start_watcher(root: Optional[str] = None) -> FileWatcher:
+    """Start the process-wide watcher for root (the current working directory by default)."""
+    global _watcher
+    if _watcher is not None:
+        _watcher.stop()
+    _watcher = FileWatcher(root or os.getcwd()).start()
+    return _watcher
+
+
+def stop_watcher():
+    global _watcher
+    if _watcher is not None:
+        _watcher.stop()
+        _watcher = None
+
+
+def watching(root: str) -> bool:
+    """True when a running watcher covers root (a real path), so caches under it may skip their own re-checks."""
+    return _watcher is not None and _watcher.running and _inside(root, _watcher.root)
+
+
+def sync_changes():
+    """Apply pending watcher events now; call before trusting cached state."""
+    if _watcher is not None and _watcher.running:
+        _watcher.sync()
+
+
+def notify_workspace_changed(paths: Optional[Iterable[str]] = None):
+    """
+    Files (paths, when known) may have just been written by us: let the
+    watcher deliver the changes, or drop every cache if nothing is watching.
+    """
+    if _watcher is not None and _watcher.running:
+        _watcher.changed(paths)
+    else:
+        invalidate_all()
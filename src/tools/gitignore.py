@@ -0,0 +1,107 @@
+import os
+import re
+from typing import List, Optional, Tuple
+from src.constants import DEFAULT_DATABASE_DIR
+
+# Never descended into, whatever .gitignore says
+ALWAYS_IGNORED = {".git", ".hg", ".svn", DEFAULT_DATABASE_DIR.strip("/")}
+
+
+def translate(pattern: str) -> str:
+    """Regex source for one gitignore glob, matched against a path relative to the .gitignore's directory."""
+    out = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("/**", i) and i + 3 == len(pattern):
+            out.append("(?:/.*)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+            continue
+        if char == "*":
+            out.append("[^/]*")
+        elif char == "?":
+            out.append("[^/]")
+        elif char == "[":
+            close = pattern.find("]", i + 1)
+            if close == -1:
+                out.append(re.escape(char))
+            else:
+                body = pattern[i + 1:close]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append(f"[{body}]")
+                i = close
+        elif char == "\\" and i + 1 < len(pattern):
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(char))
+        i += 1
+    return "".join(out)
+
+
+class IgnoreRules:
+    """
+    The .gitignore rules in effect for one directory: its parent's rules plus
+    the ones from its own .gitignore, with the usual last-match-wins and
+    negation semantics.
+    """
+
+    def __init__(self, rules: Optional[List[Tuple[str, "re.Pattern", bool, bool]]] = None):
+        # (base directory, compiled pattern, negated, directory only)
+        self.rules = rules or []
+
+    @staticmethod
+    def parse(text: str, base: str):
+        rules = []
+        for line in text.splitlines():
+            line = line.rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negated = line.startswith("!")
+            if negated:
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            anchored = "/" in line
+            line = line.lstrip("/")
+            regex = translate(line)
+            if not anchored:
+                regex = "(?:.*/)?" + regex
+            rules.append((base, re.compile(regex + r"\Z"), negated, dir_only))
+        return rules
+
+    def child(self, directory: str, rel_directory: str) -> "IgnoreRules":
+        """Rules for a subdirectory, adding its .gitignore if it has one."""
+        try:
+            with open(os.path.join(directory, ".gitignore"), "r", encoding="utf-8", errors="replace") as f:
+                text = f.read()
+        except OSError:
+            return self
+        rules = self.parse(text, rel_directory)
+        return IgnoreRules(self.rules + rules) if rules else self
+
+    def is_ignored(self, rel_path: str, is_dir: bool) -> bool:
+        ignored = False
+        for base, pattern, negated, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if base:
+                if not rel_path.startswith(base + "/"):
+                    continue
+                candidate = rel_path[len(base) + 1:]
+            else:
+                candidate = rel_path
+            if pattern.match(candidate):
+                ignored = not negated
+        return ignored
@@ -0,0 +1,91 @@
+import os
+import re
+from textwrap import dedent
+from src.models.tool import ToolSchema
+from src.tools.grep import glob_filter
+from src.tools.ls import tree_for
+
+DEFAULT_MAX_RESULTS = 200
+
+
+class Glob(ToolSchema):
+    def __init__(self):
+        self.name = "glob"
+
+    def description(self):
+        return dedent(f"""
+        Finds files by name pattern, e.g. `**/*.py`, `src/**/test_*.ts` or `*.{{json,yaml}}`.
+        A pattern without a slash matches file names at any depth. Files excluded by .gitignore are skipped.
+        Returns matching paths, most recently modified first, up to max_results (default {DEFAULT_MAX_RESULTS}).
+        Use this instead of ls or command_executor with find when you are looking for files.
+        """)
+
+    def json_schema(self):
+        return {
+        "type": "function",
+        "function": {
+            "name": self.name,
+            "description": self.description(),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "pattern": {
+                        "type": "string",
+                        "description": "the glob pattern to match files against"
+                    },
+                    "path": {
+                        "type": "string",
+                        "description": "the directory to search in. Defaults to the current working directory"
+                    },
+                    "max_results": {
+                        "type": "integer",
+                        "description": f"the maximum number of paths to return. Defaults to {DEFAULT_MAX_RESULTS}",
+                        "default": DEFAULT_MAX_RESULTS
+                    }
+                },
+                "required": ["pattern"]
+            }
+        }
+    }
+
+    @staticmethod
+    def literal_prefix(pattern: str) -> str:
+        """Leading directories of pattern without wildcards, so `src/tools/**/*.py` only walks src/tools."""
+        parts = pattern.strip("/").split("/")[:-1]
+        prefix = []
+        for part in parts:
+            if re.search(r"[*?\[{]", part):
+                break
+            prefix.append(part)
+        return "/".join(prefix)
+
+    def run(self, pattern: str, path: str = None, max_results: int = DEFAULT_MAX_RESULTS):
+        if not pattern:
+            return "Error: Empty pattern provided."
+        search_path = path or "."
+        if not os.path.isdir(search_path):
+            return f"Error: Path '{search_path}' is not a directory."
+        max_results = max(int(max_results or DEFAULT_MAX_RESULTS), 1)
+
+        tree, start = tree_for(search_path)
+        literal = self.literal_prefix(pattern)
+        walk_from = "/".join(part for part in (start, literal) if part)
+        matches = glob_filter(pattern)
+
+        found = []
+        for rel_path in tree.files(walk_from):
+            relative = rel_path[len(start):].lstrip("/")
+            if matches(relative):
+                try:
+                    mtime = os.stat(os.path.join(tree.root, rel_path)).st_mtime
+                except OSError:
+                    continue
+                found.append((mtime, os.path.join(search_path, relative) if path else relative))
+
+        if not found:
+            return f"No files match '{pattern}'."
+        found.sort(key=lambda item: (-item[0], item[1]))
+        output = "\n".join(display for _, display in found[:max_results])
+        if len(found) > max_results:
+            output += f"\n\n(Showing {max_results} of {len(found)} matches. Use a more specific pattern or path.)"
+        return output
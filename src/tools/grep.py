@@ -1,76 +1,354 @@
+import base64
+import json
+import os
+import re
+import shutil
 import subprocess
+import tempfile
 from textwrap import dedent
 from src.models.tool import ToolSchema
+from src.tools.gitignore import translate
+from src.tools.read_cache import read_bytes
+from src.tools.trigram_index import get_workspace_index
+from src.tools.workspace_tree import WorkspaceTree, get_workspace_tree
+
+DEFAULT_MAX_MATCHES = 200
+MAX_CONTEXT_LINES = 10
+MAX_LINE_CHARS = 300
+MAX_ERROR_BYTES = 4096
+
+
+class FileHits:
+    """Matches and context lines collected for one file, in line order."""
+
+    __slots__ = ("path", "count", "lines")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self.lines = {}
+
+    def add(self, line_number: int, text: str, is_match: bool):
+        if is_match:
+            self.count += 1
+        # A line can arrive as context for one match and as a match itself
+        self.lines[line_number] = self.lines.get(line_number, False) or is_match, text
+
+    def density(self) -> float:
+        """Matches per KB, so a short file full of hits ranks above a huge file with a few."""
+        try:
+            size_kb = os.path.getsize(self.path) / 1024
+        except OSError:
+            size_kb = 0
+        return self.count / max(size_kb, 1)
+
+
+def expand_braces(pattern: str):
+    """`*.{ts,tsx}` -> [`*.ts`, `*.tsx`], as ripgrep globs allow."""
+    match = re.search(r"\{([^{}]*)\}", pattern)
+    if not match:
+        return [pattern]
+    expanded = []
+    for option in match.group(1).split(","):
+        expanded.extend(expand_braces(pattern[:match.start()] + option + pattern[match.end():]))
+    return expanded
+
+
+def glob_filter(glob: str):
+    """
+    Predicate over relative paths with ripgrep's --glob meaning: a pattern
+    without a slash matches the file name, a leading `!` excludes.
+    """
+    negated = glob.startswith("!")
+    patterns = []
+    for pattern in expand_braces(glob[1:] if negated else glob):
+        anchored = "/" in pattern.rstrip("/")
+        regex = translate(pattern.strip("/"))
+        patterns.append(re.compile((regex if anchored else "(?:.*/)?" + regex) + r"\Z"))
+
+    def matches(rel_path: str) -> bool:
+        hit = any(pattern.match(rel_path) for pattern in patterns)
+        return hit != negated
+
+    return matches
+
 
 class Grep(ToolSchema):
     def __init__(self):
         self.name = "grep_search"
-    
+
     def description(self):
-        return dedent("""
-            Search the codebase for text patterns using ripgrep (rg).
-            Searches recursively through all files with intelligent filtering.
-            Ripgrep is faster than grep and automatically respects .gitignore.
+        return dedent(f"""
+            Search the codebase for text patterns (regular expressions).
+            Searches recursively through all files with intelligent filtering and automatically respects .gitignore.
+            Searches inside the working directory use a persistent trigram index, so repeated searches are fast; other paths use ripgrep (rg).
+            Results are grouped per file with match counts, files with the densest hits first.
+            The search stops after max_matches matches (default {DEFAULT_MAX_MATCHES}); narrow the pattern, path or glob if the results are cut off.
         """).strip()
-    
+
     def json_schema(self):
         return {
             "type": "function",
             "function": {
-                "name": self.name, 
+                "name": self.name,
                 "description": self.description(),
                 "parameters": {
                     "type": "object",
                     "properties": {
-                        "pattern": {  
+                        "pattern": {
                             "type": "string",
                             "description": "The text pattern to search for in the codebase"
                         },
-                        "path": {  
+                        "path": {
                             "type": "string",
                             "description": "File or directory to search in. Defaults to current working directory.If specified, it must be an absolute path.",
                             "default": "."
                         },
-                        "glob": {  
+                        "glob": {
                             "type": "string",
                             "description": "Glob patterns to filter files (e.g. `*.js`, `*.{ts,tsx}`). No filter by default. Defaults to None",
                             "default": None
                         },
-                        
-                    
+                        "context": {
+                            "type": "integer",
+                            "description": f"Lines of context to show around each match (like grep -C). At most {MAX_CONTEXT_LINES}.",
+                            "default": 0
+                        },
+                        "case_insensitive": {
+                            "type": "boolean",
+                            "description": "Match case-insensitively",
+                            "default": False
+                        },
+                        "fixed_strings": {
+                            "type": "boolean",
+                            "description": "Treat the pattern as a literal string instead of a regular expression",
+                            "default": False
+                        },
+                        "max_matches": {
+                            "type": "integer",
+                            "description": f"Stop after this many matches. Defaults to {DEFAULT_MAX_MATCHES}",
+                            "default": DEFAULT_MAX_MATCHES
+                        }
                     },
                     "required": ["pattern"]
                 }
             }
         }
-    
-    def run(self, pattern: str, path: str = None, glob: str = None):
-        if not pattern:
-            return "Error: Empty pattern provided. Please provide a search pattern."
-        
-        # Build ripgrep command
-        query_parts = ["rg", "--line-number", "--no-heading", "--color=never"]
-        
-        # Add glob pattern if provided
+
+    @staticmethod
+    def _text(field: dict) -> str:
+        # rg sends non-UTF-8 data base64-encoded under "bytes"
+        if "text" in field:
+            return field["text"]
+        return base64.b64decode(field.get("bytes", "")).decode("utf-8", errors="replace")
+
+    def build_command(self, pattern: str, path: str, glob: str, context: int, case_insensitive: bool, fixed_strings: bool):
+        query_parts = ["rg", "--json"]
+        if context:
+            query_parts.extend(["--context", str(context)])
+        if case_insensitive:
+            query_parts.append("--ignore-case")
+        if fixed_strings:
+            query_parts.append("--fixed-strings")
         if glob:
             query_parts.extend(["--glob", glob])
-        
-        # Add pattern
-        query_parts.append(pattern)
-        
-        # Add path (default to current directory)
+        # "--" so patterns starting with a dash are not read as flags
+        query_parts.extend(["--", pattern, path])
+        return query_parts
+
+    def collect(self, process: subprocess.Popen, max_matches: int):
+        """Read rg's JSON stream until it ends or max_matches is reached. Returns (files, total, stopped_early)."""
+        files = {}
+        total = 0
+        for raw in process.stdout:
+            try:
+                event = json.loads(raw)
+            except json.JSONDecodeError:
+                continue
+            kind = event.get("type")
+            if kind not in ("match", "context"):
+                continue
+
+            data = event["data"]
+            path = self._text(data["path"])
+            hits = files.get(path)
+            if hits is None:
+                hits = files[path] = FileHits(path)
+            text = self._text(data["lines"]).rstrip("\r\n")
+            hits.add(data["line_number"], text, kind == "match")
+
+            if kind == "match":
+                total += 1
+                if total >= max_matches:
+                    return files, total, True
+        return files, total, False
+
+    def search_files(self, paths, regex: "re.Pattern", context: int, max_matches: int):
+        """Confirm candidate files with the regex. Returns (files, total, stopped_early) like collect."""
+        files = {}
+        total = 0
+        for path in paths:
+            try:
+                data, _, _ = read_bytes(path)
+            except OSError:
+                continue
+            if b"\x00" in data[:8192]:
+                continue
+            text = data.decode("utf-8", errors="replace")
+            # Search the whole text and only look at the lines it lands on; most candidates have few hits
+            match = regex.search(text)
+            if not match:
+                continue
+            hits = files[path] = FileHits(path)
+            lines = text.split("\n") if context else None
+            line_number = 1
+            counted_to = 0
+            while match:
+                line_start = text.rfind("\n", 0, match.start()) + 1
+                line_end = text.find("\n", match.start())
+                if line_end == -1:
+                    line_end = len(text)
+                line = text[line_start:line_end]
+                # A match spanning lines (e.g. via \s) must also match within its first line
+                if regex.search(line):
+                    line_number += text.count("\n", counted_to, line_start)
+                    counted_to = line_start
+                    if lines is not None:
+                        for context_line in range(max(1, line_number - context), min(len(lines), line_number + context) + 1):
+                            if context_line != line_number and context_line not in hits.lines:
+                                hits.add(context_line, lines[context_line - 1].rstrip("\r"), False)
+                    hits.add(line_number, line.rstrip("\r"), True)
+                    total += 1
+                    if total >= max_matches:
+                        return files, total, True
+                if line_end >= len(text):
+                    break
+                match = regex.search(text, line_end + 1)
+            if not hits.count:
+                del files[path]
+        return files, total, False
+
+    def indexed_candidates(self, search_path: str, pattern: str, fixed_strings: bool):
+        """
+        Candidate files under search_path from the workspace trigram index as
+        (path relative to search_path, path to open and show) pairs, or None if
+        search_path is outside the workspace or in an ignored directory, or
+        ripgrep should answer while the index is being built or used by
+        another thread.
+        """
+        root = os.path.realpath(os.getcwd())
+        target = os.path.realpath(search_path)
+        if target != root and not target.startswith(root + os.sep):
+            return None
+        prefix = "" if target == root else os.path.relpath(target, root).replace(os.sep, "/") + "/"
+        if prefix and not get_workspace_tree(root).contains_directory(prefix[:-1]):
+            # Ignored directories (build/, node_modules/...) are not indexed, but asked for by name they are searched
+            return None
+        index = get_workspace_index(root)
+        # Don't wait for the first build, or for another thread holding the index, when ripgrep can answer now
+        have_rg = shutil.which("rg") is not None
+        if have_rg and (index.building or not index.ready):
+            index.warm()
+            return None
+        candidates = index.candidates(pattern, fixed_strings, blocking=not have_rg)
+        if candidates is None:
+            return None
+        display_base = search_path.rstrip("/") or "/"
+        return [
+            (rel_path[len(prefix):], os.path.join(display_base, rel_path[len(prefix):]))
+            for rel_path in candidates if rel_path.startswith(prefix)
+        ]
+
+    def format_results(self, files: dict, total: int, stopped_early: bool, max_matches: int) -> str:
+        ranked = sorted(
+            (hits for hits in files.values() if hits.count),
+            key=lambda hits: (-hits.density(), -hits.count, hits.path),
+        )
+        summary = f"Found {total} match{'es' if total != 1 else ''} in {len(ranked)} file{'s' if len(ranked) != 1 else ''}"
+        if stopped_early:
+            summary += f" (stopped at max_matches={max_matches}; there may be more, narrow the search to see them)"
+        output = [summary]
+
+        for hits in ranked:
+            output.append(f"\n{hits.path} ({hits.count} match{'es' if hits.count != 1 else ''})")
+            previous = None
+            for line_number in sorted(hits.lines):
+                is_match, text = hits.lines[line_number]
+                if previous is not None and line_number > previous + 1:
+                    output.append("  --")
+                if len(text) > MAX_LINE_CHARS:
+                    text = f"{text[:MAX_LINE_CHARS]}... [{len(text)} characters]"
+                # ':' marks a match and '-' a context line, as in grep
+                output.append(f"  {line_number}{':' if is_match else '-'} {text}")
+                previous = line_number
+        return "\n".join(output)
+
+    def run(self, pattern: str, path: str = None, glob: str = None, context: int = 0,
+            case_insensitive: bool = False, fixed_strings: bool = False, max_matches: int = DEFAULT_MAX_MATCHES):
+        if not pattern:
+            return "Error: Empty pattern provided. Please provide a search pattern."
+
+        context = min(max(int(context or 0), 0), MAX_CONTEXT_LINES)
+        max_matches = max(int(max_matches or DEFAULT_MAX_MATCHES), 1)
         search_path = path if path else "."
-        query_parts.append(search_path)
-        
-        # Execute the command
+        if not os.path.exists(search_path):
+            return f"Error: Path '{search_path}' does not exist."
+
         try:
-            result = subprocess.run(query_parts, capture_output=True, text=True)
-            
-            if result.returncode == 0:
-                return result.stdout if result.stdout else "No matches found."
-            elif result.returncode == 1:
-                return "No matches found."
+            regex = re.compile(re.escape(pattern) if fixed_strings else pattern, re.MULTILINE | (re.IGNORECASE if case_insensitive else 0))
+        except re.error:
+            # Syntax Python's re does not understand; ripgrep may still handle it
+            regex = None
+
+        if regex is not None:
+            if os.path.isfile(search_path):
+                candidates = [(os.path.basename(search_path), search_path)]
             else:
-                return f"Error: {result.stderr if result.stderr else 'Unknown error'}"
-        except FileNotFoundError:
-            return "Error: ripgrep (rg) not found. Please install ripgrep: https://github.com/BurntSushi/ripgrep"
\ No newline at end of file
+                candidates = self.indexed_candidates(search_path, pattern, fixed_strings)
+                if candidates is None and not shutil.which("rg"):
+                    # Outside the workspace or ignored, and no ripgrep: scan the tree directly
+                    candidates = [(rel_path, os.path.join(search_path, rel_path)) for rel_path in WorkspaceTree(search_path).files()]
+            if candidates is not None:
+                if glob:
+                    matches = glob_filter(glob)
+                    candidates = [(rel_path, display) for rel_path, display in candidates if matches(rel_path)]
+                files, total, stopped_early = self.search_files([display for _, display in candidates], regex, context, max_matches)
+                if not total:
+                    return "No matches found."
+                return self.format_results(files, total, stopped_early, max_matches)
+
+        return self.run_ripgrep(pattern, search_path, glob, context, case_insensitive, fixed_strings, max_matches)
+
+    def run_ripgrep(self, pattern: str, search_path: str, glob: str, context: int,
+                    case_insensitive: bool, fixed_strings: bool, max_matches: int):
+        query_parts = self.build_command(pattern, search_path, glob, context, case_insensitive, fixed_strings)
+
+        # Errors go to a file: a pipe nobody reads while results stream would fill up and stall rg
+        with tempfile.TemporaryFile() as errors:
+            try:
+                process = subprocess.Popen(
+                    query_parts,
+                    stdout=subprocess.PIPE,
+                    stderr=errors,
+                    text=True,
+                    encoding="utf-8",
+                    errors="replace",
+                )
+            except FileNotFoundError:
+                return "Error: ripgrep (rg) not found. Please install ripgrep: https://github.com/BurntSushi/ripgrep"
+
+            try:
+                files, total, stopped_early = self.collect(process, max_matches)
+            finally:
+                if process.poll() is None:
+                    process.kill()
+                process.stdout.close()
+                returncode = process.wait()
+            errors.seek(0)
+            stderr = errors.read(MAX_ERROR_BYTES).decode("utf-8", errors="replace")
+
+        if total:
+            return self.format_results(files, total, stopped_early, max_matches)
+        if returncode == 1 or returncode == 0:
+            return "No matches found."
+        return f"Error: {stderr.strip() if stderr else 'Unknown error'}"
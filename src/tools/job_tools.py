@@ -0,0 +1,134 @@
+from textwrap import dedent
+from typing import Optional
+from src.models.tool import ToolSchema
+from src.tools.background_jobs import JOB_BUFFER_BYTES, MAX_OUTPUT_READ_BYTES, JobManager
+
+
+def _unknown(job_id) -> str:
+    return f"Error: No background job with id {job_id}. Use job_status to list jobs."
+
+
+class JobStatus(ToolSchema):
+    def __init__(self, jobs: JobManager):
+        self.name = "job_status"
+        self.jobs = jobs
+
+    def description(self):
+        return dedent("""
+        Shows the state of background jobs started with command_executor (background=true): running or
+        exit code, run time and how much output each has produced. Leave out job_id to list every job.
+        """)
+
+    def json_schema(self):
+        return {
+        "type": "function",
+        "function": {
+            "name": self.name,
+            "description": self.description(),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "job_id": {
+                        "type": "integer",
+                        "description": "the job to report on; all jobs if omitted"
+                    }
+                },
+                "required": []
+            }
+        }
+    }
+
+    def run(self, job_id: Optional[int] = None):
+        if job_id is None:
+            jobs = self.jobs.list()
+            if not jobs:
+                return "No background jobs."
+            return "\n".join(job.summary() for job in jobs)
+        job = self.jobs.get(job_id)
+        return job.summary() if job else _unknown(job_id)
+
+
+class JobOutput(ToolSchema):
+    def __init__(self, jobs: JobManager):
+        self.name = "job_output"
+        self.jobs = jobs
+
+    def description(self):
+        return dedent(f"""
+        Reads the combined stdout and stderr of a background job, up to {MAX_OUTPUT_READ_BYTES // 1024} KB per call.
+        Start with offset 0, then pass the next_offset from the previous call to get only new output.
+        Jobs keep their last {JOB_BUFFER_BYTES // (1024 * 1024)} MB of output; older output is reported as skipped.
+        """)
+
+    def json_schema(self):
+        return {
+        "type": "function",
+        "function": {
+            "name": self.name,
+            "description": self.description(),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "job_id": {
+                        "type": "integer",
+                        "description": "the job to read"
+                    },
+                    "offset": {
+                        "type": "integer",
+                        "description": "byte offset to read from (next_offset of the previous call, 0 for the start)"
+                    }
+                },
+                "required": ["job_id"]
+            }
+        }
+    }
+
+    def run(self, job_id: int, offset: int = 0):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return _unknown(job_id)
+        text, next_offset, skipped = self.jobs.read(job_id, offset)
+        header = f"{job.summary()}\nnext_offset: {next_offset}"
+        if skipped:
+            header += f"\n({skipped} bytes before this were overwritten and are no longer available)"
+        if next_offset < job.output.written:
+            header += f"\n({job.output.written - next_offset} more bytes available; call again with offset {next_offset})"
+        return f"{header}\n\n{text}" if text else f"{header}\n\n(no new output)"
+
+
+class JobKill(ToolSchema):
+    def __init__(self, jobs: JobManager):
+        self.name = "job_kill"
+        self.jobs = jobs
+
+    def description(self):
+        return dedent("""
+        Stops a background job and everything it started (SIGTERM, then SIGKILL if it does not exit).
+        Its output stays readable with job_output.
+        """)
+
+    def json_schema(self):
+        return {
+        "type": "function",
+        "function": {
+            "name": self.name,
+            "description": self.description(),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "job_id": {
+                        "type": "integer",
+                        "description": "the job to stop"
+                    }
+                },
+                "required": ["job_id"]
+            }
+        }
+    }
+
+    def run(self, job_id: int):
+        if self.jobs.get(job_id) is None:
+            return _unknown(job_id)
+        if not self.jobs.kill(job_id):
+            return f"Job {job_id} had already finished: {self.jobs.get(job_id).summary()}"
+        return f"Killed {self.jobs.get(job_id).summary()}"
@@ -0,0 +1,257 @@
+"""
+Warm IPython kernels for python_exec.
+
+Starting an interpreter and importing pandas or numpy costs seconds; paying
+that once per snippet makes iterating on code slow. The pool keeps kernels
+started in the background (with the modules named in TERMINUS_KERNEL_PRELOAD
+already imported), so taking one is instant. No kernel is started until
+python_exec is first used, after which one spare is kept ready;
+TERMINUS_KERNEL_POOL_SIZE kernels are started with the CLI instead, for
+those who want even the first call to be instant. A kernel
+handed out belongs to one session from then on, which keeps its variables
+between calls; a fresh one takes its place in the pool. Kernels are never
+returned to the pool, since their state is the session's, and all of them are
+shut down at exit.
+"""
+
+import atexit
+import os
+import queue
+import re
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from src.tools.shell_session import CappedOutput
+
+DEFAULT_KERNEL_POOL_SIZE = 0
+KERNEL_START_TIMEOUT = 60
+# Seconds an interrupted snippet gets to stop before the kernel is replaced
+INTERRUPT_GRACE = 5
+PROGRESS_INTERVAL = 0.2
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+
+
+def pool_size() -> int:
+    value = os.getenv("TERMINUS_KERNEL_POOL_SIZE")
+    try:
+        return max(0, int(value)) if value and value.strip() else DEFAULT_KERNEL_POOL_SIZE
+    except ValueError:
+        return DEFAULT_KERNEL_POOL_SIZE
+
+
+def preload_modules() -> List[str]:
+    return [name.strip() for name in os.getenv("TERMINUS_KERNEL_PRELOAD", "").split(",") if name.strip()]
+
+
+@dataclass
+class ExecutionResult:
+    output: str
+    error: bool = False
+    timed_out: bool = False
+    # The kernel stopped responding or died, and its state is gone
+    lost: bool = False
+
+
+class Kernel:
+    def __init__(self, cwd: str):
+        # Imported here: jupyter_client is only needed once Python code is actually run
+        from jupyter_client import KernelManager
+
+        self.manager = KernelManager(kernel_name="python3")
+        # The kernel's own stdout and stderr would land in the middle of the terminal UI; code output comes over iopub
+        self.manager.start_kernel(cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.client = self.manager.client()
+        self.client.start_channels()
+        try:
+            self.client.wait_for_ready(timeout=KERNEL_START_TIMEOUT)
+        except BaseException:
+            self.shutdown()
+            raise
+        self._lock = threading.Lock()
+
+    def alive(self) -> bool:
+        return self.manager.is_alive()
+
+    def preload(self, modules: List[str]):
+        if modules:
+            code = "\n".join(f"try:\n    import {name}\nexcept Exception:\n    pass" for name in modules)
+            self.execute(code, timeout=KERNEL_START_TIMEOUT)
+
+    def interrupt(self):
+        try:
+            self.manager.interrupt_kernel()
+        except RuntimeError:
+            pass
+
+    def shutdown(self):
+        try:
+            self.client.stop_channels()
+        except Exception:
+            pass
+        try:
+            self.manager.shutdown_kernel(now=True)
+        except Exception:
+            pass
+
+    def execute(self, code: str, timeout: float, progress=None) -> ExecutionResult:
+        with self._lock:
+            output = CappedOutput()
+            msg_id = self.client.execute(code, store_history=True, allow_stdin=False, stop_on_error=True)
+            deadline = time.monotonic() + timeout
+            error = timed_out = False
+            last_progress = 0.0
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    if timed_out:
+                        # Still busy after the interrupt
+                        return ExecutionResult(output.text(), error, timed_out, lost=True)
+                    timed_out = True
+                    self.interrupt()
+                    deadline = time.monotonic() + INTERRUPT_GRACE
+                    continue
+                try:
+                    msg = self.client.get_iopub_msg(timeout=min(remaining, 0.5))
+                except queue.Empty:
+                    if not self.alive():
+                        return ExecutionResult(output.text(), True, timed_out, lost=True)
+                    continue
+                if msg["parent_header"].get("msg_id") != msg_id:
+                    continue
+                msg_type, content = msg["msg_type"], msg["content"]
+                text = None
+                if msg_type == "stream":
+                    text = content["text"]
+                elif msg_type in ("execute_result", "display_data"):
+                    data = content.get("data", {})
+                    text = data.get("text/plain", "")
+                    others = sorted(kind for kind in data if kind != "text/plain")
+                    if others:
+                        text += f"\n[{', '.join(others)} output not shown]"
+                    text += "\n"
+                elif msg_type == "error":
+                    error = True
+                    text = ANSI_ESCAPE.sub("", "\n".join(content.get("traceback", []))) + "\n"
+                elif msg_type == "status" and content.get("execution_state") == "idle":
+                    break
+                if text:
+                    output.write(text.encode("utf-8", errors="replace"))
+                    line = next((line for line in reversed(text.splitlines()) if line.strip()), None)
+                    if progress and line and time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+                        last_progress = time.monotonic()
+                        progress(line.strip())
+            # Collect the matching reply so the shell channel does not pile up
+            try:
+                while self.client.get_shell_msg(timeout=1)["parent_header"].get("msg_id") != msg_id:
+                    pass
+            except queue.Empty:
+                pass
+            return ExecutionResult(output.text(), error, timed_out)
+
+
+class KernelPool:
+    def __init__(self, root: str, size: Optional[int] = None):
+        self.root = os.path.realpath(root)
+        self.size = pool_size() if size is None else size
+        self._idle: List[Kernel] = []
+        self._handed_out: List[Kernel] = []
+        self._starting = 0
+        self._lock = threading.Condition()
+        self._closed = False
+        self._used = False
+
+    def _target(self) -> int:
+        # Once python_exec is in use, keep a spare for the next session or reset
+        return max(self.size, 1) if self._used else self.size
+
+    def _start(self) -> Kernel:
+        kernel = Kernel(self.root)
+        try:
+            kernel.preload(preload_modules())
+        except Exception:
+            pass
+        return kernel
+
+    def _fill(self):
+        while True:
+            with self._lock:
+                if self._closed or len(self._idle) + self._starting >= self._target():
+                    return
+                self._starting += 1
+            kernel = None
+            try:
+                kernel = self._start()
+            except Exception:
+                return
+            finally:
+                with self._lock:
+                    self._starting -= 1
+                    if kernel is not None:
+                        if self._closed:
+                            kernel.shutdown()
+                        else:
+                            self._idle.append(kernel)
+                    self._lock.notify_all()
+
+    def warm(self):
+        """Start the pool's missing kernels on a background thread, so python_exec does not wait for one."""
+        with self._lock:
+            if self._closed or len(self._idle) + self._starting >= self._target():
+                return
+        threading.Thread(target=self._fill, name="terminus-kernel-pool", daemon=True).start()
+
+    def acquire(self) -> Kernel:
+        """A warm kernel for one session's exclusive use; starts one if none is ready or about to be."""
+        with self._lock:
+            while not self._idle and self._starting:
+                self._lock.wait(timeout=KERNEL_START_TIMEOUT)
+            kernel = None
+            while self._idle and kernel is None:
+                kernel = self._idle.pop()
+                if not kernel.alive():
+                    kernel.shutdown()
+                    kernel = None
+        if kernel is None:
+            kernel = self._start()
+        with self._lock:
+            self._handed_out.append(kernel)
+            self._used = True
+        # Replace it before anyone needs the next one
+        self.warm()
+        return kernel
+
+    def release(self, kernel: Kernel):
+        """Shut down a kernel a session is done with."""
+        with self._lock:
+            if kernel in self._handed_out:
+                self._handed_out.remove(kernel)
+        kernel.shutdown()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            kernels, self._idle, self._handed_out = self._idle + self._handed_out, [], []
+        for kernel in kernels:
+            kernel.shutdown()
+
+
+_pools: Dict[str, KernelPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_kernel_pool(root: Optional[str] = None) -> KernelPool:
+    """The shared pool for root (the current working directory by default)."""
+    root = os.path.realpath(root or os.getcwd())
+    with _pools_lock:
+        pool = _pools.get(root)
+        if pool is None:
+            pool = _pools[root] = KernelPool(root)
+        return pool
+
+
+@atexit.register
+def close_kernel_pools():
+    for pool in list(_pools.values()):
+        pool.close()
@@ -1,24 +1,46 @@
-import subprocess
 import os
 from src.models.tool import ToolSchema
+from src.tools.file_watcher import sync_changes
+from src.tools.grep import glob_filter
+from src.tools.read_file import format_size
+from src.tools.workspace_tree import WorkspaceTree, get_workspace_tree
 from textwrap import dedent
 
+DEFAULT_DEPTH = 2
+MAX_DEPTH = 10
+DEFAULT_MAX_ENTRIES = 300
+
+
+def tree_for(path: str):
+    """(tree, directory relative to its root) for path, using the shared workspace tree when path is inside it."""
+    sync_changes()
+    root = os.path.realpath(os.getcwd())
+    target = os.path.realpath(path)
+    if target == root:
+        return get_workspace_tree(root), ""
+    if target.startswith(root + os.sep):
+        return get_workspace_tree(root), os.path.relpath(target, root).replace(os.sep, "/")
+    return WorkspaceTree(target), ""
+
+
 class Ls(ToolSchema):
     def __init__(self):
         self.name = "ls"
-    
+
     def description(self):
-        return dedent("""
-        Lists files and directories in a given path. The path parameter must be an absolute path, not a relative path.
-        You can optionally provide an array of glob patterns to ignore with the ignore parameter. 
-        You should generally prefer the Glob and Grep tools, if you know which directories to search.
+        return dedent(f"""
+        Lists files and directories in a given path as a tree. The path parameter must be an absolute path, not a relative path.
+        Descends up to `depth` levels (default {DEFAULT_DEPTH}); deeper directories are shown with their entry count. Files and directories excluded by .gitignore are left out.
+        You can optionally provide an array of glob patterns to ignore with the ignore parameter.
+        Output is capped at max_entries entries (default {DEFAULT_MAX_ENTRIES}).
+        You should generally prefer the glob and grep_search tools, if you know which directories to search.
         """)
-    
+
     def json_schema(self):
         return {
         "type": "function",
         "function": {
-            "name": self.name, 
+            "name": self.name,
             "description": self.description(),
             "parameters": {
                 "type": "object",
@@ -26,33 +48,90 @@ class Ls(ToolSchema):
                     "directory_path": {
                         "type": "string",
                         "description": "the path of the directory to list"
+                    },
+                    "depth": {
+                        "type": "integer",
+                        "description": f"how many levels to descend (1 lists only the directory itself). Defaults to {DEFAULT_DEPTH}",
+                        "default": DEFAULT_DEPTH
+                    },
+                    "ignore": {
+                        "type": "array",
+                        "items": {
+                            "type": "string"
+                        },
+                        "description": "glob patterns of files or directories to leave out, e.g. `*.log` or `tests/fixtures`"
+                    },
+                    "max_entries": {
+                        "type": "integer",
+                        "description": f"the maximum number of entries to show. Defaults to {DEFAULT_MAX_ENTRIES}",
+                        "default": DEFAULT_MAX_ENTRIES
                     }
                 },
                 "required": ["directory_path"]
             }
         }
     }
-    
-    def run(self, directory_path: str):
+
+    def run(self, directory_path: str, depth: int = DEFAULT_DEPTH, ignore=None, max_entries: int = DEFAULT_MAX_ENTRIES):
         # Validate the path exists
         if not os.path.exists(directory_path):
             return f"Error: Path '{directory_path}' does not exist."
-        
+
         if not os.path.isdir(directory_path):
             return f"Error: Path '{directory_path}' is not a directory."
 
-        # Use list form to avoid shell injection
-        try:
-            result = subprocess.run(
-                ["ls", "-la", directory_path],  # Safer: no shell=True
-                capture_output=True,
-                text=True,
-                check=False
-            )
-        except Exception as e:
-            return f"Error executing ls command: {str(e)}"
-
-        if result.returncode != 0:
-            return f"Error listing directory: {result.stderr.strip() or 'Unknown error.'}"
-
-        return f"Directory contents of '{directory_path}':\n{result.stdout.strip()}"
\ No newline at end of file
+        depth = min(max(int(depth or DEFAULT_DEPTH), 1), MAX_DEPTH)
+        max_entries = max(int(max_entries or DEFAULT_MAX_ENTRIES), 1)
+        if isinstance(ignore, str):
+            ignore = [ignore]
+        ignored = [glob_filter(pattern) for pattern in ignore or []]
+
+        tree, start = tree_for(directory_path)
+        if tree.node(start) is None:
+            return f"Error listing directory: cannot read '{directory_path}'."
+
+        lines = []
+        truncated = False
+
+        def visit(rel_dir: str, level: int):
+            nonlocal truncated
+            node = tree.node(rel_dir)
+            if node is None:
+                return
+            prefix = f"{rel_dir}/" if rel_dir else ""
+            indent = "  " * level
+            for name in node.dirs:
+                relative = (prefix + name)[len(start):].lstrip("/")
+                if any(matches(relative) for matches in ignored):
+                    continue
+                if len(lines) >= max_entries:
+                    truncated = True
+                    return
+                if level + 1 < depth:
+                    lines.append(f"{indent}{name}/")
+                    visit(prefix + name, level + 1)
+                else:
+                    child = tree.node(prefix + name)
+                    count = len(child.dirs) + len(child.files) if child else 0
+                    lines.append(f"{indent}{name}/ ({count} entr{'y' if count == 1 else 'ies'})")
+            for name in node.files:
+                relative = (prefix + name)[len(start):].lstrip("/")
+                if any(matches(relative) for matches in ignored):
+                    continue
+                if len(lines) >= max_entries:
+                    truncated = True
+                    return
+                try:
+                    size = format_size(os.stat(os.path.join(tree.root, prefix + name)).st_size)
+                except OSError:
+                    size = "?"
+                lines.append(f"{indent}{name} ({size})")
+
+        visit(start, 0)
+
+        if not lines:
+            return f"Directory '{directory_path}' is empty (or every entry is ignored)."
+        output = f"Directory contents of '{directory_path}':\n" + "\n".join(lines)
+        if truncated:
+            output += f"\n\n(Output capped at {max_entries} entries. List a subdirectory, lower depth or add ignore patterns to see the rest.)"
+        return output
@@ -0,0 +1,235 @@
+"""
+Locating an edit's old_string in a file when it is not quite exact.
+
+Tiers are tried in order and the first one with any match decides:
+
+1. exact          the string occurs verbatim
+2. whitespace     lines equal once trailing whitespace is dropped and tabs expanded
+3. indentation    lines equal once each side's common indentation is removed;
+                  new_string is re-indented by the same amount
+4. fuzzy          the most similar run of lines, found through a line-hash index
+                  and accepted only above FUZZY_THRESHOLD and clearly ahead of
+                  the runner-up
+
+A tier that matches more than once is reported as ambiguous rather than
+falling through to a looser one.
+"""
+
+import difflib
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import List, Tuple, Union
+
+FUZZY_THRESHOLD = 0.9
+# The best fuzzy window must beat the next one by this much to count as unique
+FUZZY_MARGIN = 0.05
+MAX_FUZZY_CANDIDATES = 500
+TIER_DESCRIPTIONS = {
+    "exact": "exact match",
+    "whitespace": "matched after ignoring trailing whitespace",
+    "indentation": "matched after adjusting indentation",
+    "fuzzy": "fuzzy match",
+}
+
+
+@dataclass
+class Match:
+    start: int
+    end: int
+    replacement: str
+    tier: str
+    score: float = 1.0
+
+    def describe(self) -> str:
+        text = TIER_DESCRIPTIONS[self.tier]
+        return f"{text} ({self.score:.0%} similar)" if self.tier == "fuzzy" else text
+
+
+def _leading(line: str) -> str:
+    return line[:len(line) - len(line.lstrip())]
+
+
+def _common_indent(lines: List[str]) -> str:
+    indents = [_leading(line) for line in lines if line.strip()]
+    if not indents:
+        return ""
+    prefix = indents[0]
+    for indent in indents[1:]:
+        while not indent.startswith(prefix):
+            prefix = prefix[:-1]
+    return prefix
+
+
+def _line_offsets(content: str) -> List[int]:
+    offsets = [0]
+    for match in re.finditer("\n", content):
+        offsets.append(match.end())
+    return offsets
+
+
+class _Lines:
+    """The file split into lines, with the character offset where each starts."""
+
+    def __init__(self, content: str):
+        self.content = content
+        self.lines = content.split("\n")
+        self.offsets = _line_offsets(content)
+
+    def span(self, first: int, count: int) -> Tuple[int, int]:
+        last = first + count - 1
+        return self.offsets[first], self.offsets[last] + len(self.lines[last])
+
+
+def _trim_newlines(old_string: str, new_string: str) -> Tuple[str, str]:
+    """Line-based tiers match whole lines: drop blank lines around old_string, and as many around new_string."""
+    lead = len(old_string) - len(old_string.lstrip("\n"))
+    trail = len(old_string) - len(old_string.rstrip("\n"))
+    old_core = old_string.strip("\n")
+    for _ in range(lead):
+        if new_string.startswith("\n"):
+            new_string = new_string[1:]
+    for _ in range(trail):
+        if new_string.endswith("\n"):
+            new_string = new_string[:-1]
+    return old_core, new_string
+
+
+def _reindent(text: str, old_indent: str, new_indent: str) -> str:
+    if old_indent == new_indent:
+        return text
+    lines = []
+    for line in text.split("\n"):
+        if not line.strip():
+            lines.append(line)
+        elif line.startswith(old_indent):
+            lines.append(new_indent + line[len(old_indent):])
+        else:
+            lines.append(new_indent + line.lstrip())
+    return "\n".join(lines)
+
+
+def _indent_like(text: str, window: List[str]) -> str:
+    """Write text's indentation in tabs or spaces, whichever the matched lines use, so they are never mixed."""
+    leads = [_leading(line) for line in window if line.strip()]
+    if not leads:
+        return text
+    tabs = all(set(lead) <= {"\t"} for lead in leads)
+    if not tabs and not all(set(lead) <= {" "} for lead in leads):
+        return text
+    lines = []
+    for line in text.split("\n"):
+        lead = _leading(line)
+        width = len(lead.expandtabs(4))
+        if line.strip():
+            line = ("\t" * (width // 4) + " " * (width % 4) if tabs else " " * width) + line[len(lead):]
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _windows(lines: _Lines, old_lines: List[str], key) -> List[int]:
+    wanted = [key(line) for line in old_lines]
+    count = len(old_lines)
+    return [
+        first for first in range(len(lines.lines) - count + 1)
+        if all(key(lines.lines[first + k]) == wanted[k] for k in range(count))
+    ]
+
+
+def _dedented(lines: List[str]) -> List[str]:
+    indent = _common_indent(lines)
+    return [line[len(indent):].rstrip() if line.startswith(indent) else line.strip() for line in lines]
+
+
+def _fuzzy(lines: _Lines, old_lines: List[str]) -> List[Tuple[float, int, int]]:
+    """(score, first line, line count) of candidate windows, best first."""
+    stripped = [line.strip() for line in lines.lines]
+    positions = defaultdict(list)
+    for number, line in enumerate(stripped):
+        if line:
+            positions[hash(line)].append(number)
+
+    wanted = [line.strip() for line in old_lines]
+    target = "\n".join(wanted)
+    count = len(old_lines)
+    # Anchor on lines of old_string that also occur in the file, rarest first
+    anchors = sorted(
+        ((len(positions[hash(line)]), k) for k, line in enumerate(wanted) if line and hash(line) in positions),
+    )
+    starts = set()
+    for _, k in anchors:
+        for number in positions[hash(wanted[k])]:
+            starts.add(number - k)
+        if len(starts) >= MAX_FUZZY_CANDIDATES:
+            break
+
+    scored = {}
+    for start in starts:
+        for size in (count - 1, count, count + 1):
+            for first in (start, start - 1, start + 1):
+                if size < 1 or first < 0 or first + size > len(stripped) or (first, size) in scored:
+                    continue
+                matcher = difflib.SequenceMatcher(None, target, "\n".join(stripped[first:first + size]), autojunk=False)
+                if matcher.real_quick_ratio() < FUZZY_THRESHOLD or matcher.quick_ratio() < FUZZY_THRESHOLD:
+                    scored[(first, size)] = 0.0
+                    continue
+                scored[(first, size)] = matcher.ratio()
+    ranked = sorted(((score, first, size) for (first, size), score in scored.items() if score), reverse=True)
+    # Windows overlapping the best one are variants of it, not rivals
+    result = []
+    for score, first, size in ranked:
+        if all(first + size <= f or f + s <= first for _, f, s in result):
+            result.append((score, first, size))
+    return result
+
+
+def find_match(content: str, old_string: str, new_string: str) -> Union[Match, str]:
+    """The unique place old_string matches in content (with the text to put there), or an error message."""
+    if not old_string:
+        return "old_string is empty."
+    count = content.count(old_string)
+    if count == 1:
+        start = content.find(old_string)
+        return Match(start, start + len(old_string), new_string, "exact")
+    if count > 1:
+        return f"old_string appears {count} times. Include more context to make it unique."
+
+    old_core, new_core = _trim_newlines(old_string, new_string)
+    old_lines = old_core.split("\n")
+    if not old_core.strip():
+        return "old_string was not found."
+    lines = _Lines(content)
+
+    found = _windows(lines, old_lines, lambda line: line.expandtabs(4).rstrip())
+    tier = "whitespace"
+    if not found:
+        tier = "indentation"
+        wanted = _dedented(old_lines)
+        size = len(old_lines)
+        found = [
+            first for first in range(len(lines.lines) - size + 1)
+            if lines.lines[first].strip() == wanted[0].strip() and _dedented(lines.lines[first:first + size]) == wanted
+        ]
+    if len(found) > 1:
+        return f"old_string matches {len(found)} places once whitespace is ignored. Include more context to make it unique."
+    if found:
+        first = found[0]
+        window = lines.lines[first:first + len(old_lines)]
+        replacement = _indent_like(_reindent(new_core, _common_indent(old_lines), _common_indent(window)), window)
+        start, end = lines.span(first, len(old_lines))
+        return Match(start, end, replacement, tier)
+
+    candidates = _fuzzy(lines, old_lines)
+    if not candidates or candidates[0][0] < FUZZY_THRESHOLD:
+        best = f" (closest is {candidates[0][0]:.0%} similar at line {candidates[0][1] + 1})" if candidates else ""
+        return f"old_string was not found{best}."
+    score, first, size = candidates[0]
+    if len(candidates) > 1 and candidates[1][0] > score - FUZZY_MARGIN:
+        return (
+            f"old_string was not found exactly and is about equally similar to lines {first + 1} and "
+            f"{candidates[1][1] + 1}. Include more context to make it unique."
+        )
+    window = lines.lines[first:first + size]
+    replacement = _indent_like(_reindent(new_core, _common_indent(old_lines), _common_indent(window)), window)
+    start, end = lines.span(first, size)
+    return Match(start, end, replacement, "fuzzy", score)
@@ -1,16 +1,26 @@
+import difflib
+from itertools import pairwise
 from typing import List
+from textwrap import dedent
+from .atomic_write import FileChangedError, atomic_write, read_text
 from .edit_file import FileEditor
+from .match_engine import find_match
 
 class MultiEdit:
     def __init__(self):
         self.name = "multi_edit_file"
         self.file_editor = FileEditor()
-    
+
     def description(self):
-        return """
-        This is 'multi_edit' file tool built on top of the 'edit_file' tool.
-        Use this tool when you want to make multiple edits in a single file,
-        """
+        return dedent("""
+        Makes several edits to one file at once, with a single approval and a single write.
+        Use this instead of repeated file_editor calls when you want to make multiple edits in a single file.
+
+        Every old_string is matched against the file as it is now (not against the result of earlier edits),
+        must match exactly one place, and must not overlap another edit. As with file_editor, differences in trailing
+        whitespace or indentation (or a very close fuzzy match) are tolerated and reported. If any edit fails validation, nothing is
+        written and the index of the failing edit is reported.
+        """)
 
     def json_schema(self):
         return {
@@ -41,13 +51,84 @@ class MultiEdit:
         }
     }
 
-    
+    @staticmethod
+    def plan_edits(content: str, old_strings: List[str], new_strings: List[str]):
+        """
+        (start, end, new_string, index, match) spans for every edit, sorted by position,
+        or an error message naming the first edit that cannot be applied.
+        """
+        if len(old_strings) != len(new_strings):
+            return f"old_strings has {len(old_strings)} entries but new_strings has {len(new_strings)}."
+        if not old_strings:
+            return "No edits given."
+
+        spans = []
+        for index, (old_string, new_string) in enumerate(zip(old_strings, new_strings, strict=True)):
+            if not old_string:
+                return f"Edit {index}: old_string is empty."
+            if old_string == new_string:
+                return f"Edit {index}: old_string and new_string are identical."
+            match = find_match(content, old_string, new_string)
+            if isinstance(match, str):
+                return f"Edit {index}: {match} Use the exact text (including whitespace and indentation) from the file."
+            spans.append((match.start, match.end, match.replacement, index, match))
+
+        spans.sort()
+        for previous, current in pairwise(spans):
+            if current[0] < previous[1]:
+                return f"Edit {current[3]} overlaps edit {previous[3]}. Merge them into one edit."
+        return spans
+
+    @staticmethod
+    def apply_edits(content: str, spans) -> str:
+        parts = []
+        position = 0
+        for start, end, new_string, *_ in spans:
+            parts.append(content[position:start])
+            parts.append(new_string)
+            position = end
+        parts.append(content[position:])
+        return "".join(parts)
 
-    def run(self, file_path: str, old_strings: List[str], new_strings: List[str]):
-        
-        for old_string, new_string in zip(old_strings, new_strings):
-            self.file_editor.run(file_path=file_path, old_string=old_string, new_string=new_string)
-        return "All edits were successful"
+    def run(self, file_path: str, old_strings: List[str], new_strings: List[str], status_callback=None):
+        editor = self.file_editor
+        try:
+            original_content, newline, stat = read_text(file_path)
+        except FileNotFoundError:
+            return f"{editor.RED}Error:{editor.RESET} File not found: {file_path}"
+        except PermissionError:
+            return f"{editor.RED}Error:{editor.RESET} Permission denied when trying to edit: {file_path}"
+        except (OSError, UnicodeDecodeError) as e:
+            return f"{editor.RED}Error editing file:{editor.RESET} {e}"
 
+        spans = self.plan_edits(original_content, old_strings, new_strings)
+        if isinstance(spans, str):
+            return f"{editor.RED}Error:{editor.RESET} {spans}\n\nNo edits were applied to {file_path}."
+        new_content = self.apply_edits(original_content, spans)
 
+        diff = list(difflib.unified_diff(
+            original_content.splitlines(keepends=True),
+            new_content.splitlines(keepends=True),
+            fromfile=f"a/{file_path}",
+            tofile=f"b/{file_path}",
+            lineterm='',
+            n=3
+        ))
+        editor.show_diff(file_path, diff, status_callback, title=f"Proposed {len(spans)} edits to:")
+        decision = editor.authorize([file_path], status_callback, tool=self.name)
+        if decision.action != "allow":
+            return editor.rejection(decision)
 
+        try:
+            atomic_write(file_path, new_content, expected_mtime_ns=stat.st_mtime_ns, newline=newline)
+        except FileChangedError as e:
+            return f"{editor.RED}Error:{editor.RESET} {e}"
+        except PermissionError:
+            return f"{editor.RED}Error:{editor.RESET} Permission denied when trying to edit: {file_path}"
+        except OSError as e:
+            return f"{editor.RED}Error editing file:{editor.RESET} {e}"
+        result = f"{editor.GREEN}✓ Applied {len(spans)} edits to {file_path}{editor.RESET}"
+        inexact = [f"  edit {index}: {match.describe()}" for _, _, _, index, match in sorted(spans, key=lambda span: span[3]) if match.tier != "exact"]
+        if inexact:
+            result += "\n" + "\n".join(inexact)
+        return result
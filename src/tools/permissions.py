@@ -0,0 +1,255 @@
+"""
+Permission policy for tools that change things: file edits and commands.
+
+The policy is read from .terminus/permissions.json in the workspace:
+
+    {
+      "mode": "ask",
+      "rules": [
+        {"action": "deny", "path": ".env*"},
+        {"action": "allow", "tool": "command_executor", "command": "pytest*"},
+        {"action": "ask", "tool": "command_executor", "command": "git push*"}
+      ]
+    }
+
+Rules are checked in order and the first one whose tool, path glob
+(gitignore-style, relative to the workspace) and command pattern (shell
+glob) all match decides. Otherwise the mode does:
+
+    ask          ask before every file edit; commands and file creation run
+    auto         writes inside the workspace and commands run without asking
+    deny_writes  file writes and commands are refused
+
+Writes to the policy file itself always ask, whatever the rules and mode
+say, so the agent cannot grant itself more permissions.
+
+TERMINUS_PERMISSION_MODE overrides the mode. When nobody can answer a prompt
+(stdin is not a terminal, or TERMINUS_HEADLESS is set) an "ask" becomes a
+refusal, so unattended runs never block. Every decision is logged to
+.db/permissions.db.
+"""
+
+import fnmatch
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Iterable, List, Optional
+from src.constants import DEFAULT_DATABASE_DIR
+from src.tools.gitignore import translate
+
+POLICY_PATH = os.path.join(".terminus", "permissions.json")
+DECISION_LOG_PATH = os.path.join(DEFAULT_DATABASE_DIR, "permissions.db")
+MODES = ("ask", "auto", "deny_writes")
+ACTIONS = ("allow", "ask", "deny")
+COMMAND_TOOLS = {"command_executor", "sandbox", "python_exec"}
+# Tools that never prompted before there was a policy; mode "ask" keeps it that way
+UNPROMPTED_TOOLS = COMMAND_TOOLS | {"file_creator"}
+USER_REJECTED = "rejected by user"
+
+# One prompt at a time, even when workers run tools in parallel
+_prompt_lock = threading.Lock()
+
+
+@dataclass
+class Decision:
+    action: str
+    reason: str
+
+
+def is_headless() -> bool:
+    if os.getenv("TERMINUS_HEADLESS", "").strip().lower() in ("1", "true", "yes"):
+        return True
+    try:
+        return not sys.stdin.isatty()
+    except (AttributeError, ValueError):
+        return True
+
+
+class PermissionPolicy:
+    def __init__(self, root: str, mode: str = "ask", rules: Optional[List[dict]] = None):
+        self.root = os.path.realpath(root)
+        self.mode = mode
+        self.rules = []
+        for rule in rules or []:
+            if not isinstance(rule, dict) or rule.get("action") not in ACTIONS:
+                continue
+            path = rule.get("path")
+            pattern = None
+            if path:
+                # As in .gitignore, a glob without a slash matches at any depth
+                prefix = "" if "/" in path.rstrip("/") else "(?:.*/)?"
+                pattern = re.compile(prefix + translate(path.strip("/")) + r"(?:/.*)?\Z")
+            self.rules.append({**rule, "_path": pattern})
+        self._log_con = None
+        self._log_lock = threading.Lock()
+
+    @classmethod
+    def load(cls, root: Optional[str] = None) -> "PermissionPolicy":
+        root = os.path.realpath(root or os.getcwd())
+        config = {}
+        try:
+            with open(os.path.join(root, POLICY_PATH), "r", encoding="utf-8") as f:
+                config = json.load(f)
+        except (OSError, ValueError):
+            pass
+        if not isinstance(config, dict):
+            config = {}
+        mode = os.getenv("TERMINUS_PERMISSION_MODE") or config.get("mode") or "ask"
+        if mode not in MODES:
+            mode = "ask"
+        return cls(root, mode, config.get("rules"))
+
+    def _relative(self, path: str) -> Optional[str]:
+        rel_path = os.path.relpath(os.path.realpath(path), self.root)
+        if rel_path == ".." or rel_path.startswith(".." + os.sep):
+            return None
+        return rel_path.replace(os.sep, "/")
+
+    def _rule_matches(self, rule: dict, tool: str, path: Optional[str], command: Optional[str]) -> bool:
+        if rule.get("tool") and not fnmatch.fnmatchcase(tool, rule["tool"]):
+            return False
+        if rule["_path"] is not None:
+            if path is None:
+                return False
+            rel_path = self._relative(path)
+            candidate = rel_path if rel_path is not None else os.path.realpath(path)
+            if not rule["_path"].match(candidate):
+                return False
+        if rule.get("command"):
+            if command is None or not fnmatch.fnmatchcase(command.strip(), rule["command"]):
+                return False
+        return True
+
+    def _decide_one(self, tool: str, path: Optional[str], command: Optional[str]) -> Decision:
+        for number, rule in enumerate(self.rules, 1):
+            if self._rule_matches(rule, tool, path, command):
+                return Decision(rule["action"], rule.get("reason") or f"rule {number} in {POLICY_PATH}")
+        if self.mode == "deny_writes":
+            return Decision("deny", f"mode deny_writes refuses {'commands' if tool in COMMAND_TOOLS else 'file changes'}")
+        if self.mode == "auto" and path is not None and self._relative(path) is None:
+            return Decision("ask", "mode auto only approves writes inside the workspace")
+        if self.mode == "auto" or tool in UNPROMPTED_TOOLS:
+            return Decision("allow", f"mode {self.mode}")
+        return Decision("ask", "mode ask")
+
+    def decide(self, tool: str, paths: Iterable[str] = (), command: Optional[str] = None) -> Decision:
+        """The decision for a tool call touching paths (or running command): a deny anywhere wins, then an ask."""
+        decisions = [self._decide_one(tool, path, command) for path in paths] or [self._decide_one(tool, None, command)]
+        for action in ("deny", "ask"):
+            for decision in decisions:
+                if decision.action == action:
+                    if action == "ask" and is_headless():
+                        return Decision("deny", f"{decision.reason}, and nobody can be asked in a headless run")
+                    return decision
+        return decisions[0]
+
+    def protects(self, path: str) -> bool:
+        """Whether path is this policy's own file."""
+        return os.path.realpath(path) == os.path.realpath(os.path.join(self.root, POLICY_PATH))
+
+    def log(self, tool: str, target: str, outcome: str, reason: str):
+        """Record a decision; outcome is allowed, denied, approved or rejected (the last two by the user)."""
+        with self._log_lock:
+            try:
+                if self._log_con is None:
+                    path = os.path.join(self.root, DECISION_LOG_PATH)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    con = sqlite3.connect(path, timeout=30, check_same_thread=False)
+                    # An audit log, not a ledger: no fsync per decision
+                    con.execute("PRAGMA journal_mode=WAL")
+                    con.execute("PRAGMA synchronous=NORMAL")
+                    con.execute("""
+                        CREATE TABLE IF NOT EXISTS decisions (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            created_at REAL NOT NULL,
+                            tool TEXT NOT NULL,
+                            target TEXT NOT NULL,
+                            mode TEXT NOT NULL,
+                            outcome TEXT NOT NULL,
+                            reason TEXT NOT NULL
+                        )
+                    """)
+                    self._log_con = con
+                self._log_con.execute(
+                    "INSERT INTO decisions (created_at, tool, target, mode, outcome, reason) VALUES (?, ?, ?, ?, ?, ?)",
+                    (time.time(), tool, target, self.mode, outcome, reason),
+                )
+                self._log_con.commit()
+            except (OSError, sqlite3.Error):
+                pass
+
+
+def confirm(question: str, console, status_callback=None) -> bool:
+    """Ask a y/n question on the console (the StreamingHandler's, when status_callback is one of its methods)."""
+    handler = None
+    if status_callback and hasattr(status_callback, '__self__'):
+        # status_callback is a bound method, get the handler (StreamingHandler instance)
+        handler = status_callback.__self__
+        if hasattr(handler, 'console'):
+            console = handler.console
+        if getattr(handler, 'status', None):
+            handler.status.stop()
+
+    with _prompt_lock:
+        while True:
+            console.print()  # Add a blank line for spacing
+            response = console.input(f"[bold bright_red]{question} (y/n):[/bold bright_red] ").strip().lower()
+            if response in ['y', 'yes', 'n', 'no']:
+                break
+            console.print("[yellow]Please enter 'y' or 'n'[/yellow]")
+    resume_status(status_callback)
+    return response in ['y', 'yes']
+
+
+def resume_status(status_callback=None):
+    """Restart the status spinner a diff preview stopped."""
+    handler = getattr(status_callback, '__self__', None)
+    if handler and hasattr(handler, 'status') and handler.status:
+        handler.status.start()
+
+
+def authorize(tool: str, console, status_callback=None, paths: Iterable[str] = (), command: Optional[str] = None,
+              question: str = "Apply these changes?") -> Decision:
+    """Apply the policy to one tool call, asking the user if it says so. The returned action is allow or deny."""
+    policy = get_permission_policy()
+    paths = list(paths)
+    target = command if command is not None else ", ".join(paths)
+    decision = policy.decide(tool, paths, command)
+    if decision.action == "allow" and any(policy.protects(path) for path in paths):
+        if is_headless():
+            decision = Decision("deny", f"{POLICY_PATH} is only changed with approval, and nobody can be asked in a headless run")
+        else:
+            decision = Decision("ask", f"{POLICY_PATH} is only changed with approval")
+    if decision.action == "ask":
+        approved = confirm(question, console, status_callback)
+        policy.log(tool, target, "approved" if approved else "rejected", decision.reason)
+        return Decision("allow", decision.reason) if approved else Decision("deny", USER_REJECTED)
+    resume_status(status_callback)
+    policy.log(tool, target, "allowed" if decision.action == "allow" else "denied", decision.reason)
+    return decision
+
+
+_policy: Optional[PermissionPolicy] = None
+_policy_key = None
+_policy_lock = threading.Lock()
+
+
+def get_permission_policy() -> PermissionPolicy:
+    """The policy for the current working directory, reloaded when its file or the mode override changes."""
+    global _policy, _policy_key
+    root = os.path.realpath(os.getcwd())
+    try:
+        mtime_ns = os.stat(os.path.join(root, POLICY_PATH)).st_mtime_ns
+    except OSError:
+        mtime_ns = None
+    key = (root, mtime_ns, os.getenv("TERMINUS_PERMISSION_MODE"))
+    with _policy_lock:
+        if _policy is None or _policy_key != key:
+            _policy = PermissionPolicy.load(root)
+            _policy_key = key
+        return _policy
@@ -0,0 +1,104 @@
+from textwrap import dedent
+from typing import Any, Callable, Optional
+from src.models.tool import ToolSchema
+from src.tools.kernel_pool import get_kernel_pool
+from src.tools.permissions import USER_REJECTED, authorize
+from rich.console import Console
+
+PYTHON_EXEC_TIMEOUT = 60
+MAX_PYTHON_EXEC_TIMEOUT = 600
+
+
+class PythonExec(ToolSchema):
+    def __init__(self):
+        self.name = "python_exec"
+        self.console = Console()
+        self.kernel = None
+
+    def description(self):
+        return dedent(f"""
+        Runs Python code in a persistent IPython kernel and returns its output: printed text, the value of the
+        last expression, and tracebacks. Variables, imports and loaded data stay available to later calls, so
+        load data once and explore it step by step instead of re-running whole scripts with command_executor.
+        The kernel starts in the project root and can read and write files like any other process.
+
+        Code running longer than `timeout` seconds ({PYTHON_EXEC_TIMEOUT} by default) is interrupted, which keeps
+        the kernel's state. Set reset=true to start over with a fresh kernel.
+        """)
+
+    def json_schema(self):
+        return {
+        "type": "function",
+        "function": {
+            "name": self.name,
+            "description": self.description(),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "code": {
+                        "type": "string",
+                        "description": "the Python code to run (IPython syntax, so !commands and %magics work too)"
+                    },
+                    "timeout": {
+                        "type": "integer",
+                        "description": f"seconds before the code is interrupted (at most {MAX_PYTHON_EXEC_TIMEOUT})"
+                    },
+                    "reset": {
+                        "type": "boolean",
+                        "description": "discard all variables and imports by starting a fresh kernel before running the code"
+                    }
+                },
+                "required": ["code"]
+            }
+        }
+    }
+
+    def close(self):
+        if self.kernel is not None:
+            get_kernel_pool().release(self.kernel)
+            self.kernel = None
+
+    def run(
+        self,
+        code: str,
+        timeout: Optional[int] = None,
+        reset: bool = False,
+        status_callback: Optional[Callable[..., Any]] = None
+    ) -> str:
+        decision = authorize(self.name, self.console, status_callback, command=code, question="Run this Python code?")
+        if decision.action != "allow":
+            if decision.reason == USER_REJECTED:
+                return "Code execution rejected by user"
+            return f"Code not run: refused by permission policy ({decision.reason})"
+
+        timeout = max(1, min(timeout or PYTHON_EXEC_TIMEOUT, MAX_PYTHON_EXEC_TIMEOUT))
+        notes = []
+        if reset:
+            self.close()
+            notes.append("started a fresh kernel")
+        elif self.kernel is not None and not self.kernel.alive():
+            self.close()
+            notes.append("the previous kernel had died, so this one starts with no variables")
+
+        def progress(line):
+            if status_callback:
+                status_callback(f"python: {line[:100]}", is_thinking=False, is_progress=True)
+
+        try:
+            if self.kernel is None:
+                self.kernel = get_kernel_pool().acquire()
+            result = self.kernel.execute(code, timeout, progress=progress)
+        except Exception as e:
+            return f"Error running Python code: {str(e)}"
+
+        if result.lost:
+            self.close()
+            notes.append("the kernel stopped responding and was shut down; the next call starts a fresh one without this session's variables")
+        output = result.output.rstrip("\n") or "(no output)"
+        if result.timed_out:
+            output = f"Interrupted after {timeout}s\n{output}"
+        elif result.error:
+            output = f"Error:\n{output}"
+        if notes:
+            output += "\n" + "\n".join(f"(Note: {note})" for note in notes)
+        return output
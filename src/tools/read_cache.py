@@ -0,0 +1,106 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+from src.tools.file_watcher import register_cache
+
+READ_CACHE_MAX_BYTES = 64 * 1024 * 1024
+READ_CACHE_MAX_FILE_BYTES = 1024 * 1024
+
+
+class ReadCache:
+    """
+    LRU cache of raw file bytes shared by file_reader and multiple_file_reader.
+
+    Entries are keyed by real path and validated against the file's mtime and
+    size on every lookup, so a stale entry is never returned. Thread-safe, since
+    multiple_file_reader fills it from a thread pool.
+    """
+
+    def __init__(self, max_bytes: int = READ_CACHE_MAX_BYTES, max_file_bytes: int = READ_CACHE_MAX_FILE_BYTES):
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.realpath(path)
+
+    def get(self, path: str, stat: os.stat_result) -> Optional[bytes]:
+        key = self._key(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            mtime_ns, size, data = entry
+            if mtime_ns != stat.st_mtime_ns or size != stat.st_size:
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return data
+
+    def put(self, path: str, stat: os.stat_result, data: bytes):
+        if len(data) > self.max_file_bytes:
+            return
+        key = self._key(path)
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (stat.st_mtime_ns, stat.st_size, data)
+            self._size += len(data)
+            while self._size > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+
+    def invalidate(self, path: Optional[str] = None):
+        """Forget one path, or everything when path is None."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self._size = 0
+            else:
+                self._drop(self._key(path))
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[2])
+
+
+read_cache = ReadCache()
+register_cache(read_cache)
+
+
+def read_bytes(path: str, max_bytes: Optional[int] = None):
+    """
+    Read a file through the shared cache using plain os.read.
+
+    Returns (data, stat, truncated). At most max_bytes are returned when given.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        stat = os.fstat(fd)
+        cached = read_cache.get(path, stat)
+        if cached is not None:
+            if max_bytes is not None and len(cached) > max_bytes:
+                return cached[:max_bytes], stat, True
+            return cached, stat, False
+
+        want = stat.st_size if max_bytes is None else min(stat.st_size, max_bytes)
+        chunks = []
+        remaining = want
+        while remaining > 0:
+            chunk = os.read(fd, min(remaining, 1024 * 1024))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        data = b"".join(chunks)
+    finally:
+        os.close(fd)
+
+    truncated = stat.st_size > len(data)
+    if not truncated:
+        read_cache.put(path, stat, data)
+    return data, stat, truncated
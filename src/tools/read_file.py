@@ -1,28 +1,140 @@
-import subprocess
+import mmap
+import os
+from array import array
+from collections import OrderedDict
 from src.models.tool import ToolSchema
+from src.tools.read_cache import read_cache
+from src.tools.read_tracker import ReadTracker
+from src.tools.symbol_index import symbol_index, format_outline, MAX_INDEXED_BYTES
 from textwrap import dedent
 
+DEFAULT_LINE_LIMIT = 2000
+MAX_LINE_CHARS = 2000
+MMAP_THRESHOLD = 1024 * 1024
+SNIFF_BYTES = 8192
+LONG_LINE_SAMPLE_BYTES = 64 * 1024
+LONG_LINE_AVERAGE = 1000
+INDEX_SCAN_CHUNK = 4 * 1024 * 1024
+INDEX_CACHE_SIZE = 128
+
+BINARY_SIGNATURES = [
+    (b"\x89PNG", "PNG image"),
+    (b"\xff\xd8\xff", "JPEG image"),
+    (b"GIF8", "GIF image"),
+    (b"%PDF", "PDF document"),
+    (b"PK\x03\x04", "ZIP archive"),
+    (b"\x1f\x8b", "gzip archive"),
+    (b"\x7fELF", "ELF executable"),
+    (b"SQLite format 3", "SQLite database"),
+]
+
+
+class LineIndex:
+    """
+    Byte offsets of line starts for one version of a file.
+
+    The index is extended lazily, only as deep as a read needs, so reading the
+    head of a huge file never scans the rest of it. Once built, seeking to any
+    line is a single array lookup.
+    """
+
+    def __init__(self, mtime_ns: int, size: int):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.starts = array("Q", [0])
+        self.scanned = 0
+        self.total_lines = None
+
+    def ensure(self, data, line_count: int):
+        """Make sure the start offset of line `line_count` (0-based) is known, if it exists."""
+        while len(self.starts) <= line_count and self.scanned < self.size:
+            end = min(self.scanned + INDEX_SCAN_CHUNK, self.size)
+            pos = self.scanned
+            while True:
+                newline = data.find(b"\n", pos, end)
+                if newline == -1:
+                    break
+                self.starts.append(newline + 1)
+                pos = newline + 1
+            self.scanned = end
+
+    def count_lines(self, data) -> int:
+        if self.total_lines is None:
+            newlines = 0
+            for start in range(0, self.size, INDEX_SCAN_CHUNK):
+                newlines += data[start:start + INDEX_SCAN_CHUNK].count(b"\n")
+            # A final line without a trailing newline still counts
+            trailing = 1 if self.size and data[self.size - 1:self.size] != b"\n" else 0
+            self.total_lines = newlines + trailing
+        return self.total_lines
+
+    def line_span(self, data, line: int):
+        """Byte span of 0-based `line`, excluding its newline."""
+        self.ensure(data, line + 1)
+        start = self.starts[line]
+        end = self.starts[line + 1] - 1 if line + 1 < len(self.starts) else self.size
+        return start, end
+
+
+_line_indexes: "OrderedDict[str, LineIndex]" = OrderedDict()
+
+
+def get_line_index(path: str, stat: os.stat_result) -> LineIndex:
+    """Cached LineIndex for path, rebuilt whenever its mtime or size changes."""
+    index = _line_indexes.get(path)
+    if index is None or index.mtime_ns != stat.st_mtime_ns or index.size != stat.st_size:
+        index = LineIndex(stat.st_mtime_ns, stat.st_size)
+        _line_indexes[path] = index
+    _line_indexes.move_to_end(path)
+    while len(_line_indexes) > INDEX_CACHE_SIZE:
+        _line_indexes.popitem(last=False)
+    return index
+
+
+def detect_binary(head: bytes):
+    """Return a description of the binary type if head looks binary, else None."""
+    for signature, kind in BINARY_SIGNATURES:
+        if head.startswith(signature):
+            return kind
+    if b"\x00" in head:
+        return "binary data"
+    return None
+
+
+def format_size(size: int) -> str:
+    for unit in ("bytes", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size} {unit}" if unit == "bytes" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
 class FileReader(ToolSchema):
-    def __init__(self):
+    def __init__(self, read_tracker: ReadTracker = None):
         self.name = "file_reader"
-    
+        self.read_tracker = read_tracker
+
     def description(self):
-        return dedent("""
+        return dedent(f"""
     Reads a file from the local filesystem. You can access any file directly by using this tool.
-    Assume this tool is able to read all files on the machine. 
+    Assume this tool is able to read all files on the machine.
     If the User provides a path to a file assume that path is valid. It is okay to read a file that does not exist; an error will be returned.
 
     Usage:
     - The code line numbers will also be provided starting from 1.
     - The file_path parameter must be an absolute path, not a relative path
+    - By default up to {DEFAULT_LINE_LIMIT} lines are returned from the start of the file. Use offset and limit to read a specific range of a long file.
+    - Lines longer than {MAX_LINE_CHARS} characters are truncated.
+    - Binary files and minified files with very long lines return a short summary instead of their contents.
+    - Set outline=true to get only the classes, functions and methods of a file with their line ranges; then read just what you need with offset/limit or the read_symbol tool.
+    - Re-reading a file you already read in this session returns a short "unchanged" note, or a diff if it changed. Pass full=true only if you need the whole content again.
     - If a file does not exist or read file is empty you will be informed so.
     """)
-    
+
     def json_schema(self):
         return {
         "type": "function",
         "function": {
-            "name": self.name, 
+            "name": self.name,
             "description": self.description(),
             "parameters": {
                 "type": "object",
@@ -30,30 +142,130 @@ class FileReader(ToolSchema):
                     "file_path": {
                         "type": "string",
                         "description": "the path of the file to read"
+                    },
+                    "offset": {
+                        "type": "integer",
+                        "description": "the line number to start reading from (1-based). Only provide if the file is too large to read at once"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": f"the number of lines to read. Defaults to {DEFAULT_LINE_LIMIT}"
+                    },
+                    "full": {
+                        "type": "boolean",
+                        "description": "return the full content even if it is unchanged since you last read it",
+                        "default": False
+                    },
+                    "outline": {
+                        "type": "boolean",
+                        "description": "return an outline of classes, functions and methods with line ranges instead of the content",
+                        "default": False
                     }
                 },
                 "required": ["file_path"]
             }
         }
     }
-    
-    def run(self, file_path: str):
-
-        file_content = subprocess.run(
-            f"cat -n {file_path}",
-            shell=True,
-            capture_output=True,
-            text=True
-        )
-
-        if file_content.returncode != 0:
-            error_msg = file_content.stderr.strip()
-            if "No such file or directory" in error_msg:
-                return "File does not exist"
-            return f"Error reading file: {error_msg or 'Unknown error.'}"
-
-        if not file_content.stdout.strip():
-            return "File is empty"
-
-        return f"File Content:\n{file_content.stdout.strip()}"
-        
+
+    def summarize_long_lines(self, file_path: str, size: int, sample: bytes) -> str:
+        lines = sample.split(b"\n")
+        longest = max(len(line) for line in lines)
+        preview = sample[:500].decode("utf-8", errors="replace")
+        return dedent(f"""
+        File {file_path} has very long lines (likely minified or generated), contents not shown.
+        Size: {format_size(size)}
+        Longest line in the first {format_size(len(sample))}: {longest} characters
+        Preview:
+        """).strip() + f"\n{preview}..."
+
+    def read_lines(self, data, index: LineIndex, offset: int, limit: int):
+        lines = []
+        line = offset - 1
+        while len(lines) < limit:
+            index.ensure(data, line + 1)
+            if line >= len(index.starts) or index.starts[line] >= index.size:
+                break
+            start, end = index.line_span(data, line)
+            text = data[start:end].decode("utf-8", errors="replace").rstrip("\r")
+            if len(text) > MAX_LINE_CHARS:
+                text = f"{text[:MAX_LINE_CHARS]}... [line truncated, {len(text)} characters]"
+            lines.append(text)
+            line += 1
+        return lines
+
+    def outline(self, file_path: str, data, stat: os.stat_result, total_lines: int) -> str:
+        if stat.st_size > MAX_INDEXED_BYTES:
+            return f"File {file_path} ({format_size(stat.st_size)}) is too large to outline; use offset and limit."
+        text = bytes(data[:]).decode("utf-8", errors="replace")
+        symbols = symbol_index.symbols_for_text(text, file_path)
+        if not symbols:
+            return f"No classes or functions found in {file_path} ({total_lines} lines)."
+        return f"Outline of {file_path} ({total_lines} lines):\n{format_outline(symbols)}"
+
+    def run(self, file_path: str, offset: int = None, limit: int = None, full: bool = False, outline: bool = False):
+        offset = max(1, int(offset or 1))
+        limit = max(1, int(limit or DEFAULT_LINE_LIMIT))
+
+        try:
+            with open(file_path, "rb") as f:
+                stat = os.fstat(f.fileno())
+                if stat.st_size == 0:
+                    return "File is empty"
+
+                if stat.st_size >= MMAP_THRESHOLD:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                else:
+                    data = read_cache.get(file_path, stat)
+                    if data is None:
+                        data = f.read()
+                        read_cache.put(file_path, stat, data)
+
+                try:
+                    binary_kind = detect_binary(data[:SNIFF_BYTES])
+                    if binary_kind:
+                        return f"Binary file ({binary_kind}, {format_size(stat.st_size)}): {file_path}. Contents not shown."
+
+                    sample = data[:LONG_LINE_SAMPLE_BYTES]
+                    if len(sample) / (sample.count(b"\n") + 1) > LONG_LINE_AVERAGE:
+                        return self.summarize_long_lines(file_path, stat.st_size, sample)
+
+                    index = get_line_index(os.path.realpath(file_path), stat)
+                    if outline:
+                        return self.outline(file_path, data, stat, index.count_lines(data))
+                    lines = self.read_lines(data, index, offset, limit)
+                    total_lines = index.count_lines(data)
+                finally:
+                    if isinstance(data, mmap.mmap):
+                        data.close()
+        except FileNotFoundError:
+            return "File does not exist"
+        except IsADirectoryError:
+            return f"Error reading file: {file_path} is a directory"
+        except PermissionError:
+            return f"Error reading file: permission denied for {file_path}"
+        except OSError as e:
+            return f"Error reading file: {e}"
+
+        if not lines:
+            return f"File has {total_lines} lines; offset {offset} is past the end of the file"
+
+        last_line = offset + len(lines) - 1
+        whole_file = offset == 1 and last_line >= total_lines
+        if self.read_tracker:
+            if whole_file:
+                key = ReadTracker.key(file_path)
+            else:
+                key = ReadTracker.key(file_path, offset, last_line)
+            shown = "\n".join(lines)
+            if full:
+                self.read_tracker.record(key, shown)
+            else:
+                delta = self.read_tracker.check(key, shown, file_path)
+                if delta:
+                    return delta
+
+        content = "\n".join(f"{number:6}\t{text}" for number, text in enumerate(lines, offset))
+        if not whole_file:
+            content += f"\n\n(Showing lines {offset}-{last_line} of {total_lines}. Use offset and limit to read other ranges.)"
+
+        return f"File Content:\n{content}"
@@ -1,21 +1,49 @@
 from textwrap import dedent
 from typing import List
+from concurrent.futures import ThreadPoolExecutor
 import aiofiles
+import aiofiles.os
 import asyncio
+import os
+from src.constants import READ_THREAD_POOL_BATCH
 from src.models.tool import ToolSchema
+from src.tools.read_cache import read_cache, read_bytes
+from src.tools.read_file import detect_binary, format_size
+from src.tools.read_tracker import ReadTracker
+
+MAX_CONCURRENCY = 16
+MAX_FILE_BYTES = 256 * 1024
+MAX_TOTAL_BYTES = 1024 * 1024
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="terminus-read")
+    return _executor
+
 
 class MultipleFileReader(ToolSchema):
-    def __init__(self):
+    def __init__(self, read_tracker: ReadTracker = None):
         self.name = "multiple_file_reader"
+        self.runner = None
+        self.read_tracker = read_tracker
 
     def description(self):
-        return dedent("Used for reading multiple files at once")
-    
+        return dedent(f"""
+        Used for reading multiple files at once.
+        Each file is read independently: a missing or unreadable file is reported inline and does not fail the batch.
+        Files larger than {format_size(MAX_FILE_BYTES)} are truncated and binary files are summarized; use file_reader with offset and limit for the rest.
+        Files you already read in this session come back as a short "unchanged" note or a diff; pass full=true to get whole contents again.
+        """)
+
     def json_schema(self):
         return {
         "type": "function",
         "function": {
-            "name": self.name, 
+            "name": self.name,
             "description": self.description(),
             "parameters": {
                 "type": "object",
@@ -26,6 +54,11 @@ class MultipleFileReader(ToolSchema):
                             "type": "string"
                         },
                         "description": "the paths of the files to read"
+                    },
+                    "full": {
+                        "type": "boolean",
+                        "description": "return full contents even for files unchanged since you last read them",
+                        "default": False
                     }
                 },
                 "required": ["files"]
@@ -33,20 +66,104 @@ class MultipleFileReader(ToolSchema):
         }
     }
 
-    async def read_file(self,file_path):
-        async with aiofiles.open(file_path, "r") as f:
-            return await f.read()
+    @staticmethod
+    def decode(file_path, data, size, truncated):
+        """Turn raw bytes into (content, error, truncated) for one file."""
+        binary_kind = detect_binary(data[:8192])
+        if binary_kind:
+            return None, f"Binary file ({binary_kind}, {format_size(size)}), contents not shown", False
+        content = data.decode("utf-8", errors="replace")
+        if not content.strip():
+            return "File is empty", None, False
+        if truncated:
+            content += f"\n... [truncated at {format_size(len(data))} of {format_size(size)}; use file_reader with offset and limit]"
+        return content, None, truncated
+
+    @staticmethod
+    def describe_error(error: Exception):
+        if isinstance(error, FileNotFoundError):
+            return "File does not exist"
+        if isinstance(error, IsADirectoryError):
+            return "Path is a directory"
+        if isinstance(error, PermissionError):
+            return "Permission denied"
+        return str(error)
+
+    def read_file_sync(self, file_path):
+        try:
+            data, stat, truncated = read_bytes(file_path, MAX_FILE_BYTES)
+        except OSError as e:
+            return None, self.describe_error(e), False
+        return self.decode(file_path, data, stat.st_size, truncated)
+
+    async def read_file(self, file_path, semaphore):
+        async with semaphore:
+            try:
+                stat = await aiofiles.os.stat(file_path)
+                cached = read_cache.get(file_path, stat)
+                if cached is not None:
+                    data = cached[:MAX_FILE_BYTES]
+                else:
+                    async with aiofiles.open(file_path, "rb") as f:
+                        data = await f.read(MAX_FILE_BYTES)
+                    if len(data) == stat.st_size:
+                        read_cache.put(file_path, stat, data)
+            except OSError as e:
+                return None, self.describe_error(e), False
+        return self.decode(file_path, data, stat.st_size, stat.st_size > len(data))
 
     async def main(self, files: List[str]):
-       
-        tasks = [self.read_file(file) for file in files]
-        results = await asyncio.gather(*tasks)
+        semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+        return await asyncio.gather(*(self.read_file(file, semaphore) for file in files))
+
+    def read_all(self, files: List[str]):
+        if len(files) > READ_THREAD_POOL_BATCH:
+            return list(_get_executor().map(self.read_file_sync, files))
+        # Reuse one event loop across calls instead of asyncio.run creating a new one each time
+        if self.runner is None:
+            self.runner = asyncio.Runner()
+        return self.runner.run(self.main(files))
+
+    def run(self, files, full: bool = False):
+        if isinstance(files, str):
+            files = [files]
+        # Preserve order, drop duplicates
+        files = list(dict.fromkeys(os.path.expanduser(file) for file in files))
+        if not files:
+            return "No files provided."
+
+        results = self.read_all(files)
 
         output = []
-        for file, content in zip(files, results):
+        budget = MAX_TOTAL_BYTES
+        skipped = []
+        for file, (content, error, truncated) in zip(files, results, strict=True):
+            if error:
+                output.append(f"File Name: {file} \n Error: {error}")
+                continue
+
+            tracked = self.read_tracker is not None and not truncated
+            if tracked:
+                key = ReadTracker.key(file)
+                normalized = ReadTracker.normalize(content)
+                if not full:
+                    # Swap in an "unchanged" stub or a diff when the model has already seen this file
+                    content = self.read_tracker.delta(key, normalized, file) or content
+
+            if len(content) > budget:
+                skipped.append(file)
+                continue
+            budget -= len(content)
+            if tracked:
+                if full:
+                    self.read_tracker.record(key, normalized)
+                else:
+                    self.read_tracker.update(key, normalized)
             output.append(f"File Name: {file} \n File Content: {content}")
-        
-        return "\n\n".join(output)
 
-    def run(self, files):
-        return asyncio.run(self.main(files))
+        if skipped:
+            output.append(
+                f"Output limit of {format_size(MAX_TOTAL_BYTES)} reached; not shown: {', '.join(skipped)}. "
+                "Read these separately."
+            )
+        return "\n\n".join(output)
@@ -0,0 +1,105 @@
+import difflib
+from textwrap import dedent
+from src.models.tool import ToolSchema
+from src.tools.read_cache import read_bytes
+from src.tools.read_tracker import ReadTracker
+from src.tools.symbol_index import symbol_index, format_outline, MAX_INDEXED_BYTES
+
+MAX_MATCHES_SHOWN = 3
+
+
+class ReadSymbol(ToolSchema):
+    def __init__(self, read_tracker: ReadTracker = None):
+        self.name = "read_symbol"
+        self.read_tracker = read_tracker
+
+    def description(self):
+        return dedent("""
+        Reads a single class, function or method from a file instead of the whole file.
+        Returns just the lines of that symbol (with line numbers), including decorators.
+
+        Usage:
+        - name may be a bare name (`run`) or qualified with its class (`Agent.run`).
+        - If the name is ambiguous, every match is returned; qualify it to pick one.
+        - Use file_reader with outline=true first to see which symbols a file defines.
+        - Works for Python and, heuristically, for brace-delimited languages (JS/TS, Go, Rust, Java, C-like) and Ruby/Lua.
+        """)
+
+    def json_schema(self):
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description(),
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "file_path": {
+                            "type": "string",
+                            "description": "the path of the file containing the symbol"
+                        },
+                        "name": {
+                            "type": "string",
+                            "description": "the symbol to read, e.g. `parse_args` or `Agent.run`"
+                        },
+                        "full": {
+                            "type": "boolean",
+                            "description": "return the code even if it is unchanged since you last read it",
+                            "default": False
+                        }
+                    },
+                    "required": ["file_path", "name"]
+                }
+            }
+        }
+
+    def run(self, file_path: str, name: str, full: bool = False):
+        try:
+            data, _, truncated = read_bytes(file_path, MAX_INDEXED_BYTES)
+        except FileNotFoundError:
+            return "File does not exist"
+        except IsADirectoryError:
+            return f"Error: {file_path} is a directory"
+        except OSError as e:
+            return f"Error reading file: {e}"
+        if truncated:
+            return f"Error: {file_path} is too large to index; use file_reader with offset and limit"
+
+        text = data.decode("utf-8", errors="replace")
+        try:
+            matches = symbol_index.find(file_path, name)
+        except OSError as e:
+            return f"Error reading file: {e}"
+
+        if not matches:
+            symbols = symbol_index.get_symbols(file_path)
+            similar = difflib.get_close_matches(name, [s.qualname for s in symbols], n=5)
+            message = f"Symbol '{name}' not found in {file_path}."
+            if similar:
+                message += f" Did you mean: {', '.join(similar)}?"
+            elif symbols:
+                message += f"\n\nOutline:\n{format_outline(symbols)}"
+            return message
+
+        lines = text.splitlines()
+        sections = []
+        for symbol in matches[:MAX_MATCHES_SHOWN]:
+            body = "\n".join(
+                f"{number:6}\t{lines[number - 1]}" for number in range(symbol.start, min(symbol.end, len(lines)) + 1)
+            )
+            header = f"{symbol.kind} {symbol.qualname} ({file_path}, lines {symbol.start}-{symbol.end})"
+            if self.read_tracker:
+                key = ReadTracker.key(file_path, symbol.start, symbol.end)
+                if full:
+                    self.read_tracker.record(key, body)
+                else:
+                    stub = self.read_tracker.check(key, body, f"{symbol.qualname} in {file_path}")
+                    if stub:
+                        sections.append(stub)
+                        continue
+            sections.append(f"{header}:\n{body}")
+
+        if len(matches) > MAX_MATCHES_SHOWN:
+            others = ", ".join(f"{s.qualname} (line {s.start})" for s in matches[MAX_MATCHES_SHOWN:])
+            sections.append(f"{len(matches) - MAX_MATCHES_SHOWN} more matches not shown: {others}")
+        return "\n\n".join(sections)
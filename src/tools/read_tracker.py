@@ -0,0 +1,98 @@
+import difflib
+import hashlib
+import os
+from typing import Dict, Optional
+
+# Files larger than this are tracked by hash only: re-reads can still be
+# stubbed, but no diff is offered since the old text is not kept.
+MAX_TRACKED_TEXT = 256 * 1024
+
+
+class ReadTracker:
+    """
+    Remembers, for one session, what each file looked like when it was last
+    shown to the model, so re-reads can be answered with a stub or a diff.
+
+    Keys are a real path for whole-file reads, or (real path, first line,
+    last line) for ranged reads. Ranged reads only get "unchanged" stubs; diffs are
+    offered for whole files, where line numbers in the hunks are exact.
+    """
+
+    def __init__(self):
+        self.turn = 0
+        self._seen: Dict[object, tuple] = {}
+
+    def begin_turn(self):
+        self.turn += 1
+
+    def reset(self):
+        """Forget everything, e.g. when the conversation is cleared or reloaded."""
+        self._seen.clear()
+
+    @staticmethod
+    def key(path: str, first_line: Optional[int] = None, last_line: Optional[int] = None):
+        real_path = os.path.realpath(path)
+        if first_line is None and last_line is None:
+            return real_path
+        return (real_path, first_line, last_line)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Whole-file text in the form file_reader tracks it: LF-joined lines, no trailing newline."""
+        lines = text.split("\n")
+        if lines and lines[-1] == "":
+            lines.pop()
+        return "\n".join(line.rstrip("\r") for line in lines)
+
+    def check(self, key, text: str, label: str) -> Optional[str]:
+        """
+        Record text as shown for key and return what to send instead, or None
+        when the full content should be sent.
+        """
+        digest = self._digest(text)
+        replacement = self.delta(key, text, label, digest)
+        self.update(key, text, digest)
+        return replacement
+
+    def delta(self, key, text: str, label: str, digest: Optional[str] = None) -> Optional[str]:
+        """Like check, but without recording anything."""
+        previous = self._seen.get(key)
+        if previous is None:
+            return None
+
+        previous_digest, previous_text, previous_turn = previous
+        if previous_digest == (digest or self._digest(text)):
+            return (
+                f"{label} is unchanged since turn {previous_turn}; its content is already in the conversation. "
+                "Pass full=true to read it again."
+            )
+        if previous_text is None or not isinstance(key, str):
+            return None
+
+        diff = "\n".join(difflib.unified_diff(
+            previous_text.splitlines(),
+            text.splitlines(),
+            fromfile=f"{label} (turn {previous_turn})",
+            tofile=f"{label} (now)",
+            lineterm="",
+            n=3,
+        ))
+        if not diff or len(diff) >= len(text):
+            return None
+        return f"{label} changed since turn {previous_turn}. Diff against the version shown then:\n{diff}"
+
+    def update(self, key, text: str, digest: Optional[str] = None):
+        """Record text unless it is identical to what was last shown, which keeps the original turn."""
+        digest = digest or self._digest(text)
+        previous = self._seen.get(key)
+        if previous is None or previous[0] != digest:
+            self.record(key, text, digest)
+
+    def record(self, key, text: str, digest: Optional[str] = None):
+        """Mark text as shown for key in the current turn."""
+        stored_text = text if len(text) <= MAX_TRACKED_TEXT else None
+        self._seen[key] = (digest or self._digest(text), stored_text, self.turn)
+
+    @staticmethod
+    def _digest(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8", errors="replace")).hexdigest()
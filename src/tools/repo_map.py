@@ -0,0 +1,293 @@
+"""
+Repository map for the system prompt: the most referenced files of the
+workspace and their top-level definitions.
+
+Top-level symbols come from the symbol index. A file that mentions a name
+defined in another file gets an edge to it, and PageRank over those edges
+ranks the files. The ranking is cached under .db/repo_map/, keyed by git HEAD
+plus the hashes of uncommitted changes (or by file mtimes outside git), and
+rendered to fit a token budget. warm_repo_map builds it on a background
+thread at startup; until it is done ready_repo_map returns an empty string
+and the prompt goes without it.
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import subprocess
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+from src.constants import DEFAULT_DATABASE_DIR, DEFAULT_REPO_MAP_TOKENS
+from src.tools.symbol_index import symbol_index
+from src.tools.workspace_tree import get_workspace_tree
+
+CACHE_VERSION = 1
+REPO_MAP_CACHE_DIR = os.path.join(DEFAULT_DATABASE_DIR, "repo_map")
+MAX_CACHED_MAPS = 8
+MAX_MAP_FILES = 2000
+MAX_SCANNED_FILES = 50000
+MAX_MAP_FILE_BYTES = 512 * 1024
+# Names defined in more files than this (run, main, get...) say nothing about which file is meant
+MAX_DEFINERS = 5
+MAX_SYMBOLS_PER_FILE = 12
+MAX_MEMBERS_PER_CLASS = 8
+PAGERANK_ITERATIONS = 30
+DAMPING = 0.85
+BYTES_PER_TOKEN = 4
+GIT_TIMEOUT = 5
+
+SOURCE_EXTENSIONS = {
+    ".py", ".pyi", ".js", ".jsx", ".mjs", ".ts", ".tsx", ".go", ".rs", ".java", ".kt", ".scala",
+    ".c", ".h", ".cc", ".cpp", ".hpp", ".cs", ".swift", ".rb", ".php", ".lua", ".ex", ".exs", ".jl", ".dart",
+}
+IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]{2,}")
+
+
+def _git(root: str, *args: str) -> Optional[str]:
+    try:
+        result = subprocess.run(["git", "-C", root, *args], capture_output=True, text=True, timeout=GIT_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return result.stdout if result.returncode == 0 else None
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha1()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+    except OSError:
+        return "missing"
+    return digest.hexdigest()
+
+
+def cache_key(root: str) -> str:
+    """Identifies the state of the workspace: git HEAD plus dirty-file hashes, or every file's mtime outside git."""
+    key = hashlib.sha1(f"{CACHE_VERSION}\0{root}".encode())
+    head = _git(root, "rev-parse", "HEAD", "--show-toplevel")
+    status = _git(root, "status", "--porcelain", "-z", "--", ".") if head else None
+    if head and status is not None:
+        head_sha, toplevel = head.split()[:2]
+        key.update(head_sha.encode())
+        entries = status.split("\0")
+        index = 0
+        while index < len(entries):
+            entry = entries[index]
+            index += 1
+            if len(entry) < 4:
+                continue
+            code, path = entry[:2], entry[3:]
+            if code[0] in "RC":
+                # Renames and copies are followed by the original path
+                index += 1
+            key.update(f"\0{code}{path}\0{_hash_file(os.path.join(toplevel, path))}".encode())
+    else:
+        tree = get_workspace_tree(root)
+        for count, rel_path in enumerate(tree.files()):
+            if count >= MAX_SCANNED_FILES:
+                break
+            try:
+                stat = os.stat(os.path.join(root, rel_path))
+            except OSError:
+                continue
+            key.update(f"\0{rel_path}\0{stat.st_mtime_ns}\0{stat.st_size}".encode())
+    return key.hexdigest()
+
+
+def pagerank(edges: List[Dict[int, float]], iterations: int = PAGERANK_ITERATIONS, damping: float = DAMPING) -> List[float]:
+    """Weighted PageRank; edges[i] maps target node to edge weight. Rank of dangling nodes is spread evenly."""
+    count = len(edges)
+    if not count:
+        return []
+    totals = [sum(targets.values()) for targets in edges]
+    rank = [1.0 / count] * count
+    for _ in range(iterations):
+        dangling = sum(rank[i] for i in range(count) if not totals[i])
+        base = (1 - damping) / count + damping * dangling / count
+        new_rank = [base] * count
+        for source, targets in enumerate(edges):
+            if not totals[source]:
+                continue
+            share = damping * rank[source] / totals[source]
+            for target, weight in targets.items():
+                new_rank[target] += share * weight
+        rank = new_rank
+    return rank
+
+
+def build_repo_map(root: str) -> List[dict]:
+    """Source files under root with their top-level symbols, highest ranked first."""
+    paths = []
+    for count, rel_path in enumerate(get_workspace_tree(root).files()):
+        if count >= MAX_SCANNED_FILES or len(paths) >= MAX_MAP_FILES:
+            break
+        if os.path.splitext(rel_path)[1].lower() in SOURCE_EXTENSIONS:
+            paths.append(rel_path)
+
+    files = []
+    definitions = defaultdict(set)
+    references = []
+    for rel_path in paths:
+        try:
+            if os.path.getsize(os.path.join(root, rel_path)) > MAX_MAP_FILE_BYTES:
+                continue
+            with open(os.path.join(root, rel_path), "rb") as f:
+                data = f.read()
+        except OSError:
+            continue
+        if b"\x00" in data[:8192]:
+            continue
+        text = data.decode("utf-8", errors="replace")
+        symbols = symbol_index.symbols_for_text(text, rel_path)
+        top_level = [symbol for symbol in symbols if symbol.parent is None]
+        members = defaultdict(list)
+        for symbol in symbols:
+            if symbol.parent and "." not in symbol.parent:
+                members[symbol.parent].append(symbol.name)
+        file_index = len(files)
+        files.append({
+            "path": rel_path,
+            "symbols": [
+                {"name": s.name, "kind": s.kind, "line": s.start, "members": members.get(s.name, [])}
+                for s in top_level
+            ],
+        })
+        for symbol in top_level:
+            definitions[symbol.name].add(file_index)
+        references.append(Counter(IDENTIFIER.findall(text)))
+
+    edges = [defaultdict(float) for _ in files]
+    used = defaultdict(int)
+    for source, counter in enumerate(references):
+        for name, count in counter.items():
+            definers = definitions.get(name)
+            if not definers or len(definers) > MAX_DEFINERS:
+                continue
+            for target in definers:
+                if target == source:
+                    continue
+                # Many mentions of one name count less than mentions of many names
+                edges[source][target] += math.sqrt(count) / len(definers)
+                used[(target, name)] += count
+
+    ranks = pagerank([dict(targets) for targets in edges])
+    for file_index, entry in enumerate(files):
+        entry["rank"] = ranks[file_index]
+        for symbol in entry["symbols"]:
+            symbol["refs"] = used.get((file_index, symbol["name"]), 0)
+    files = [entry for entry in files if entry["symbols"]]
+    files.sort(key=lambda entry: (-entry["rank"], entry["path"]))
+    return files
+
+
+def render_repo_map(files: List[dict], token_budget: int) -> str:
+    """Render ranked files until the next one would exceed token_budget."""
+    budget = token_budget * BYTES_PER_TOKEN
+    blocks = []
+    for entry in files:
+        public = [symbol for symbol in entry["symbols"] if not symbol["name"].startswith("_")]
+        if not public:
+            continue
+        # Keep the most referenced symbols, then show them in file order
+        symbols = sorted(public, key=lambda s: (-s["refs"], s["line"]))[:MAX_SYMBOLS_PER_FILE]
+        symbols.sort(key=lambda s: s["line"])
+        lines = [entry["path"]]
+        for symbol in symbols:
+            line = f"  {symbol['kind']} {symbol['name']}"
+            members = [name for name in symbol["members"] if not name.startswith("_") or name == "__init__"]
+            if members:
+                shown = ", ".join(members[:MAX_MEMBERS_PER_CLASS])
+                line += f": {shown}{', ...' if len(members) > MAX_MEMBERS_PER_CLASS else ''}"
+            lines.append(line)
+        omitted = len(public) - len(symbols)
+        if omitted > 0:
+            lines.append(f"  ... {omitted} more")
+        block = "\n".join(lines)
+        if len(block) + 1 > budget:
+            break
+        budget -= len(block) + 1
+        blocks.append(block)
+    return "\n".join(blocks)
+
+
+def _load(path: str) -> Optional[List[dict]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return payload.get("files") if payload.get("version") == CACHE_VERSION else None
+
+
+def _store(path: str, files: List[dict]):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": CACHE_VERSION, "files": files}, f)
+        os.replace(tmp_path, path)
+        cached = sorted(
+            (os.path.join(os.path.dirname(path), name) for name in os.listdir(os.path.dirname(path)) if name.endswith(".json")),
+            key=os.path.getmtime,
+        )
+        for stale in cached[:-MAX_CACHED_MAPS]:
+            os.remove(stale)
+    except OSError:
+        pass
+
+
+def repo_map_budget() -> int:
+    value = os.getenv("TERMINUS_REPO_MAP_TOKENS")
+    try:
+        return int(value) if value and value.strip() else DEFAULT_REPO_MAP_TOKENS
+    except ValueError:
+        return DEFAULT_REPO_MAP_TOKENS
+
+
+def get_repo_map(root: Optional[str] = None, token_budget: Optional[int] = None) -> str:
+    """The rendered map for root, or an empty string when disabled or nothing could be mapped."""
+    token_budget = repo_map_budget() if token_budget is None else token_budget
+    if token_budget <= 0:
+        return ""
+    root = os.path.realpath(root or os.getcwd())
+    try:
+        cache_path = os.path.join(root, REPO_MAP_CACHE_DIR, f"{cache_key(root)}.json")
+        files = _load(cache_path)
+        if files is None:
+            files = build_repo_map(root)
+            _store(cache_path, files)
+        return render_repo_map(files, token_budget)
+    except Exception:
+        # The map is a hint; never let it break prompt construction
+        return ""
+
+
+_maps: Dict[str, str] = {}
+_warmers: Dict[str, threading.Thread] = {}
+_maps_lock = threading.Lock()
+
+
+def _warm(root: str):
+    repo_map = get_repo_map(root)
+    with _maps_lock:
+        _maps[root] = repo_map
+
+
+def warm_repo_map(root: Optional[str] = None):
+    """Build the map for root on a background thread, so the first prompt does not wait for it."""
+    root = os.path.realpath(root or os.getcwd())
+    with _maps_lock:
+        if root in _maps or root in _warmers:
+            return
+        thread = _warmers[root] = threading.Thread(target=_warm, args=(root,), name="terminus-repo-map", daemon=True)
+    thread.start()
+
+
+def ready_repo_map(root: Optional[str] = None) -> str:
+    """The map built by warm_repo_map, or an empty string while it is still being built."""
+    with _maps_lock:
+        return _maps.get(os.path.realpath(root or os.getcwd()), "")
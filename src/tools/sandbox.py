@@ -1,21 +1,223 @@
+"""
+Running code snippets away from the agent's own process.
+
+Backends share one small interface (SandboxBackend) and are picked per call
+or with TERMINUS_SANDBOX_BACKEND:
+
+local    a child process in a fresh scratch directory, with rlimits on CPU
+         time, memory and file size, a minimal environment, a hard
+         wall-clock timeout that kills its whole process group, and
+         optionally no network (a new network namespace through unshare).
+         Starts in milliseconds and works offline.
+daytona  a cloud sandbox per call (needs DAYTONA_API_KEY and network).
+
+Other backends can be added with register_backend.
+"""
+
+from abc import ABC, abstractmethod
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from dataclasses import dataclass
 from textwrap import dedent
+from typing import Dict, List, Optional, Type
 from src.models.tool import ToolSchema
+from src.tools.permissions import USER_REJECTED, authorize
+from src.tools.shell_session import CappedOutput, kill_process_group
+from rich.console import Console
 
 SUPPORTED_LANGUAGES = ["python", "typescript", "javascript"]
+DEFAULT_BACKEND = "local"
+SANDBOX_TIMEOUT = 30
+MAX_SANDBOX_TIMEOUT = 300
+SANDBOX_MEMORY_BYTES = 1024 * 1024 * 1024
+SANDBOX_FILE_BYTES = 64 * 1024 * 1024
+# Applies the rlimits and then execs the real command, so nothing runs between fork and exec
+# in this (threaded) process: argv is cpu seconds, file bytes, memory bytes (0 for none), command...
+LIMITS_LAUNCHER = """
+import os, resource, sys
+cpu, file_bytes, memory_bytes = (int(value) for value in sys.argv[1:4])
+resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+resource.setrlimit(resource.RLIMIT_FSIZE, (file_bytes, file_bytes))
+resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+if memory_bytes:
+    resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+os.execvp(sys.argv[4], sys.argv[4:])
+"""
+
+
+@dataclass
+class SandboxResult:
+    exit_code: int
+    output: str
+    timed_out: bool = False
+
+
+class SandboxError(Exception):
+    """The backend could not run the code at all (as opposed to the code failing)."""
+
+
+class SandboxBackend(ABC):
+    name = ""
+
+    @abstractmethod
+    def run(self, code: str, language: str, timeout: int, network: bool, **options) -> SandboxResult:
+        """Run code; options are backend-specific settings (such as ephemeral) that other backends ignore."""
+
+
+class LocalBackend(SandboxBackend):
+    name = "local"
+    _unshare_works: Optional[bool] = None
+
+    def __init__(self, memory_bytes: int = SANDBOX_MEMORY_BYTES, file_bytes: int = SANDBOX_FILE_BYTES):
+        self.memory_bytes = memory_bytes
+        self.file_bytes = file_bytes
+
+    @staticmethod
+    def _command(language: str, path: str) -> List[str]:
+        if language == "python":
+            # -I: no user site-packages, no PYTHON* variables, no script directory tricks
+            return [sys.executable, "-I", path]
+        node = shutil.which("node")
+        if language == "javascript":
+            if not node:
+                raise SandboxError("node is not installed, so JavaScript cannot run locally.")
+            return [node, path]
+        for runner in (["tsx"], ["bun", "run"], ["deno", "run", "--allow-all"], ["ts-node"]):
+            executable = shutil.which(runner[0])
+            if executable:
+                return [executable, *runner[1:], path]
+        raise SandboxError("No TypeScript runtime (tsx, bun, deno or ts-node) is installed.")
+
+    @classmethod
+    def network_isolation_available(cls) -> bool:
+        if cls._unshare_works is None:
+            unshare = shutil.which("unshare")
+            try:
+                cls._unshare_works = bool(unshare) and subprocess.run(
+                    [unshare, "--user", "--map-root-user", "--net", "true"],
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=5,
+                ).returncode == 0
+            except (OSError, subprocess.TimeoutExpired):
+                cls._unshare_works = False
+        return cls._unshare_works
+
+    def _limited(self, command: List[str], language: str, timeout: int) -> List[str]:
+        # JavaScript engines reserve far more address space than they use; node gets a heap limit instead
+        memory_bytes = self.memory_bytes if language == "python" else 0
+        return [sys.executable, "-I", "-S", "-c", LIMITS_LAUNCHER, str(timeout), str(self.file_bytes), str(memory_bytes), *command]
+
+    def run(self, code: str, language: str, timeout: int, network: bool, **options) -> SandboxResult:
+        scratch = tempfile.mkdtemp(prefix="terminus-sandbox-")
+        try:
+            extension = {"python": "py", "javascript": "js", "typescript": "ts"}[language]
+            path = os.path.join(scratch, f"main.{extension}")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(code)
+            command = self._command(language, path)
+            if language != "python" and os.path.basename(command[0]) == "node":
+                command.insert(1, f"--max-old-space-size={self.memory_bytes // (1024 * 1024)}")
+            command = self._limited(command, language, timeout)
+            if not network:
+                if not self.network_isolation_available():
+                    raise SandboxError("Network isolation needs unprivileged user namespaces (unshare), which are not available here.")
+                command = [shutil.which("unshare"), "--user", "--map-root-user", "--net", "--", *command]
+
+            env = {
+                "PATH": os.environ.get("PATH", "/usr/bin:/bin"),
+                "HOME": scratch,
+                "TMPDIR": scratch,
+                "LANG": os.environ.get("LANG", "C.UTF-8"),
+                "PYTHONDONTWRITEBYTECODE": "1",
+            }
+            try:
+                process = subprocess.Popen(
+                    command,
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    cwd=scratch,
+                    env=env,
+                    start_new_session=True,
+                )
+            except OSError as e:
+                raise SandboxError(f"Could not start {command[0]}: {e}") from e
+
+            output = CappedOutput()
+
+            def read_output():
+                for chunk in iter(lambda: process.stdout.read1(65536), b""):
+                    output.write(chunk)
+
+            reader = threading.Thread(target=read_output, daemon=True)
+            reader.start()
+            timed_out = False
+            try:
+                process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                timed_out = True
+            # Whatever the snippet left running goes too
+            kill_process_group(process.pid, process)
+            reader.join(timeout=5)
+            process.stdout.close()
+            return SandboxResult(process.returncode, output.text(), timed_out)
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+
+class DaytonaBackend(SandboxBackend):
+    name = "daytona"
+
+    def run(self, code: str, language: str, timeout: int, network: bool, ephemeral: bool = True, **options) -> SandboxResult:
+        from daytona import Daytona, DaytonaConfig, CreateSandboxFromSnapshotParams
+
+        api_key = os.environ.get("DAYTONA_API_KEY")
+        if not api_key:
+            raise SandboxError("DAYTONA_API_KEY environment variable is not set.")
+
+        config = DaytonaConfig(api_key=api_key)
+        daytona = Daytona(config)
+        params = CreateSandboxFromSnapshotParams(
+            language=language,
+            ephemeral=ephemeral,
+            network_block_all=not network,
+        )
+        sandbox = daytona.create(params)
+        response = sandbox.process.code_run(code, timeout=timeout)
+        return SandboxResult(response.exit_code, response.result)
+
+
+BACKENDS: Dict[str, Type[SandboxBackend]] = {}
+
+
+def register_backend(backend: Type[SandboxBackend]):
+    BACKENDS[backend.name] = backend
+
+
+register_backend(LocalBackend)
+register_backend(DaytonaBackend)
 
 
 class Sandbox(ToolSchema):
     def __init__(self):
         self.name = "sandbox"
+        self.console = Console()
 
     def description(self):
-        return dedent("""
-            Execute arbitrary code securely in an isolated, cloud-hosted Daytona sandbox.
-            Each call creates a fresh sandbox with the selected language runtime,
-            runs the provided code, and returns stdout combined with stderr.
-            Use this to run untrusted or AI-generated code, test snippets, or
-            perform tasks in an isolated environment without affecting the host.
-            Requires DAYTONA_API_KEY env var.
+        return dedent(f"""
+            Execute a code snippet in an isolated sandbox and return stdout combined with stderr.
+            Use this to run untrusted or AI-generated code, test snippets, or try things out
+            without affecting the project.
+
+            The default "local" backend runs the code in a separate process in an empty scratch
+            directory (deleted afterwards), limited to {SANDBOX_MEMORY_BYTES // (1024 * 1024)} MB of memory, {SANDBOX_FILE_BYTES // (1024 * 1024)} MB per written file
+            and `timeout` seconds of CPU and wall-clock time ({SANDBOX_TIMEOUT} by default). It starts instantly and
+            works offline; set network=false to cut it off from the network as well. It does not stop
+            the code from reading the rest of the filesystem. The "daytona" backend runs in a fresh
+            cloud sandbox instead and requires DAYTONA_API_KEY.
         """).strip()
 
     def json_schema(self):
@@ -37,9 +239,25 @@ class Sandbox(ToolSchema):
                             "description": "Programming language runtime for the sandbox. Each language runs in its own interpreter environment.",
                             "default": "python"
                         },
+                        "backend": {
+                            "type": "string",
+                            "enum": list(BACKENDS),
+                            "description": "Where to run the code: a local child process or a Daytona cloud sandbox.",
+                            "default": DEFAULT_BACKEND
+                        },
+                        "timeout": {
+                            "type": "integer",
+                            "description": f"Seconds before the code is killed (at most {MAX_SANDBOX_TIMEOUT}).",
+                            "default": SANDBOX_TIMEOUT
+                        },
+                        "network": {
+                            "type": "boolean",
+                            "description": "Whether the code may use the network.",
+                            "default": True
+                        },
                         "ephemeral": {
                             "type": "boolean",
-                            "description": "If true, the sandbox is destroyed right after code execution (no cleanup needed). If false, the sandbox persists until its auto-stop interval elapses.",
+                            "description": "Daytona only: if true, the sandbox is destroyed right after code execution (no cleanup needed). If false, the sandbox persists until its auto-stop interval elapses.",
                             "default": True
                         },
                     },
@@ -48,31 +266,33 @@ class Sandbox(ToolSchema):
             }
         }
 
-    def run(self, code: str, language: str = "python", ephemeral: bool = True):
-        import os
-        from daytona import Daytona, DaytonaConfig, CreateSandboxFromSnapshotParams
-
-        api_key = os.environ.get("DAYTONA_API_KEY")
-        if not api_key:
-            return "Error: DAYTONA_API_KEY environment variable is not set."
-
+    def run(self, code: str, language: str = "python", backend: Optional[str] = None, timeout: int = SANDBOX_TIMEOUT,
+            network: bool = True, ephemeral: bool = True):
         if language not in SUPPORTED_LANGUAGES:
             return (
                 f"Error: Unsupported language '{language}'. "
                 f"Supported: {', '.join(SUPPORTED_LANGUAGES)}"
             )
+        backend = backend or os.environ.get("TERMINUS_SANDBOX_BACKEND") or DEFAULT_BACKEND
+        if backend not in BACKENDS:
+            return f"Error: Unknown sandbox backend '{backend}'. Available: {', '.join(BACKENDS)}"
 
+        decision = authorize(self.name, self.console, command=code, question=f"Run this {language} code in the {backend} sandbox?")
+        if decision.action != "allow":
+            if decision.reason == USER_REJECTED:
+                return "Code execution rejected by user"
+            return f"Code not run: refused by permission policy ({decision.reason})"
+
+        timeout = max(1, min(timeout or SANDBOX_TIMEOUT, MAX_SANDBOX_TIMEOUT))
         try:
-            config = DaytonaConfig(api_key=api_key)
-            daytona = Daytona(config)
-            params = CreateSandboxFromSnapshotParams(
-                language=language,
-                ephemeral=ephemeral,
-            )
-            sandbox = daytona.create(params)
-            response = sandbox.process.code_run(code)
-            if response.exit_code != 0:
-                return f"Exit code: {response.exit_code}\n{response.result}"
-            return response.result
+            result = BACKENDS[backend]().run(code, language, timeout, network, ephemeral=ephemeral)
+        except SandboxError as e:
+            return f"Error: {e}"
         except Exception as e:
             return f"Error executing in sandbox: {str(e)}"
+
+        if result.timed_out:
+            return f"Timed out after {timeout}s and was killed\n{result.output}"
+        if result.exit_code != 0:
+            return f"Exit code: {result.exit_code}\n{result.output}"
+        return result.output
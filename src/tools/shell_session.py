@@ -0,0 +1,316 @@
+"""
+A long-lived shell for command_executor.
+
+Commands are written to one bash (or sh) process over pipes, so cd, exported
+variables, activated virtualenvs and shell functions carry over from one call
+to the next. After each command the shell prints a marker line with the exit
+status on stdout, and a marker on stderr, so both streams can be read up to
+the exact end of that command's output. The shell runs with job control on,
+which puts every command in its own process group: a command that times out
+is killed without taking the shell with it. If the shell itself dies (an
+`exit`, or a kill that had to go that far) the next command starts a new one.
+"""
+
+import atexit
+import os
+import selectors
+import shlex
+import shutil
+import signal
+import subprocess
+import threading
+import time
+import uuid
+import weakref
+from typing import List, Optional
+
+# Bytes of each stream kept from the start and from the end of the output
+OUTPUT_HEAD_BYTES = 16 * 1024
+OUTPUT_TAIL_BYTES = 16 * 1024
+KILL_GRACE = 2
+PROGRESS_INTERVAL = 0.2
+
+
+class CappedOutput:
+    """A stream's output with only its first and last bytes kept, however much is written."""
+
+    def __init__(self, head_bytes: int = OUTPUT_HEAD_BYTES, tail_bytes: int = OUTPUT_TAIL_BYTES):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.dropped = 0
+
+    def write(self, data: bytes):
+        room = self.head_bytes - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        self.tail += data
+        excess = len(self.tail) - self.tail_bytes
+        if excess > 0:
+            del self.tail[:excess]
+            self.dropped += excess
+
+    def text(self) -> str:
+        head = self.head.decode("utf-8", errors="replace")
+        tail = self.tail.decode("utf-8", errors="replace")
+        if self.dropped:
+            return f"{head}\n... [{self.dropped} bytes of output omitted] ...\n{tail}"
+        return head + tail
+
+
+def kill_process_group(pgid: int, process: Optional[subprocess.Popen] = None):
+    """SIGTERM a process group, then SIGKILL whatever is left of it."""
+    try:
+        os.killpg(pgid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    deadline = time.monotonic() + KILL_GRACE
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            break
+        try:
+            os.killpg(pgid, 0)
+        except ProcessLookupError:
+            break
+        time.sleep(0.05)
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    if process is not None:
+        process.wait()
+
+
+def child_pids(pid: int) -> List[int]:
+    """Direct children of pid, from /proc (empty where there is none)."""
+    children = []
+    try:
+        names = os.listdir("/proc")
+    except OSError:
+        return children
+    for name in names:
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat", "rb") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name may contain spaces and parentheses; fields resume after the last ')'
+        fields = stat[stat.rfind(b")") + 2:].split()
+        if len(fields) > 1 and int(fields[1]) == pid:
+            children.append(int(name))
+    return children
+
+
+class _Stream:
+    """One of the shell's output pipes, read up to the current command's marker."""
+
+    def __init__(self, marker: bytes):
+        self.marker = marker
+        self.output = CappedOutput()
+        self.pending = b""
+        self.done = False
+        self.trailer = b""
+        self.line = b""
+
+    def feed(self, data: bytes):
+        self.pending += data
+        index = self.pending.find(self.marker)
+        if index >= 0:
+            self.output.write(self.pending[:index])
+            self.trailer = self.pending[index + len(self.marker):]
+            self.pending = b""
+            self.done = True
+            return
+        # Hold back enough to recognise a marker split across reads
+        keep = len(self.marker)
+        if len(self.pending) > keep:
+            self.output.write(self.pending[:-keep])
+            self.pending = self.pending[-keep:]
+
+    def finish(self):
+        self.output.write(self.pending)
+        self.pending = b""
+
+
+class ShellSession:
+    def __init__(self, cwd: Optional[str] = None):
+        self.cwd = cwd or os.getcwd()
+        self.process: Optional[subprocess.Popen] = None
+        self.lock = threading.Lock()
+        self._token = uuid.uuid4().hex
+        self._count = 0
+
+    @staticmethod
+    def _shell() -> List[str]:
+        bash = shutil.which("bash")
+        return [bash, "--noprofile", "--norc"] if bash else ["/bin/sh"]
+
+    def start(self):
+        self.process = subprocess.Popen(
+            self._shell(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=self.cwd,
+            start_new_session=True,
+        )
+        for pipe in (self.process.stdout, self.process.stderr):
+            os.set_blocking(pipe.fileno(), False)
+        self._send(b"set -m\n")
+
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def close(self):
+        process, self.process = self.process, None
+        if process is None:
+            return
+        if process.poll() is None:
+            kill_process_group(process.pid, process)
+        for pipe in (process.stdin, process.stdout, process.stderr):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+
+    def _send(self, data: bytes):
+        self.process.stdin.write(data)
+        self.process.stdin.flush()
+
+    def interrupt(self):
+        """Kill the running command (every process group the shell started), leaving the shell itself."""
+        if not self.alive():
+            return
+        for pid in child_pids(self.process.pid):
+            try:
+                pgid = os.getpgid(pid)
+            except ProcessLookupError:
+                continue
+            if pgid != self.process.pid:
+                kill_process_group(pgid)
+
+    def environment(self):
+        """(working directory, exported variables) of the shell, for commands started outside it."""
+        returncode, stdout, _, _, _ = self.run("printf '%s\\0' \"$PWD\"; env -0", timeout=5)
+        if returncode != 0 or "\0" not in stdout:
+            return self.cwd, None
+        cwd, *pairs = stdout.split("\0")
+        env = dict(pair.split("=", 1) for pair in pairs if "=" in pair)
+        return cwd, env
+
+    def run(self, command: str, timeout: float, cwd: Optional[str] = None, progress=None):
+        """
+        Run command in the shell. Returns (exit code, stdout, stderr, timed out, note), where note
+        says when the shell was (or will have to be) started afresh.
+        """
+        with self.lock:
+            note = None
+            if not self.alive():
+                if self.process is not None:
+                    note = f"the shell had exited, so a new one was started in {self.cwd}"
+                self.close()
+                self.start()
+            self._count += 1
+            marker = f"__terminus_{self._token}_{self._count}__"
+            script = f"eval {shlex.quote(command)}"
+            if cwd:
+                # A one-off directory should not move the session
+                script = f"(cd {shlex.quote(cwd)} && {script})"
+            self._send((
+                f"{script} < /dev/null\n"
+                f"printf '\\n{marker} %d\\n' $?\n"
+                f"printf '\\n{marker}\\n' >&2\n"
+            ).encode())
+
+            stdout = _Stream(f"\n{marker} ".encode())
+            stderr = _Stream(f"\n{marker}\n".encode())
+            returncode, timed_out = self._read(stdout, stderr, timeout, progress)
+            if returncode is None:
+                # The shell exited, or had to be killed, in the middle of the command
+                stdout.finish()
+                stderr.finish()
+                self.process.wait()
+                if not timed_out:
+                    returncode = self.process.returncode
+                self.close()
+                note = (
+                    f"the shell {'had to be killed' if timed_out else 'exited'}; the next command starts "
+                    f"a new one in {self.cwd}, without this session's directory changes and variables"
+                )
+            return returncode, stdout.output.text(), stderr.output.text(), timed_out, note
+
+    def _read(self, stdout: _Stream, stderr: _Stream, timeout: float, progress=None):
+        """Read both streams up to their markers; returns (exit code, or None if the shell went away, timed out)."""
+        streams = {self.process.stdout.fileno(): stdout, self.process.stderr.fileno(): stderr}
+        selector = selectors.DefaultSelector()
+        for fd in streams:
+            selector.register(fd, selectors.EVENT_READ)
+        deadline = time.monotonic() + timeout
+        last_progress = 0.0
+        timed_out = False
+        try:
+            while not all(stream.done for stream in streams.values()):
+                now = time.monotonic()
+                if now >= deadline:
+                    if timed_out:
+                        # Killing the command did not bring the shell back to its prompt
+                        kill_process_group(self.process.pid, self.process)
+                        return None, True
+                    timed_out = True
+                    self.interrupt()
+                    deadline = now + KILL_GRACE + 1
+                    continue
+                for key, _ in selector.select(timeout=min(0.1, deadline - now)):
+                    stream = streams[key.fd]
+                    try:
+                        data = os.read(key.fd, 65536)
+                    except BlockingIOError:
+                        continue
+                    if not data:
+                        return None, timed_out
+                    stream.feed(data)
+                    if stream.done:
+                        selector.unregister(key.fd)
+                    lines = (stream.line + data).split(b"\n")
+                    stream.line = lines.pop()[-1024:]
+                    line = next((line for line in reversed(lines) if line.strip() and b"__terminus_" not in line), None)
+                    if progress and line and time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+                        last_progress = time.monotonic()
+                        progress(line.decode("utf-8", errors="replace").strip())
+        finally:
+            selector.close()
+
+        # The status line may still be arriving after the marker
+        while b"\n" not in stdout.trailer:
+            try:
+                data = os.read(self.process.stdout.fileno(), 64)
+            except BlockingIOError:
+                time.sleep(0.01)
+                continue
+            if not data:
+                return None, timed_out
+            stdout.trailer += data
+        try:
+            return int(stdout.trailer.split(b"\n", 1)[0]), timed_out
+        except ValueError:
+            return None, timed_out
+
+
+_sessions = weakref.WeakSet()
+
+
+def open_session(cwd: Optional[str] = None) -> ShellSession:
+    """A new session, closed when the program exits."""
+    session = ShellSession(cwd)
+    _sessions.add(session)
+    return session
+
+
+@atexit.register
+def close_sessions():
+    for session in list(_sessions):
+        session.close()
@@ -44,7 +44,7 @@ class SubAgent(ToolSchema):
             from src.agent import Agent
             
             # Create fresh agent instance for each task
-            self.subagent = Agent()
+            self.subagent = Agent(nested=True)
             
             # Initialize with system prompt
             self.subagent.add_system_message()
@@ -0,0 +1,410 @@
+"""
+Index of classes, functions and methods with their line spans.
+
+Python files are parsed with `ast`; other languages go through a small
+tokenizer that understands comments, strings and braces. Results are cached
+in memory (the most recently used MEMORY_CACHE_ENTRIES files) and on disk
+under .db/symbols/, keyed by the hash of the file contents, so an unchanged
+file is never parsed twice. start_pruning() at startup deletes on-disk
+entries that have not been used for a while or exceed the size cap.
+"""
+
+import ast
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import List, Optional
+from src.constants import DEFAULT_DATABASE_DIR
+from src.tools.read_cache import read_bytes
+
+# Bump when extraction changes so stale on-disk entries are ignored
+INDEX_VERSION = 1
+SYMBOL_CACHE_DIR = os.path.join(DEFAULT_DATABASE_DIR, "symbols")
+MAX_INDEXED_BYTES = 4 * 1024 * 1024
+MEMORY_CACHE_ENTRIES = 1024
+SYMBOL_CACHE_MAX_AGE_DAYS = 30
+SYMBOL_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+CLASS_KEYWORDS = {"class", "struct", "interface", "enum", "trait", "impl", "module", "namespace", "object"}
+FUNCTION_KEYWORDS = {"def", "fn", "func", "function", "fun", "sub"}
+NOT_METHODS = {
+    "if", "for", "while", "switch", "catch", "return", "function", "new", "typeof", "sizeof",
+    "else", "do", "try", "await", "yield", "throw", "super", "this", "with", "elif", "match",
+}
+MODIFIERS = {
+    "public", "private", "protected", "static", "async", "export", "default", "abstract",
+    "final", "override", "virtual", "pub", "readonly", "get", "set", "inline", "extern", "unsafe",
+    "const", "let", "var", "declare", "internal", "open", "suspend", "synchronized",
+}
+
+HASH_COMMENT_EXTENSIONS = {".rb", ".sh", ".bash", ".zsh", ".pl", ".r", ".jl", ".ex", ".exs", ".nim", ".cr"}
+END_KEYWORD_EXTENSIONS = {".rb", ".lua", ".ex", ".exs", ".jl", ".cr"}
+
+
+@dataclass
+class Symbol:
+    name: str
+    kind: str
+    start: int
+    end: int
+    parent: Optional[str] = None
+
+    @property
+    def qualname(self) -> str:
+        return f"{self.parent}.{self.name}" if self.parent else self.name
+
+
+def extract_python_symbols(text: str) -> List[Symbol]:
+    tree = ast.parse(text)
+    symbols = []
+
+    def visit(body, parent, in_class):
+        for node in body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+                if isinstance(node, ast.ClassDef):
+                    kind = "class"
+                else:
+                    kind = "method" if in_class else "function"
+                symbol = Symbol(node.name, kind, start, node.end_lineno, parent)
+                symbols.append(symbol)
+                # Functions nested in functions are implementation details; classes nest fully
+                if isinstance(node, ast.ClassDef):
+                    visit(node.body, symbol.qualname, True)
+
+    visit(tree.body, None, False)
+    return symbols
+
+
+TOKEN_PATTERN = re.compile(r"""
+    (?P<newline>\n)
+  | (?P<space>[ \t\r\f\v]+)
+  | (?P<ident>[A-Za-z_$][\w$]*)
+  | (?P<arrow>=>)
+  | (?P<punct>[{}()\[\];=,<>:.])
+  | (?P<other>.)
+""", re.VERBOSE)
+
+
+def tokenize(text: str, ext: str):
+    """
+    Yield (kind, value, line) for identifiers and structural punctuation,
+    skipping comments and string literals.
+    """
+    hash_comments = ext in HASH_COMMENT_EXTENSIONS
+    line = 1
+    pos = 0
+    length = len(text)
+    while pos < length:
+        char = text[pos]
+        if char == "/" and text.startswith("//", pos) or hash_comments and char == "#":
+            end = text.find("\n", pos)
+            pos = length if end == -1 else end
+            continue
+        if char == "/" and text.startswith("/*", pos):
+            end = text.find("*/", pos + 2)
+            end = length if end == -1 else end + 2
+            line += text.count("\n", pos, end)
+            pos = end
+            continue
+        if char in "\"'`":
+            end = pos + 1
+            while end < length and text[end] != char:
+                if text[end] == "\\":
+                    end += 1
+                elif text[end] == "\n" and char != "`":
+                    break
+                end += 1
+            end = min(end + 1, length)
+            line += text.count("\n", pos, end)
+            pos = end
+            continue
+        match = TOKEN_PATTERN.match(text, pos)
+        kind = match.lastgroup
+        value = match.group()
+        if kind == "newline":
+            line += 1
+        elif kind != "space":
+            yield kind, value, line
+        pos = match.end()
+
+
+def extract_generic_symbols(text: str, ext: str) -> List[Symbol]:
+    tokens = list(tokenize(text, ext))
+    symbols = []
+    # Open scopes: (symbol, brace depth inside its body)
+    scopes = []
+    depth = 0
+    parens = 0
+    # Declaration waiting for its body: (symbol, paren depth at declaration, keyword based)
+    pending = None
+    # Whether the current statement has already seen "(" or "=", which rules out a declaration
+    statement_clean = True
+    previous_line = 0
+
+    def in_class_body():
+        return bool(scopes) and scopes[-1][0].kind == "class" and depth == scopes[-1][1]
+
+    def drop_pending():
+        nonlocal pending
+        if pending is not None and not pending[2]:
+            symbols.remove(pending[0])
+        pending = None
+
+    i = 0
+    while i < len(tokens):
+        kind, value, line = tokens[i]
+        next_token = tokens[i + 1] if i + 1 < len(tokens) else (None, None, None)
+        if line != previous_line and parens == 0:
+            statement_clean = True
+        previous_line = line
+
+        if value == "{":
+            depth += 1
+            if pending is not None:
+                if parens == pending[1]:
+                    scopes.append((pending[0], depth))
+                    pending = None
+                elif not pending[2]:
+                    # A brace inside the argument list of what looked like a declaration: it was a call
+                    drop_pending()
+            if parens == 0:
+                statement_clean = True
+            i += 1
+            continue
+        if value == "}":
+            if scopes and scopes[-1][1] == depth:
+                scopes.pop()[0].end = line
+            depth = max(depth - 1, 0)
+            statement_clean = parens == 0
+            i += 1
+            continue
+        if value == ";":
+            drop_pending()
+            statement_clean = True
+            i += 1
+            continue
+        if value in "([":
+            parens += 1
+        elif value in ")]":
+            parens = max(parens - 1, 0)
+
+        if kind == "ident" and pending is None:
+            parent = scopes[-1][0].qualname if scopes else None
+            symbol = None
+            keyword_based = True
+            if value in CLASS_KEYWORDS and next_token[0] == "ident":
+                symbol = Symbol(next_token[1], "class", line, line, parent)
+                i += 1
+            elif value == "type" and next_token[0] == "ident" and i + 2 < len(tokens) \
+                    and tokens[i + 2][1] in {"struct", "interface"}:
+                # Go: type Name struct { ... }
+                symbol = Symbol(next_token[1], "class", line, line, parent)
+                i += 2
+            elif value in FUNCTION_KEYWORDS:
+                j = i + 1
+                # Go receivers: func (r *T) Name(...)
+                if j < len(tokens) and tokens[j][1] == "(":
+                    nesting = 0
+                    while j < len(tokens):
+                        nesting += {"(": 1, ")": -1}.get(tokens[j][1], 0)
+                        j += 1
+                        if nesting == 0:
+                            break
+                    symbol_kind = "method"
+                else:
+                    symbol_kind = "method" if in_class_body() else "function"
+                if j < len(tokens) and tokens[j][0] == "ident":
+                    symbol = Symbol(tokens[j][1], symbol_kind, line, line, parent)
+                    i = j
+            elif value in {"const", "let", "var"} and i + 3 < len(tokens) and tokens[i + 1][0] == "ident" \
+                    and tokens[i + 2][1] == "=" and tokens[i + 3][1] in {"(", "function", "async"}:
+                symbol = Symbol(tokens[i + 1][1], "function", line, line, parent)
+                i += 2
+            elif statement_clean and next_token[1] == "(" and value not in NOT_METHODS \
+                    and value not in MODIFIERS and (in_class_body() or not scopes and depth == 0):
+                # `name(` at the start of a class member or a top-level C-style definition
+                symbol = Symbol(value, "method" if in_class_body() else "function", line, line, parent)
+                keyword_based = False
+            if symbol is not None:
+                symbols.append(symbol)
+                pending = (symbol, parens, keyword_based)
+
+        if value in "(=":
+            statement_clean = False
+        i += 1
+
+    return symbols
+
+
+def extract_indented_symbols(text: str, ext: str) -> List[Symbol]:
+    """Fallback for languages that close blocks with `end` or indentation instead of braces."""
+    lines = text.splitlines()
+    symbols = []
+    declaration = re.compile(r"^(\s*)(?:[\w.]+\s+)*?(class|module|def|function|fn|fun|sub)\s+([\w.?!:]+)")
+    for number, line in enumerate(lines, 1):
+        match = declaration.match(line)
+        if not match:
+            continue
+        indent = len(match.group(1))
+        keyword = match.group(2)
+        end = number
+        for later in range(number, len(lines)):
+            candidate = lines[later]
+            if not candidate.strip():
+                continue
+            candidate_indent = len(candidate) - len(candidate.lstrip())
+            if candidate_indent <= indent:
+                end = later + 1 if candidate.strip().startswith("end") else later
+                break
+        else:
+            end = len(lines)
+        parent = None
+        for symbol in reversed(symbols):
+            if symbol.kind == "class" and symbol.start < number <= symbol.end:
+                parent = symbol.qualname
+                break
+        kind = "class" if keyword in {"class", "module"} else ("method" if parent else "function")
+        symbols.append(Symbol(match.group(3), kind, number, max(end, number), parent))
+    return symbols
+
+
+def extract_symbols(text: str, path: str) -> List[Symbol]:
+    ext = os.path.splitext(path)[1].lower()
+    if ext in {".py", ".pyi"}:
+        try:
+            return extract_python_symbols(text)
+        except (SyntaxError, ValueError):
+            return extract_indented_symbols(text, ext)
+    if ext in END_KEYWORD_EXTENSIONS:
+        return extract_indented_symbols(text, ext)
+    return extract_generic_symbols(text, ext)
+
+
+class SymbolIndex:
+    """Symbols per file, cached in memory and on disk by content hash."""
+
+    def __init__(self, cache_dir: str = SYMBOL_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._memory: "OrderedDict[str, List[Symbol]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cache_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.json")
+
+    def _load(self, digest: str) -> Optional[List[Symbol]]:
+        path = self._cache_path(digest)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+            # The mtime records the last use, which is what prune ages entries by
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        if payload.get("version") != INDEX_VERSION:
+            return None
+        return [Symbol(**entry) for entry in payload["symbols"]]
+
+    def _store(self, digest: str, symbols: List[Symbol]):
+        path = self._cache_path(digest)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": INDEX_VERSION, "symbols": [asdict(s) for s in symbols]}, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def symbols_for_text(self, text: str, path: str) -> List[Symbol]:
+        # The path's extension picks the parser, so it is part of the key
+        ext = os.path.splitext(path)[1].lower()
+        digest = hashlib.sha1(ext.encode() + b"\0" + text.encode("utf-8", errors="replace")).hexdigest()
+        with self._lock:
+            cached = self._memory.get(digest)
+            if cached is not None:
+                self._memory.move_to_end(digest)
+        if cached is not None:
+            return cached
+        symbols = self._load(digest)
+        if symbols is None:
+            symbols = extract_symbols(text, path)
+            self._store(digest, symbols)
+        with self._lock:
+            self._memory[digest] = symbols
+            while len(self._memory) > MEMORY_CACHE_ENTRIES:
+                self._memory.popitem(last=False)
+        return symbols
+
+    def prune(self, max_age_days: Optional[int] = SYMBOL_CACHE_MAX_AGE_DAYS,
+              max_bytes: Optional[int] = SYMBOL_CACHE_MAX_BYTES) -> int:
+        """
+        Delete on-disk entries unused for max_age_days, then the least recently
+        used ones until the cache fits in max_bytes. None or 0 disables a limit.
+
+        Returns the number of deleted entries.
+        """
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        cutoff = time.time() - max_age_days * 86400 if max_age_days else None
+        total = sum(size for _, size, _ in entries)
+        deleted = 0
+        for mtime, size, path in entries:
+            expired = cutoff is not None and mtime < cutoff
+            if not expired and not (max_bytes and total > max_bytes):
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            deleted += 1
+        return deleted
+
+    def start_pruning(self):
+        """Run prune() with the default limits on a daemon thread, so startup never waits on it."""
+        threading.Thread(target=self.prune, name="terminus-symbol-prune", daemon=True).start()
+
+    def get_symbols(self, path: str) -> List[Symbol]:
+        """Symbols of a file. Raises OSError if it cannot be read."""
+        data, _, truncated = read_bytes(path, MAX_INDEXED_BYTES)
+        if truncated or b"\x00" in data[:8192]:
+            return []
+        return self.symbols_for_text(data.decode("utf-8", errors="replace"), path)
+
+    def find(self, path: str, name: str) -> List[Symbol]:
+        """
+        Symbols matching name: a qualified name such as `Agent.run` matches
+        exactly, a bare name matches any symbol with that name.
+        """
+        symbols = self.get_symbols(path)
+        exact = [s for s in symbols if s.qualname == name]
+        if exact:
+            return exact
+        return [s for s in symbols if s.name == name.split(".")[-1] and ("." not in name or s.qualname.endswith(name))]
+
+
+def format_outline(symbols: List[Symbol]) -> str:
+    lines = []
+    for symbol in symbols:
+        indent = "  " * symbol.qualname.count(".")
+        span = f"{symbol.start}-{symbol.end}" if symbol.end != symbol.start else f"{symbol.start}"
+        lines.append(f"{indent}{symbol.kind} {symbol.name} (lines {span})")
+    return "\n".join(lines)
+
+
+symbol_index = SymbolIndex()
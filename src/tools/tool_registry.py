@@ -1,9 +1,19 @@
-from src.tools import Grep, FileReader, CommandExecutor, TodoManager, FileCreator, FileEditor, MultipleFileReader, Ls, SubAgent, Lint, MultiEdit
+from src.tools import Grep, FileReader, CommandExecutor, TodoManager, FileCreator, FileEditor, MultipleFileReader, Ls, SubAgent, Lint, MultiEdit, ReadSymbol, Glob, CodeSearch, ApplyPatch, JobStatus, JobOutput, JobKill, Sandbox, PythonExec
+from src.tools.background_jobs import JobManager
+from src.tools.read_tracker import ReadTracker
+from src.tools.checkpoints import get_checkpoints
+from src.tools.file_watcher import notify_workspace_changed
+
+# Tools that never change files; anything else may, so caches are brought up to date after it runs
+READ_ONLY_TOOLS = {"grep_search", "file_reader", "multiple_file_reader", "ls", "read_symbol", "todo", "glob", "code_search", "job_status", "job_output"}
 
 class ToolRegistry:
     def __init__(self):
         self.tool_box = {}
         self.tool_schemas = []
+        # Per-session state shared by the file tools
+        self.read_tracker = ReadTracker()
+        self.jobs = JobManager()
         self.register_all_tools()
         self.generate_tool_schemas()
     
@@ -11,20 +21,51 @@ class ToolRegistry:
         self.tool_box[name] = tool_obj
     
     def register_all_tools(self):
-        self.register_tool(Grep().name, Grep())
-        self.register_tool(FileReader().name, FileReader())
-        self.register_tool(CommandExecutor().name, CommandExecutor())
-        self.register_tool(TodoManager().name, TodoManager())
-        self.register_tool(FileCreator().name, FileCreator())
-        self.register_tool(FileEditor().name, FileEditor())
-        self.register_tool(MultipleFileReader().name, MultipleFileReader())
-        self.register_tool(Ls().name, Ls())
-        self.register_tool(SubAgent().name, SubAgent())
-        self.register_tool(Lint().name, Lint())
-        self.register_tool(MultiEdit().name, MultiEdit())
+        tools = [
+            Grep(),
+            FileReader(read_tracker=self.read_tracker),
+            CommandExecutor(jobs=self.jobs),
+            TodoManager(),
+            FileCreator(),
+            FileEditor(),
+            MultipleFileReader(read_tracker=self.read_tracker),
+            Ls(),
+            SubAgent(),
+            Lint(),
+            MultiEdit(),
+            ReadSymbol(read_tracker=self.read_tracker),
+            Glob(),
+            CodeSearch(),
+            ApplyPatch(),
+            JobStatus(jobs=self.jobs),
+            JobOutput(jobs=self.jobs),
+            JobKill(jobs=self.jobs),
+            Sandbox(),
+            PythonExec(),
+        ]
+        for tool in tools:
+            self.register_tool(tool.name, tool)
         
     def generate_tool_schemas(self):
         self.tool_schemas = [tool.json_schema() for tool in self.tool_box.values()]
+
+    def begin_turn(self):
+        """Called by the agent at the start of each user turn."""
+        self.read_tracker.begin_turn()
+        # Edits made during this turn are undone together
+        get_checkpoints().begin_turn()
+        # Files may have been edited outside the agent since the last turn
+        notify_workspace_changed()
+
+    def reset_session(self):
+        """Drop per-session tool state when the conversation is cleared or replaced."""
+        self.read_tracker.reset()
+        # A cleared conversation should not see the old kernel's variables
+        self.tool_box["python_exec"].close()
     
     def run_tool(self, tool_name, **kwargs):
-        return self.tool_box[tool_name].run(**kwargs)
\ No newline at end of file
+        try:
+            return self.tool_box[tool_name].run(**kwargs)
+        finally:
+            if tool_name not in READ_ONLY_TOOLS:
+                notify_workspace_changed()
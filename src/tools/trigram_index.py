@@ -0,0 +1,450 @@
+"""
+Trigram index of the workspace, in the style of codesearch and Zoekt.
+
+Every text file is broken into the set of 3-byte sequences it contains
+(ASCII-lowercased, so one index serves case-sensitive and insensitive
+searches). A regex is reduced to the literal strings any match must contain;
+only files holding all of their trigrams can match, and grep_search confirms
+those candidates with the real regex. The index lives in .db/trigrams.db and
+is brought up to date from the workspace tree and file mtimes and sizes
+before a search; while the file watcher runs, only the paths it reported
+are re-checked.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional, Set
+
+try:
+    import re._parser as sre_parse
+    import re._constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+from src.constants import DEFAULT_DATABASE_DIR
+from src.tools.file_watcher import register_cache, sync_changes, watching
+from src.tools.workspace_tree import get_workspace_tree, relative_path
+
+INDEX_VERSION = 2
+TRIGRAM_DB_PATH = os.path.join(DEFAULT_DATABASE_DIR, "trigrams.db")
+MAX_INDEXED_FILE_BYTES = 1024 * 1024
+# Without a watcher, re-stat the tree at most this often; invalidate() forces the next refresh
+REFRESH_INTERVAL = 5.0
+# Enough to narrow any query well; keeps SQL parameter lists short
+MAX_QUERY_TRIGRAMS = 64
+# Rebuild the bulk segment once this many files (or a quarter of the tree) live in the delta
+COMPACT_MIN_DELTA_FILES = 2000
+COMMIT_BATCH = 500
+
+# files.state values
+UNINDEXED = 0   # too large or unreadable: always searched
+BASE = 1        # postings in the bulk-built base segment
+DELTA = 2       # postings in the delta table
+BINARY = -1     # never matches
+
+
+def trigrams(data: bytes) -> Set[bytes]:
+    """ASCII-lowercased 3-byte sequences of data. Searches are per line, so repeated lines are scanned once."""
+    return {line[i:i + 3] for line in set(data.lower().split(b"\n")) for i in range(len(line) - 2)}
+
+
+def _required_literals(nodes) -> List[str]:
+    """
+    Literal strings every match of a parsed pattern must contain. Alternations
+    contribute nothing, and non-ASCII characters end a run since the index only
+    folds ASCII case.
+    """
+    literals = []
+    current = []
+
+    def flush():
+        if current:
+            literals.append("".join(current))
+            current.clear()
+
+    def walk(nodes):
+        for op, av in nodes:
+            if op is sre_constants.LITERAL and av < 128:
+                current.append(chr(av))
+            elif op is sre_constants.SUBPATTERN and not _has_branch(av[-1]):
+                # A group matches exactly its contents, so a literal run continues through it
+                walk(av[-1])
+            elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[0] >= 1:
+                flush()
+                literals.extend(_required_literals(av[2]))
+            elif op is sre_constants.AT:
+                # Anchors match no characters
+                continue
+            else:
+                flush()
+
+    walk(nodes)
+    flush()
+    return literals
+
+
+def _has_branch(nodes) -> bool:
+    for op, av in nodes:
+        if op is sre_constants.BRANCH:
+            return True
+        if op is sre_constants.SUBPATTERN and _has_branch(av[-1]):
+            return True
+        if op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and _has_branch(av[2]):
+            return True
+    return False
+
+
+def query_trigrams(pattern: str, fixed_strings: bool = False) -> Optional[List[Set[bytes]]]:
+    """
+    Reduce a search to alternatives of required trigram sets: a file can only
+    match if it contains every trigram of at least one alternative. Returns
+    None when the pattern guarantees nothing and every file is a candidate.
+    """
+    if fixed_strings:
+        alternatives = [[run for run in re.split(r"[^\x00-\x7f]+", pattern) if run]]
+    else:
+        try:
+            parsed = list(sre_parse.parse(pattern))
+        except Exception:
+            return None
+        # A top-level alternation such as `foo|bar` or `(foo|bar)` gets one set per branch
+        if len(parsed) == 1 and parsed[0][0] is sre_constants.SUBPATTERN:
+            parsed = list(parsed[0][1][-1])
+        if len(parsed) == 1 and parsed[0][0] is sre_constants.BRANCH:
+            branches = parsed[0][1][1]
+            alternatives = [_required_literals(branch) for branch in branches]
+        else:
+            alternatives = [_required_literals(parsed)]
+
+    sets = []
+    for literals in alternatives:
+        grams = set()
+        for literal in literals:
+            grams |= trigrams(literal.encode("utf-8", errors="replace"))
+        if not grams:
+            return None
+        sets.append(grams)
+    return sets
+
+
+class TrigramIndex:
+    """
+    Trigram postings for the files under one root, stored in sqlite.
+
+    Postings live in two segments. The base segment maps each trigram to a
+    packed array of file ids and is written in bulk, which is what makes
+    indexing a large tree affordable. Files added or changed afterwards go
+    to a row-per-posting delta table; a changed file gets a new id, so its
+    stale base postings simply stop resolving. Once the delta grows large
+    the whole index is rebuilt.
+    """
+
+    def __init__(self, root: str, db_path: str = TRIGRAM_DB_PATH):
+        self.root = os.path.realpath(root)
+        self.db_path = db_path if os.path.isabs(db_path) else os.path.join(self.root, db_path)
+        self._lock = threading.Lock()
+        self._last_refresh = 0.0
+        self._changed: Set[str] = set()
+        self._stale = False
+        self._changes_lock = threading.Lock()
+        self._con = None
+        # building: a full walk or rebuild is underway; ready: one has completed in this process
+        self.building = False
+        self.ready = False
+        self._warmer = None
+
+    def _connect(self):
+        if self._con is not None:
+            return self._con
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        con = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        version = con.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        root = con.execute("SELECT value FROM meta WHERE key = 'root'").fetchone()
+        if version != (str(INDEX_VERSION),) or root != (self.root,):
+            for table in ("base", "delta", "files"):
+                con.execute(f"DROP TABLE IF EXISTS {table}")
+            con.execute("DELETE FROM meta")
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT UNIQUE NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                state INTEGER NOT NULL,
+                trigrams BLOB
+            )
+        """)
+        con.execute("CREATE TABLE IF NOT EXISTS base (trigram BLOB PRIMARY KEY, ids BLOB NOT NULL) WITHOUT ROWID")
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS delta (
+                trigram BLOB NOT NULL,
+                file_id INTEGER NOT NULL,
+                PRIMARY KEY (trigram, file_id)
+            ) WITHOUT ROWID
+        """)
+        con.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (str(INDEX_VERSION),))
+        con.execute("INSERT OR REPLACE INTO meta VALUES ('root', ?)", (self.root,))
+        con.commit()
+        self._con = con
+        return con
+
+    def invalidate(self, path: Optional[str] = None):
+        """Make the next search re-check path, or the whole tree when path is None."""
+        with self._changes_lock:
+            if path is None:
+                self._stale = True
+                return
+            rel_path = relative_path(self.root, path)
+            if rel_path is not None:
+                self._changed.add(rel_path)
+
+    def warm(self):
+        """Bring the index up to date on a background thread, so the first search does not pay for it."""
+        if self._warmer is not None and self._warmer.is_alive():
+            return
+        self._warmer = threading.Thread(target=self.refresh, kwargs={"force": True}, name="terminus-trigram-index", daemon=True)
+        self._warmer.start()
+
+    def refresh(self, force: bool = False, blocking: bool = True) -> Optional[int]:
+        """
+        Bring the index up to date with the files on disk. Returns how many files
+        were (re)indexed or dropped, or None if blocking is False and another
+        thread holds the index.
+        """
+        sync_changes()
+        if not self._lock.acquire(blocking=blocking):
+            return None
+        try:
+            with self._changes_lock:
+                changed_paths, stale = self._changed, self._stale
+                self._changed, self._stale = set(), False
+            con = self._connect()
+            if not force and not stale and self._last_refresh and watching(self.root):
+                return self._refresh_paths(con, changed_paths)
+            if not force and not stale and time.monotonic() - self._last_refresh < REFRESH_INTERVAL:
+                return 0
+            return self._refresh_all(con)
+        finally:
+            self._lock.release()
+
+    def _refresh_all(self, con) -> int:
+        """Reconcile the index with a full walk of the tree, rebuilding it when needed."""
+        self.building = True
+        try:
+            pending = self._reconcile(con)
+        finally:
+            self.building = False
+        self.ready = True
+        return pending
+
+    def _reconcile(self, con) -> int:
+        known = {row[1]: row for row in con.execute("SELECT id, path, mtime_ns, size, state, trigrams FROM files")}
+        current = []
+        for rel_path in get_workspace_tree(self.root).files():
+            try:
+                current.append((rel_path, os.stat(os.path.join(self.root, rel_path))))
+            except OSError:
+                continue
+        changed = []
+        for rel_path, stat in current:
+            row = known.pop(rel_path, None)
+            if row is None or row[2] != stat.st_mtime_ns or row[3] != stat.st_size:
+                changed.append((rel_path, stat, row))
+        removed = list(known.values())
+
+        built = con.execute("SELECT 1 FROM meta WHERE key = 'built'").fetchone()
+        delta_files = con.execute("SELECT COUNT(*) FROM files WHERE state = ?", (DELTA,)).fetchone()[0]
+        if not built or delta_files + len(changed) > max(COMPACT_MIN_DELTA_FILES, len(current) // 4):
+            self._rebuild(con, current)
+            self._last_refresh = time.monotonic()
+            return len(current)
+
+        pending = 0
+        for row in removed:
+            self._remove(con, row)
+            pending += 1
+        for rel_path, stat, row in changed:
+            if row is not None:
+                self._remove(con, row)
+            self._add_delta(con, rel_path, stat)
+            pending += 1
+            if pending % COMMIT_BATCH == 0:
+                con.commit()
+        con.commit()
+        self._last_refresh = time.monotonic()
+        return pending
+
+    def _refresh_paths(self, con, rel_paths: Set[str]) -> int:
+        """Re-check only the given paths (and whatever lies under them), as reported by the watcher."""
+        if not rel_paths:
+            return 0
+        present, gone = get_workspace_tree(self.root).resolve_changes(rel_paths)
+        pending = 0
+        for rel_path in gone:
+            rows = con.execute(
+                "SELECT id, path, mtime_ns, size, state, trigrams FROM files WHERE path = ? OR substr(path, 1, ?) = ?",
+                (rel_path, len(rel_path) + 1, rel_path + "/"),
+            ).fetchall()
+            for row in rows:
+                self._remove(con, row)
+                pending += 1
+        for rel_path in present:
+            try:
+                stat = os.stat(os.path.join(self.root, rel_path))
+            except OSError:
+                continue
+            row = con.execute("SELECT id, path, mtime_ns, size, state, trigrams FROM files WHERE path = ?", (rel_path,)).fetchone()
+            if row is not None and row[2] == stat.st_mtime_ns and row[3] == stat.st_size:
+                continue
+            if row is not None:
+                self._remove(con, row)
+            self._add_delta(con, rel_path, stat)
+            pending += 1
+        con.commit()
+        total, delta_files = con.execute("SELECT COUNT(*), SUM(state = ?) FROM files", (DELTA,)).fetchone()
+        if (delta_files or 0) > max(COMPACT_MIN_DELTA_FILES, total // 4):
+            return pending + self._refresh_all(con)
+        return pending
+
+    def _read_trigrams(self, rel_path: str, stat: os.stat_result):
+        """(state, trigrams) for one file; trigrams is None unless it is indexable text."""
+        if stat.st_size > MAX_INDEXED_FILE_BYTES:
+            return UNINDEXED, None
+        try:
+            with open(os.path.join(self.root, rel_path), "rb") as f:
+                data = f.read(MAX_INDEXED_FILE_BYTES + 1)
+        except OSError:
+            return UNINDEXED, None
+        if b"\x00" in data[:8192]:
+            return BINARY, None
+        if len(data) > MAX_INDEXED_FILE_BYTES:
+            return UNINDEXED, None
+        return BASE, trigrams(data)
+
+    def _rebuild(self, con, files):
+        con.execute("DELETE FROM delta")
+        con.execute("DELETE FROM base")
+        con.execute("DELETE FROM files")
+        postings: Dict[bytes, array] = {}
+        rows = []
+        for file_id, (rel_path, stat) in enumerate(files, 1):
+            state, grams = self._read_trigrams(rel_path, stat)
+            rows.append((file_id, rel_path, stat.st_mtime_ns, stat.st_size, state))
+            for gram in grams or ():
+                ids = postings.get(gram)
+                if ids is None:
+                    ids = postings[gram] = array("I")
+                ids.append(file_id)
+        con.executemany("INSERT INTO files (id, path, mtime_ns, size, state) VALUES (?, ?, ?, ?, ?)", rows)
+        con.executemany("INSERT INTO base (trigram, ids) VALUES (?, ?)", ((gram, ids.tobytes()) for gram, ids in postings.items()))
+        con.execute("INSERT OR REPLACE INTO meta VALUES ('built', '1')")
+        con.commit()
+
+    def _remove(self, con, row):
+        file_id, _, _, _, state, blob = row
+        if state == DELTA and blob:
+            con.executemany(
+                "DELETE FROM delta WHERE trigram = ? AND file_id = ?",
+                ((blob[i:i + 3], file_id) for i in range(0, len(blob), 3)),
+            )
+        con.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def _add_delta(self, con, rel_path: str, stat: os.stat_result):
+        state, grams = self._read_trigrams(rel_path, stat)
+        if state == BASE:
+            state = DELTA
+        # The delta keeps each file's trigrams so its postings can be found again on removal
+        blob = b"".join(grams) if grams else None
+        cursor = con.execute(
+            "INSERT INTO files (path, mtime_ns, size, state, trigrams) VALUES (?, ?, ?, ?, ?)",
+            (rel_path, stat.st_mtime_ns, stat.st_size, state, blob),
+        )
+        if grams:
+            file_id = cursor.lastrowid
+            con.executemany("INSERT INTO delta (trigram, file_id) VALUES (?, ?)", ((gram, file_id) for gram in grams))
+
+    @staticmethod
+    def _base_candidates(con, grams) -> Set[int]:
+        placeholders = ",".join("?" * len(grams))
+        rows = con.execute(f"SELECT ids FROM base WHERE trigram IN ({placeholders})", grams).fetchall()
+        if len(rows) < len(grams):
+            # Some trigram occurs in no base file
+            return set()
+        # Intersect starting from the rarest trigram
+        rows.sort(key=lambda row: len(row[0]))
+        result = None
+        for (blob,) in rows:
+            ids = array("I")
+            ids.frombytes(blob)
+            if result is None:
+                result = set(ids)
+            else:
+                result.intersection_update(ids)
+            if not result:
+                break
+        return result or set()
+
+    @staticmethod
+    def _delta_candidates(con, grams) -> Set[int]:
+        placeholders = ",".join("?" * len(grams))
+        rows = con.execute(
+            f"SELECT file_id FROM delta WHERE trigram IN ({placeholders}) GROUP BY file_id HAVING COUNT(*) = ?",
+            (*grams, len(grams)),
+        )
+        return {file_id for (file_id,) in rows}
+
+    def candidates(self, pattern: str, fixed_strings: bool = False, blocking: bool = True) -> Optional[List[str]]:
+        """
+        Paths (relative to root) of text files that may match pattern, after
+        refreshing the index. With blocking False, None if another thread (such
+        as the warmer) holds the index.
+        """
+        if self.refresh(blocking=blocking) is None:
+            return None
+        plan = query_trigrams(pattern, fixed_strings)
+        if not self._lock.acquire(blocking=blocking):
+            return None
+        try:
+            con = self._connect()
+            if plan is None:
+                rows = con.execute("SELECT path FROM files WHERE state >= 0")
+                return sorted(path for (path,) in rows)
+
+            file_ids: Set[int] = set()
+            for grams in plan:
+                grams = sorted(grams)[:MAX_QUERY_TRIGRAMS]
+                file_ids |= self._base_candidates(con, grams)
+                file_ids |= self._delta_candidates(con, grams)
+            paths = [path for (path,) in con.execute("SELECT path FROM files WHERE state = ?", (UNINDEXED,))]
+            ids = list(file_ids)
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                # Ids of files that changed since the base was built no longer resolve
+                paths.extend(path for (path,) in con.execute(f"SELECT path FROM files WHERE id IN ({placeholders})", chunk))
+            return sorted(paths)
+        finally:
+            self._lock.release()
+
+
+_indexes: Dict[str, TrigramIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_workspace_index(root: Optional[str] = None) -> TrigramIndex:
+    """The shared index for root (the current working directory by default)."""
+    root = os.path.realpath(root or os.getcwd())
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = TrigramIndex(root)
+            register_cache(index)
+        return index
@@ -0,0 +1,216 @@
+"""
+In-memory snapshot of a directory tree, shared by ls, glob and the trigram index.
+
+Directories are scanned with os.scandir the first time they are needed and
+re-scanned only when their own mtime (or their .gitignore) changes, which is
+what happens when entries are added, removed or renamed. Entries excluded by
+.gitignore are left out. While the file watcher covers the tree, directories
+are only re-stat'ed after it reports a change in them.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+from src.tools.file_watcher import register_cache, sync_changes, watching
+from src.tools.gitignore import ALWAYS_IGNORED, IgnoreRules
+
+# Without a watcher, a directory is re-stat'ed at most this often; invalidate() forces it
+REFRESH_INTERVAL = 2.0
+
+
+def relative_path(root: str, path: str) -> Optional[str]:
+    """path relative to root with forward slashes ("" for root itself), or None when it lies outside root."""
+    rel_path = os.path.relpath(os.path.realpath(path), root)
+    if rel_path == ".":
+        return ""
+    if rel_path == ".." or rel_path.startswith(".." + os.sep):
+        return None
+    return rel_path.replace(os.sep, "/")
+
+
+class DirNode:
+    __slots__ = ("mtime_ns", "ignore_mtime_ns", "rules", "dirs", "files", "checked_at")
+
+    def __init__(self, mtime_ns: int, ignore_mtime_ns: int, rules: IgnoreRules, dirs: List[str], files: List[str]):
+        self.mtime_ns = mtime_ns
+        self.ignore_mtime_ns = ignore_mtime_ns
+        self.rules = rules
+        self.dirs = dirs
+        self.files = files
+        self.checked_at = time.monotonic()
+
+
+def _mtime_ns(path: str) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return -1
+
+
+class WorkspaceTree:
+    """Lazily scanned, incrementally refreshed view of the files under root."""
+
+    def __init__(self, root: str):
+        self.root = os.path.realpath(root)
+        self._nodes: Dict[str, DirNode] = {}
+        self._lock = threading.RLock()
+
+    def _abs(self, rel_dir: str) -> str:
+        return os.path.join(self.root, rel_dir) if rel_dir else self.root
+
+    @staticmethod
+    def _parent(rel_dir: str) -> str:
+        return rel_dir.rsplit("/", 1)[0] if "/" in rel_dir else ""
+
+    def _parent_rules(self, rel_dir: str) -> IgnoreRules:
+        if not rel_dir:
+            return IgnoreRules()
+        parent = self.node(self._parent(rel_dir))
+        return parent.rules if parent else IgnoreRules()
+
+    def _scan(self, rel_dir: str, mtime_ns: int, ignore_mtime_ns: int) -> Optional[DirNode]:
+        directory = self._abs(rel_dir)
+        rules = self._parent_rules(rel_dir).child(directory, rel_dir)
+        dirs, files = [], []
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return None
+        for entry in entries:
+            if entry.name in ALWAYS_IGNORED:
+                continue
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+                if rules.is_ignored(rel_path, is_dir):
+                    continue
+                if is_dir:
+                    dirs.append(entry.name)
+                elif entry.is_file(follow_symlinks=False):
+                    files.append(entry.name)
+            except OSError:
+                continue
+        dirs.sort()
+        files.sort()
+        return DirNode(mtime_ns, ignore_mtime_ns, rules, dirs, files)
+
+    def node(self, rel_dir: str = "") -> Optional[DirNode]:
+        """The snapshot of one directory (relative to root), re-scanned if it changed. None if it is gone."""
+        with self._lock:
+            node = self._nodes.get(rel_dir)
+            if node is not None and node.checked_at and (
+                watching(self.root) or time.monotonic() - node.checked_at < REFRESH_INTERVAL
+            ):
+                return node
+
+            directory = self._abs(rel_dir)
+            mtime_ns = _mtime_ns(directory)
+            ignore_mtime_ns = _mtime_ns(os.path.join(directory, ".gitignore"))
+            if mtime_ns == -1:
+                self._forget(rel_dir)
+                return None
+            if node is not None and node.mtime_ns == mtime_ns and node.ignore_mtime_ns == ignore_mtime_ns:
+                node.checked_at = time.monotonic()
+                return node
+
+            if node is not None and node.ignore_mtime_ns != ignore_mtime_ns:
+                # Different rules here change what every subdirectory shows
+                self._forget(rel_dir)
+            node = self._scan(rel_dir, mtime_ns, ignore_mtime_ns)
+            if node is None:
+                self._forget(rel_dir)
+                return None
+            self._nodes[rel_dir] = node
+            return node
+
+    def _forget(self, rel_dir: str):
+        prefix = f"{rel_dir}/" if rel_dir else ""
+        for key in [key for key in self._nodes if key == rel_dir or key.startswith(prefix)]:
+            del self._nodes[key]
+
+    def invalidate(self, path: Optional[str] = None):
+        """Re-check the directory containing path (or path itself, if a directory), or every directory when path is None."""
+        with self._lock:
+            if path is None:
+                for node in self._nodes.values():
+                    node.checked_at = 0.0
+                return
+            rel_path = relative_path(self.root, path)
+            if rel_path is None:
+                return
+            for key in (rel_path, self._parent(rel_path)):
+                node = self._nodes.get(key)
+                if node is not None:
+                    node.checked_at = 0.0
+
+    def walk(self, rel_dir: str = "", max_depth: Optional[int] = None) -> Iterator[Tuple[str, int, DirNode]]:
+        """Yield (relative directory, depth, node) depth-first in name order, down to max_depth (0 is rel_dir itself)."""
+        sync_changes()
+        stack = [(rel_dir, 0)]
+        while stack:
+            current, depth = stack.pop()
+            node = self.node(current)
+            if node is None:
+                continue
+            yield current, depth, node
+            if max_depth is None or depth < max_depth:
+                prefix = f"{current}/" if current else ""
+                stack.extend((prefix + name, depth + 1) for name in reversed(node.dirs))
+
+    def files(self, rel_dir: str = "") -> Iterator[str]:
+        """Paths (relative to root) of every file under rel_dir."""
+        for current, _, node in self.walk(rel_dir):
+            prefix = f"{current}/" if current else ""
+            for name in node.files:
+                yield prefix + name
+
+    def _shows(self, rel_path: str, is_dir: bool) -> bool:
+        """Whether rel_path exists and neither it nor any directory above it is ignored."""
+        while rel_path:
+            node = self.node(self._parent(rel_path))
+            name = rel_path.rsplit("/", 1)[-1]
+            if node is None or name not in (node.dirs if is_dir else node.files):
+                return False
+            rel_path, is_dir = self._parent(rel_path), True
+        return True
+
+    def contains(self, rel_path: str) -> bool:
+        """Whether rel_path is a file the tree shows (it exists and is not ignored)."""
+        return self._shows(rel_path, False)
+
+    def contains_directory(self, rel_path: str) -> bool:
+        """Whether rel_path is a directory the tree shows (it exists and is not ignored)."""
+        return self._shows(rel_path, True)
+
+    def resolve_changes(self, rel_paths) -> Tuple[List[str], List[str]]:
+        """
+        Split changed paths (as reported to invalidate()) into the files now
+        present under them and the paths that are gone or ignored, whose
+        entries (and anything below them) should be dropped.
+        """
+        sync_changes()
+        present, gone = [], []
+        for rel_path in sorted(set(rel_paths)):
+            if self._shows(rel_path, True):
+                present.extend(self.files(rel_path))
+            elif self.contains(rel_path):
+                present.append(rel_path)
+            else:
+                gone.append(rel_path)
+        return present, gone
+
+
+_trees: Dict[str, WorkspaceTree] = {}
+_trees_lock = threading.Lock()
+
+
+def get_workspace_tree(root: Optional[str] = None) -> WorkspaceTree:
+    """The shared tree for root (the current working directory by default)."""
+    root = os.path.realpath(root or os.getcwd())
+    with _trees_lock:
+        tree = _trees.get(root)
+        if tree is None:
+            tree = _trees[root] = WorkspaceTree(root)
+            register_cache(tree)
+        return tree
@@ -1,10 +1,23 @@
 from openai import OpenAI
 from src.tools.tool_registry import ToolRegistry
+from src.tools.ls import tree_for
 from pydantic import BaseModel
-from typing import Any, List, Dict
+from typing import Any, List, Dict, Optional
+from dataclasses import dataclass
 from groq import Groq
 import os
 
+# @file expansion: rough bytes-per-token used for estimates, and the budget
+# above which the largest referenced files are replaced by outlines
+BYTES_PER_TOKEN = 4
+ESTIMATED_LINE_BYTES = 80
+OUTLINE_TOKEN_ESTIMATE = 300
+OUTLINE_PREVIEW_LINES = 20
+OUTLINE_PREVIEW_LINE_CHARS = 200
+FILE_REFERENCE_TOKEN_BUDGET = 50_000
+MAX_REFERENCED_FILES = 200
+FILE_REFERENCE_WORKERS = 8
+
 class Response(BaseModel):
     content: str
     tool_calls: Any
@@ -107,14 +120,20 @@ def parse_file_references(user_input: str):
     Parse @filename references from user input.
     Returns a list of file paths and the cleaned message.
     
+    References may be files, directories (`@src/`), globs (`@src/**/*.py`)
+    or carry a line range (`@file.py:120-200`, `@file.py:42`).
+    
     Examples:
         "@file.py what does this do?" -> (["file.py"], "what does this do?")
         "compare @a.py and @b.py" -> (["a.py", "b.py"], "compare and")
+        "@src/**/*.py:1-20 summarize" -> (["src/**/*.py:1-20"], "summarize")
+        "explain @main.py?" -> (["main.py"], "explain ?")
     """
     import re
     
-    # Pattern to match @filename (supports various file extensions and paths)
-    pattern = r'@([\w\-./]+(?:\.\w+)?)'
+    # Pattern to match @filename (supports paths, globs and an optional :start-end suffix).
+    # A trailing "." or "?" ends the sentence rather than the path: "explain @main.py?"
+    pattern = r'@([\w\-./*?\[\]]*[\w\-/*\]](?::\d+(?:-\d+)?)?)'
     
     # Find all file references
     file_refs = re.findall(pattern, user_input)
@@ -142,41 +161,208 @@ def load_file_content(file_path):
         raise Exception(f"Error reading file {file_path}: {str(e)}")
 
 
-def format_file_context(file_path: str, content: str) -> str:
+def format_file_context(file_path: str, content: str, attributes: str = "") -> str:
     """
     Format file content for injection into the message context.
     """
     return f"""
 
-<file path="{file_path}">
+<file path="{file_path}"{attributes}>
 {content}
 </file>"""
 
 
-def process_file_references(user_input: str):
+@dataclass
+class FileReference:
+    path: str
+    size: int
+    start: Optional[int] = None
+    end: Optional[int] = None
+    outline: bool = False
+
+    @property
+    def label(self) -> str:
+        if self.outline:
+            return f"{self.path} (outline)"
+        if self.start is not None:
+            return f"{self.path}:{self.start}-{self.end or self.start}"
+        return self.path
+
+    @property
+    def estimated_tokens(self) -> int:
+        if self.outline:
+            return OUTLINE_TOKEN_ESTIMATE
+        if self.start is not None:
+            lines = (self.end or self.start) - self.start + 1
+            return min(self.size, lines * ESTIMATED_LINE_BYTES) // BYTES_PER_TOKEN
+        return self.size // BYTES_PER_TOKEN
+
+
+def _expand_reference(reference: str):
+    """Resolve one @reference into (paths, start, end). Raises FileNotFoundError if nothing matches."""
+    import glob
+    import re
+
+    start = end = None
+    match = re.match(r'^(.*?):(\d+)(?:-(\d+))?$', reference)
+    if match:
+        reference = match.group(1)
+        start = int(match.group(2))
+        end = int(match.group(3)) if match.group(3) else start
+
+    if any(char in reference for char in "*?["):
+        paths = sorted(path for path in glob.glob(reference, recursive=True) if os.path.isfile(path))
+    elif os.path.isdir(reference):
+        # Same view as ls, glob and grep, so .gitignore'd files are left out
+        tree, rel_dir = tree_for(reference)
+        prefix = f"{rel_dir}/" if rel_dir else ""
+        paths = [os.path.join(reference, rel_path[len(prefix):]) for rel_path in tree.files(rel_dir)]
+    elif os.path.isfile(reference):
+        paths = [reference]
+    else:
+        raise FileNotFoundError(f"File not found: {reference}")
+
+    if not paths:
+        raise FileNotFoundError(f"No files match: {reference}")
+    return paths, start, end
+
+
+def plan_file_references(file_refs, token_budget: int = FILE_REFERENCE_TOKEN_BUDGET):
+    """
+    Expand @references into FileReference entries using only stat() calls, so
+    the cost is known before any file is read. When the total would exceed
+    token_budget, the largest files are switched to outlines until it fits.
+
+    Returns (references, errors, estimated_tokens).
+    """
+    references = []
+    errors = []
+    seen = set()
+    for ref in file_refs:
+        try:
+            paths, start, end = _expand_reference(ref)
+        except FileNotFoundError as e:
+            errors.append(str(e))
+            continue
+        if len(paths) > MAX_REFERENCED_FILES:
+            errors.append(f"{ref} matches {len(paths)} files; only the first {MAX_REFERENCED_FILES} were loaded")
+            paths = paths[:MAX_REFERENCED_FILES]
+        for path in paths:
+            key = (os.path.normpath(path), start, end)
+            if key in seen:
+                continue
+            seen.add(key)
+            try:
+                size = os.path.getsize(path)
+            except OSError as e:
+                errors.append(f"Error reading file {path}: {e}")
+                continue
+            references.append(FileReference(path=path, size=size, start=start, end=end))
+
+    total = sum(ref.estimated_tokens for ref in references)
+    for ref in sorted(references, key=lambda r: r.estimated_tokens, reverse=True):
+        if total <= token_budget:
+            break
+        if ref.estimated_tokens <= OUTLINE_TOKEN_ESTIMATE:
+            break
+        total -= ref.estimated_tokens
+        ref.outline = True
+        total += ref.estimated_tokens
+
+    return references, errors, total
+
+
+def _load_reference(ref: FileReference):
+    """Read one planned reference and return its formatted context block."""
+    import mmap
+    from src.tools.read_cache import read_bytes
+    from src.tools.read_file import FileReader, MMAP_THRESHOLD, SNIFF_BYTES, detect_binary, format_size, get_line_index
+    from src.tools.symbol_index import symbol_index, format_outline
+
+    if not ref.outline and ref.start is None:
+        data, _, _ = read_bytes(ref.path)
+        binary_kind = detect_binary(data[:SNIFF_BYTES])
+        if binary_kind:
+            raise ValueError(f"Skipped binary file {ref.path} ({binary_kind})")
+        return format_file_context(ref.path, data.decode("utf-8", errors="replace"))
+
+    # Outlines and ranges are for files too big to inline: map them instead of reading them whole
+    with open(ref.path, "rb") as f:
+        stat = os.fstat(f.fileno())
+        if stat.st_size == 0:
+            data = b""
+        elif stat.st_size >= MMAP_THRESHOLD:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            data, stat, _ = read_bytes(ref.path)
+    try:
+        binary_kind = detect_binary(data[:SNIFF_BYTES])
+        if binary_kind:
+            raise ValueError(f"Skipped binary file {ref.path} ({binary_kind})")
+        index = get_line_index(os.path.realpath(ref.path), stat)
+        reader = FileReader()
+
+        if ref.start is not None and not ref.outline:
+            lines = reader.read_lines(data, index, ref.start, (ref.end or ref.start) - ref.start + 1)
+            end = ref.start + max(len(lines), 1) - 1
+            return format_file_context(ref.path, "\n".join(lines), f' lines="{ref.start}-{end}"')
+
+        line_count = index.count_lines(data)
+        symbols = symbol_index.get_symbols(ref.path)
+        summary = f"File is {format_size(stat.st_size)} / {line_count} lines; too large to inline, showing an outline. Read specific ranges with file_reader or read_symbol."
+        if symbols:
+            body = f"{summary}\n{format_outline(symbols)}"
+        else:
+            head = [line[:OUTLINE_PREVIEW_LINE_CHARS] for line in reader.read_lines(data, index, 1, OUTLINE_PREVIEW_LINES)]
+            body = f"{summary}\nFirst {len(head)} lines:\n" + "\n".join(head)
+            if line_count > 2 * OUTLINE_PREVIEW_LINES:
+                # The tail comes from the last few KB, so the line index is never built past the head
+                tail_bytes = OUTLINE_PREVIEW_LINES * OUTLINE_PREVIEW_LINE_CHARS
+                tail = bytes(data[max(0, stat.st_size - tail_bytes):]).decode("utf-8", errors="replace").splitlines()
+                tail = [line.rstrip("\r")[:OUTLINE_PREVIEW_LINE_CHARS] for line in tail[1:][-OUTLINE_PREVIEW_LINES:]]
+                body += f"\n...\nLast {len(tail)} lines:\n" + "\n".join(tail)
+        return format_file_context(ref.path, body, ' outline="true"')
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
+
+
+def process_file_references(user_input: str, token_budget: int = FILE_REFERENCE_TOKEN_BUDGET, on_estimate=None):
     """
     Process user input with @file references.
     Returns enriched message with file contents and list of loaded files.
     
+    Args:
+        user_input: The raw user message
+        token_budget: Approximate tokens the expansion may add before large files fall back to outlines
+        on_estimate: Optional callback(file_count, estimated_tokens) invoked before any file is read
+    
     Returns:
         tuple: (enriched_message, loaded_files, errors)
     """
+    from concurrent.futures import ThreadPoolExecutor
+
     file_refs, cleaned_message = parse_file_references(user_input)
     
     if not file_refs:
         return user_input, [], []
     
+    references, errors, estimated_tokens = plan_file_references(file_refs, token_budget)
+    if on_estimate and references:
+        on_estimate(len(references), estimated_tokens)
+
     loaded_files = []
-    errors = []
     file_contexts = []
-    
-    for file_path in file_refs:
-        try:
-            content = load_file_content(file_path)
-            file_contexts.append(format_file_context(file_path, content))
-            loaded_files.append(file_path)
-        except Exception as e:
-            errors.append(str(e))
+    with ThreadPoolExecutor(max_workers=FILE_REFERENCE_WORKERS) as executor:
+        futures = [executor.submit(_load_reference, ref) for ref in references]
+        for ref, future in zip(references, futures, strict=True):
+            try:
+                file_contexts.append(future.result())
+                loaded_files.append(ref.label)
+            except FileNotFoundError:
+                errors.append(f"File not found: {ref.path}")
+            except Exception as e:
+                errors.append(str(e) if isinstance(e, ValueError) else f"Error reading file {ref.path}: {e}")
     
     # Construct the enriched message
     if file_contexts:
@@ -185,5 +371,3 @@ def process_file_references(user_input: str):
         enriched_message = cleaned_message
     
     return enriched_message, loaded_files, errors
-
-
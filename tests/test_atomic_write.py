@@ -0,0 +1,19 @@
+from src.tools.atomic_write import atomic_write, read_text
+
+
+def test_crlf_file_round_trips(tmp_path):
+    path = tmp_path / "crlf.txt"
+    path.write_bytes(b"a\r\nb\r\n")
+    text, newline, stat = read_text(str(path))
+    assert (text, newline) == ("a\nb\n", "\r\n")
+    atomic_write(str(path), text.replace("b", "c"), expected_mtime_ns=stat.st_mtime_ns, newline=newline, checkpoint=False)
+    assert path.read_bytes() == b"a\r\nc\r\n"
+
+
+def test_mixed_line_endings_are_kept(tmp_path):
+    path = tmp_path / "mixed.txt"
+    path.write_bytes(b"a\r\nb\nc\r\nd\r\n")
+    text, newline, stat = read_text(str(path))
+    assert (text, newline) == ("a\r\nb\nc\r\nd\r\n", "\n")
+    atomic_write(str(path), text.replace("b", "x"), newline=newline, checkpoint=False)
+    assert path.read_bytes() == b"a\r\nx\nc\r\nd\r\n"
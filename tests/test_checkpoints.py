@@ -0,0 +1,23 @@
+import os
+
+import src.tools.create_file as create_file_module
+from src.tools.checkpoints import CheckpointStore
+from src.tools.permissions import Decision
+
+
+def test_undo_deletes_file_created_by_file_creator(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = CheckpointStore(str(tmp_path))
+    monkeypatch.setattr(create_file_module, "get_checkpoints", lambda: store)
+    monkeypatch.setattr(create_file_module, "authorize", lambda *args, **kwargs: Decision("allow", "test"))
+
+    store.begin_turn()
+    assert create_file_module.FileCreator().run("new.txt") == "Created File: new.txt"
+    assert (tmp_path / "new.txt").exists()
+
+    turn_id, paths = store.undo()
+    assert paths == [os.path.realpath(tmp_path / "new.txt")]
+    assert not (tmp_path / "new.txt").exists()
+
+    store.redo()
+    assert (tmp_path / "new.txt").exists()
@@ -0,0 +1,47 @@
+import pytest
+
+from src.utils import FileReference, _expand_reference, _load_reference, parse_file_references
+
+
+@pytest.mark.parametrize("message, refs, cleaned", [
+    ("@file.py what does this do?", ["file.py"], "what does this do?"),
+    ("explain @main.py?", ["main.py"], "explain ?"),
+    ("look at @src/utils.py.", ["src/utils.py"], "look at ."),
+    ("summarize @src/**/*.py:1-20", ["src/**/*.py:1-20"], "summarize"),
+    ("compare @a?.py and @b[12].py", ["a?.py", "b[12].py"], "compare and"),
+    ("list @src/", ["src/"], "list"),
+    ("@{a,b}.py", [], "@{a,b}.py"),
+])
+def test_parse_file_references(message, refs, cleaned):
+    assert parse_file_references(message) == (refs, cleaned)
+
+
+def test_load_reference_line_range(tmp_path):
+    path = tmp_path / "lines.txt"
+    path.write_text("".join(f"line {n}\n" for n in range(1, 101)))
+    ref = FileReference(path=str(path), size=path.stat().st_size, start=10, end=12)
+    block = _load_reference(ref)
+    assert 'lines="10-12"' in block
+    assert "line 10\nline 11\nline 12\n</file>" in block
+
+
+def test_load_reference_outline_preview_without_symbols(tmp_path):
+    path = tmp_path / "big.log"
+    path.write_text("".join(f"entry {n}\n" for n in range(1, 10001)))
+    ref = FileReference(path=str(path), size=path.stat().st_size, outline=True)
+    block = _load_reference(ref)
+    assert 'outline="true"' in block
+    assert "10000 lines" in block
+    assert "entry 1\n" in block and "entry 10000" in block
+    assert "entry 5000\n" not in block
+
+
+def test_directory_reference_respects_gitignore(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".gitignore").write_text("node_modules/\n*.log\n")
+    for name in ["pkg/a.py", "pkg/sub/b.py", "pkg/debug.log", "pkg/node_modules/lib/index.js"]:
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_text("x")
+    paths, start, end = _expand_reference("pkg")
+    assert paths == ["pkg/a.py", "pkg/sub/b.py"]
+    assert (start, end) == (None, None)
@@ -0,0 +1,18 @@
+import src.tools.grep as grep_module
+from src.tools.grep import Grep
+
+
+def test_ignored_directory_is_searched_when_named(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # No ripgrep: the index or a direct scan has to answer
+    monkeypatch.setattr(grep_module.shutil, "which", lambda name: None)
+    (tmp_path / ".gitignore").write_text("build/\n")
+    (tmp_path / "build").mkdir()
+    (tmp_path / "build" / "out.txt").write_text("needle in the build output\n")
+    (tmp_path / "src.txt").write_text("nothing here\n")
+
+    grep = Grep()
+    assert grep.run("needle") == "No matches found."
+    result = grep.run("needle", path="build")
+    assert "build/out.txt (1 match)" in result
+    assert "1: needle in the build output" in result
@@ -0,0 +1,51 @@
+from src.tools.match_engine import Match, find_match
+
+
+def apply(content, old_string, new_string):
+    match = find_match(content, old_string, new_string)
+    assert isinstance(match, Match), match
+    return match.tier, content[:match.start] + match.replacement + content[match.end:]
+
+
+def test_exact():
+    assert apply("a = 1\nb = 2\n", "b = 2", "b = 3") == ("exact", "a = 1\nb = 3\n")
+
+
+def test_exact_ambiguous():
+    assert "appears 2 times" in find_match("x\nx\n", "x", "y")
+
+
+def test_whitespace_keeps_tab_indentation():
+    content = "def f():\n\tif x:\n\t\treturn 1\n\treturn 0\n"
+    tier, result = apply(content, "    if x:\n        return 1", "    if x:\n        return 2")
+    assert tier == "whitespace"
+    assert result == "def f():\n\tif x:\n\t\treturn 2\n\treturn 0\n"
+    compile(result, "<test>", "exec")
+
+
+def test_whitespace_ignores_trailing_spaces():
+    tier, result = apply("x = 1   \ny = 2\n", "x = 1\ny = 2", "x = 3\ny = 2")
+    assert (tier, result) == ("whitespace", "x = 3\ny = 2\n")
+
+
+def test_indentation_reindents_new_string():
+    content = "class A:\n    def f(self):\n        return 1\n"
+    tier, result = apply(content, "def f(self):\n    return 1", "def f(self):\n    return 2")
+    assert tier == "indentation"
+    assert result == "class A:\n    def f(self):\n        return 2\n"
+
+
+def test_indentation_ambiguous():
+    content = "if a:\n    x = 1\nif b:\n        x = 1\n"
+    assert "matches 2 places" in find_match(content, "  x = 1 ", "x = 2")
+
+
+def test_fuzzy():
+    content = "def total(items):\n    result = 0\n    for item in items:\n        result += item.price\n    return result\n"
+    old = "    result = 0\n    for item in items:\n        result += item.prices\n    return result"
+    match = find_match(content, old, "    return sum(item.price for item in items)")
+    assert isinstance(match, Match) and match.tier == "fuzzy" and match.score >= 0.9
+
+
+def test_not_found():
+    assert find_match("a = 1\n", "completely different", "x").startswith("old_string was not found")
@@ -0,0 +1,32 @@
+import json
+import os
+
+import pytest
+
+import src.tools.permissions as permissions
+from src.tools.permissions import POLICY_PATH, USER_REJECTED, authorize
+
+
+@pytest.fixture
+def auto_policy(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(tmp_path / ".terminus")
+    (tmp_path / POLICY_PATH).write_text(json.dumps({"mode": "auto", "rules": [{"action": "allow", "path": ".terminus"}]}))
+    return tmp_path
+
+
+def test_policy_file_writes_are_denied_when_headless(auto_policy, monkeypatch):
+    monkeypatch.setenv("TERMINUS_HEADLESS", "1")
+    assert authorize("edit_file", None, paths=["src/app.py"]).action == "allow"
+    decision = authorize("edit_file", None, paths=["src/app.py", "./.terminus/../.terminus/permissions.json"])
+    assert decision.action == "deny"
+    assert POLICY_PATH in decision.reason
+
+
+def test_policy_file_writes_ask_even_in_auto_mode(auto_policy, monkeypatch):
+    questions = []
+    monkeypatch.setattr(permissions, "is_headless", lambda: False)
+    monkeypatch.setattr(permissions, "confirm", lambda question, *args: questions.append(question) or False)
+    decision = authorize("file_creator", None, paths=[POLICY_PATH], question="Create it?")
+    assert decision.action == "deny" and decision.reason == USER_REJECTED
+    assert questions == ["Create it?"]
@@ -0,0 +1,43 @@
+import io
+import json
+
+import pytest
+
+from src.session_manager import RetentionPolicy, SessionHistory
+
+
+@pytest.fixture
+def history(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    session_history = SessionHistory()
+    yield session_history
+    session_history.con.close()
+
+
+def test_export_import_round_trip(history):
+    history.insert_to_chat_history("demo", [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}])
+    out = io.StringIO()
+    assert history.export_jsonl(out) == (1, 2)
+    assert history.import_jsonl(out.getvalue().splitlines()) == (1, 2)
+    imported = history.retrieve_chat_history(name="demo")
+    assert [session["chat_history"] for session in imported] == [
+        [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]
+    ] * 2
+
+
+def test_retention_ages_imported_sessions_from_import(history):
+    record = {"session_id": 7, "name": "old", "timestamp": "2001-01-01T00:00:00", "seq": 0,
+              "message": {"role": "user", "content": "from long ago"}}
+    history.import_jsonl([json.dumps(record)])
+    history.con.execute(
+        "INSERT INTO chat_history (name, timestamp, chat_history) VALUES ('stale', '2001-01-01T00:00:00', '[]')"
+    )
+    history.con.commit()
+
+    assert history.apply_retention(RetentionPolicy(max_age_days=90, max_sessions=1, max_bytes=None)) == 1
+    assert [session["name"] for session in history.retrieve_chat_history()] == ["old"]
+
+
+def test_import_rejects_message_without_role(history):
+    with pytest.raises(ValueError, match="line 1"):
+        history.import_jsonl(['{"message": "text"}'])
@@ -7,7 +7,7 @@ class TerminusCompleter(Completer):
     def __init__(self):
         self.commands = [
             '/help', '/context', '/history', '/reset', 
-            '/context_size', '/clear', '/exit', '/quit', 'q',
+            '/context_size', '/clear', '/undo', '/redo', '/db stats', '/exit', '/quit', 'q',
             'exit', 'quit'
         ]
         
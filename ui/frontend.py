@@ -76,6 +76,9 @@ class TerminalDisplay:
             ("/switch <model>", "Switch to a different AI model"),
             ("/list_models", "List available models"),
             ("/model", "Show current model"),
+            ("/undo", "Revert file edits from the last turn"),
+            ("/redo", "Re-apply undone file edits"),
+            ("/db stats", "Show session database sizes"),
             ("/exit", "Exit the program"),
         ]
 
@@ -228,6 +231,12 @@ class TerminalDisplay:
         help_text.append(" - Display context size\n", style="white")
         help_text.append("  /clear        ", style=self.colors["accent"])
         help_text.append(" - Clear the console screen\n", style="white")
+        help_text.append("  /undo         ", style=self.colors["accent"])
+        help_text.append(" - Revert the file edits made in the last agent turn\n", style="white")
+        help_text.append("  /redo         ", style=self.colors["accent"])
+        help_text.append(" - Re-apply the edits of the last undone turn\n", style="white")
+        help_text.append("  /db stats     ", style=self.colors["accent"])
+        help_text.append(" - Show session database sizes per table\n", style="white")
         help_text.append("  /exit         ", style=self.colors["accent"])
         help_text.append(" - Exit the program (also: exit, quit, q)\n\n", style="white")
         
@@ -308,6 +317,31 @@ class TerminalDisplay:
 
         self.console.print(Align.center(table))
 
+    def render_db_stats(self, stats: dict):
+        """Render per-table and per-file sizes of the session database directory"""
+        def fmt(size):
+            for unit in ("B", "KB", "MB", "GB"):
+                if size < 1024 or unit == "GB":
+                    return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+                size /= 1024
+
+        table = Table(title="Session Database", box=box.ROUNDED, expand=False)
+        table.add_column("Table", style=self.colors["accent_alt"], no_wrap=True)
+        table.add_column("Rows", style=self.colors["warning"], justify="right")
+        table.add_column("Size", style=self.colors["success"], justify="right")
+        for entry in stats["tables"]:
+            table.add_row(entry["name"], f"{entry['rows']:,}", fmt(entry["bytes"]))
+        table.add_section()
+        table.add_row("[dim]free pages[/dim]", "", fmt(stats["free_bytes"]))
+
+        files = Table(title="Files", box=box.ROUNDED, expand=False)
+        files.add_column("File", style=self.colors["accent_alt"], no_wrap=True)
+        files.add_column("Size", style=self.colors["success"], justify="right")
+        for entry in stats["files"]:
+            files.add_row(entry["name"], fmt(entry["bytes"]))
+
+        self.console.print(Align.center(Group(table, files)))
+
     def clear_screen(self):
         """Clear the console"""
         self.console.clear()
@@ -444,8 +478,15 @@ class StreamingHandler:
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.stop()
     
-    def update_status(self, message: str, is_thinking: bool = False, is_tool_output: bool = False, keep_stopped: bool = False):
+    def update_status(self, message: str, is_thinking: bool = False, is_tool_output: bool = False, keep_stopped: bool = False, is_progress: bool = False):
       
+        if is_progress:
+            # Live progress (like a command's latest output line) only replaces the spinner text
+            if self.status is not None:
+                accent = self.colors.get("accent", "bright_red")
+                self.status.update(Text(message, style=accent))
+            return
+
         # Stop live display if active
         if self.live_display is not None:
             self.live_display.stop()